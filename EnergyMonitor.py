@@ -1,25 +1,52 @@
+import time
+STARTUP_T0 = time.perf_counter()  # Riferimento per il profilo di avvio
+
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 import threading
-import time
 import sys
 import os
 import subprocess
 import winsound
 import configparser
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
-from matplotlib.figure import Figure
-import matplotlib.dates as mdates
-from fusion_solar_py.client import FusionSolarClient
+import json
+import logging
+import logging.handlers
+import queue
+import itertools
+import contextlib
+from array import array
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, wait
 import xml.etree.ElementTree as ET
 from datetime import datetime, timedelta
-import socket
-from matplotlib.backend_bases import MouseButton
-import mplcursors
 
-# Impostazione tema moderno
-plt.style.use('ggplot')
+from energy import day_counters, day_energy, energy_counters, plant_counters, sum_counters
+import metrics
+import network
+
+# Moduli pesanti (matplotlib, mplcursors) importati al primo utilizzo da load_plotting_modules
+plt = None
+mdates = None
+Figure = None
+FigureCanvasTkAgg = None
+NavigationToolbar2Tk = None
+mplcursors = None
+
+def load_plotting_modules():
+    """Importa matplotlib e mplcursors alla prima richiesta e imposta il tema dei grafici"""
+    global plt, mdates, Figure, FigureCanvasTkAgg, NavigationToolbar2Tk, mplcursors
+    if plt is not None:
+        return
+    
+    import matplotlib.pyplot as plt
+    import matplotlib.dates as mdates
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
+    import mplcursors
+    
+    # Impostazione tema moderno
+    plt.style.use('ggplot')
 
 # Caricamento configurazioni
 config = configparser.ConfigParser()
@@ -36,13 +63,29 @@ if not os.path.exists('config.ini'):
     config['SETTINGS'] = {
         'TIME_INTERVAL': '5',
         'ALARM_ENABLED': 'True',
-        'DATA_RETENTION_DAYS': '30'
+        'DATA_RETENTION_DAYS': '30',
+        'LIVE_WINDOW_HOURS': '24',
+        'LOG_FILE_PATH': 'energy_monitor.log',
+        'LOG_CONSOLE_LINES': '500'
     }
     config['EXPORT'] = {
         'AUTO_EXPORT_ENABLED': 'False',
         'AUTO_EXPORT_INTERVAL_HOURS': '24',
         'AUTO_EXPORT_FOLDER': os.getcwd()
     }
+    config['METRICS'] = {
+        'SERVER_ENABLED': 'False',
+        'HOST': '127.0.0.1',
+        'PORT': '9108',
+        'SNAPSHOT_PATH': '',
+        'SNAPSHOT_INTERVAL': '60'
+    }
+    config['NETWORK'] = {
+        'REQUEST_TIMEOUT': '30',
+        'LOGIN_TIMEOUT': '90',
+        'WORKERS': '8',
+        'WATCHDOG_TIMEOUT': '300'
+    }
     with open('config.ini', 'w') as configfile:
         config.write(configfile)
 
@@ -55,25 +98,378 @@ INTERVAL = config.getint('SETTINGS', 'TIME_INTERVAL', fallback=5)
 ALARM_ENABLED = config.getboolean('SETTINGS', 'ALARM_ENABLED', fallback=True)
 DATA_RETENTION_DAYS = config.getint('SETTINGS', 'DATA_RETENTION_DAYS', fallback=30)
 XML_FILE_PATH = config.get('SETTINGS', 'XML_FILE_PATH', fallback='energy_data.xml')
+LIVE_WINDOW_HOURS = config.getint('SETTINGS', 'LIVE_WINDOW_HOURS', fallback=24)
+LOG_FILE_PATH = config.get('SETTINGS', 'LOG_FILE_PATH', fallback='energy_monitor.log')
+LOG_CONSOLE_LINES = config.getint('SETTINGS', 'LOG_CONSOLE_LINES', fallback=500)
+LAST_VALUES_PATH = config.get('SETTINGS', 'LAST_VALUES_PATH', fallback='last_values.json')
+STARTUP_PROFILE_PATH = config.get('SETTINGS', 'STARTUP_PROFILE_PATH', fallback='startup_profile.jsonl')
+EXTERNAL_COLLECTOR = config.getboolean('SETTINGS', 'EXTERNAL_COLLECTOR', fallback=False)
+COLLECTOR_STATUS_PATH = config.get('SETTINGS', 'COLLECTOR_STATUS_PATH', fallback='collector_status.json')
+MULTI_PLANT_ENABLED = config.getboolean('SETTINGS', 'MULTI_PLANT_ENABLED', fallback=False)
+PLANT_IDS = [plant_id.strip() for plant_id in config.get('SETTINGS', 'PLANT_IDS', fallback='').split(',') if plant_id.strip()]
+PLANT_POLL_WORKERS = config.getint('SETTINGS', 'PLANT_POLL_WORKERS', fallback=8)
 
 def save_config():
     """Salva le configurazioni nel file config.ini"""
     with open('config.ini', 'w') as configfile:
         config.write(configfile)
 
-# Inizializzazione client FusionSolar
-try:
-    client = FusionSolarClient(
+# ===== LOG =====
+
+LOG_FILE_MAX_BYTES = 5 * 1024 * 1024
+LOG_FILE_BACKUP_COUNT = 10
+
+logger = logging.getLogger("EnergyMonitor")
+
+class ConsoleLogHandler(logging.Handler):
+    """
+    Handler che mostra gli ultimi messaggi nell'area di log dell'interfaccia.
+    
+    Le righe vengono accumulate in un buffer limitato e scritte nel widget a blocchi
+    dal thread di Tkinter; il widget conserva al massimo max_lines righe e quelle in
+    eccesso vengono rimosse a gruppi di trim_batch per non ricalcolare il testo ad
+    ogni inserimento.
+    """
+    def __init__(self, max_lines=500, trim_batch=100):
+        super().__init__()
+        self.max_lines = max_lines
+        self.trim_batch = trim_batch
+        self.pending = deque(maxlen=max_lines)
+        self.pending_lock = threading.Lock()
+        self.dispatcher = None
+        self.text_widget = None
+    
+    def attach(self, dispatcher, text_widget):
+        """Collega l'handler al widget di log, i messaggi precedenti vengono mostrati subito"""
+        self.dispatcher = dispatcher
+        self.text_widget = text_widget
+        self.dispatcher.call(self._write_pending, key='log_console')
+    
+    def emit(self, record):
+        try:
+            line = self.format(record)
+        except Exception:
+            self.handleError(record)
+            return
+        with self.pending_lock:
+            self.pending.append(line)
+        if self.dispatcher is not None:
+            self.dispatcher.call(self._write_pending, key='log_console')
+    
+    def _write_pending(self):
+        """Scrive nel widget le righe accumulate (solo thread di Tkinter)"""
+        with self.pending_lock:
+            lines = list(self.pending)
+            self.pending.clear()
+        if not lines:
+            return
+        
+        try:
+            self.text_widget.insert(tk.END, "\n".join(lines) + "\n")
+            
+            # Rimuove le righe più vecchie a blocchi
+            line_count = int(self.text_widget.index('end-1c').split('.')[0]) - 1
+            if line_count > self.max_lines + self.trim_batch:
+                self.text_widget.delete('1.0', f"{line_count - self.max_lines + 1}.0")
+            
+            self.text_widget.see(tk.END)
+        except tk.TclError:
+            # Il widget è stato distrutto durante la chiusura
+            pass
+
+def setup_logging():
+    """
+    Configura il logging asincrono: i thread scrivono in una coda tramite QueueHandler,
+    un listener in background inoltra i messaggi al file di log a rotazione e alla console.
+    La coda è collegata al logger radice, così arrivano anche i messaggi dei moduli network e metrics.
+    """
+    file_handler = logging.handlers.RotatingFileHandler(
+        LOG_FILE_PATH, maxBytes=LOG_FILE_MAX_BYTES, backupCount=LOG_FILE_BACKUP_COUNT, encoding='utf-8'
+    )
+    file_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s [%(threadName)s] %(message)s"))
+    
+    console_handler = ConsoleLogHandler(max_lines=LOG_CONSOLE_LINES)
+    console_handler.setFormatter(logging.Formatter("[%(asctime)s] %(message)s", datefmt='%H:%M:%S'))
+    
+    log_queue = queue.Queue()
+    root_logger = logging.getLogger()
+    root_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    root_logger.setLevel(logging.INFO)
+    
+    listener = logging.handlers.QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    listener.start()
+    return listener, console_handler
+
+log_listener, console_log_handler = setup_logging()
+
+# Metriche dei percorsi critici: endpoint Prometheus e/o snapshot JSON periodico
+metrics.start_from_config(config)
+
+# Pool condiviso e scadenze di tutte le chiamate di rete verso il portale
+network.configure_from_config(config)
+network.connectivity.set_host(network.fusionsolar_host(SUBDOMAIN))
+
+# ===== PROFILO DI AVVIO =====
+
+class StartupProfiler:
+    """
+    Registra il tempo trascorso dall'avvio del processo fino a ciascuna fase dell'avvio
+    (finestra costruita, primo frame disegnato, grafico pronto, dati storici, login).
+    Ogni avvio viene aggiunto come riga JSON al file del profilo per seguirne l'andamento.
+    """
+    def __init__(self, t0):
+        self.t0 = t0
+        self.started = datetime.now()
+        self.phases = {}
+        self.lock = threading.Lock()
+        # Salvataggio automatico quando tutte le fasi attese sono registrate (path, fasi)
+        self.pending_save = None
+    
+    def mark(self, phase):
+        """Registra il completamento di una fase"""
+        elapsed = time.perf_counter() - self.t0
+        with self.lock:
+            self.phases.setdefault(phase, round(elapsed, 3))
+        logger.info(f"Avvio - {phase}: {elapsed:.2f} s")
+        self._save_if_complete()
+    
+    def save_when_complete(self, path, *phases):
+        """
+        Salva il profilo una sola volta, appena sono registrate tutte le fasi indicate:
+        le fasi arrivano da thread diversi (grafico sul thread di Tk, login in background)
+        """
+        with self.lock:
+            self.pending_save = (path, phases)
+        self._save_if_complete()
+    
+    def _save_if_complete(self):
+        with self.lock:
+            if self.pending_save is None or not all(phase in self.phases for phase in self.pending_save[1]):
+                return
+            path = self.pending_save[0]
+            self.pending_save = None
+        self.save(path)
+    
+    def save(self, path):
+        """Aggiunge il profilo dell'avvio corrente al file JSON lines"""
+        with self.lock:
+            record = {"started": self.started.strftime('%Y-%m-%d %H:%M:%S'), "phases": dict(self.phases)}
+        try:
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record) + "\n")
+        except OSError as e:
+            logger.error(f"Errore nel salvataggio del profilo di avvio: {e}")
+
+startup_profiler = StartupProfiler(STARTUP_T0)
+startup_profiler.mark('imports')
+
+# ===== PROFILAZIONE =====
+
+PROFILE_DIR = config.get('SETTINGS', 'PROFILE_DIR', fallback='profiles')
+PROFILE_SAMPLE_MS = config.getint('SETTINGS', 'PROFILE_SAMPLE_MS', fallback=10)
+# La cattura può partire all'avvio con --profile o da configurazione, oppure dal menu Strumenti
+PROFILE_ON_START = '--profile' in sys.argv or config.getboolean('SETTINGS', 'PROFILE_ENABLED', fallback=False)
+
+class ProfilerCapture:
+    """
+    Cattura su richiesta per capire cosa rallenta l'applicazione (XML, matplotlib, Tk o rete).
+    
+    Durante la cattura un thread campiona periodicamente lo stack di tutti i thread
+    (sys._current_frames) e le fasi del ciclo di update_data (poll, save, plot, alarm)
+    vengono registrate come eventi di una timeline. Alla fine vengono scritti un profilo
+    per thread in formato "folded" (flamegraph, speedscope) e la timeline in formato
+    Chrome trace (chrome://tracing, ui.perfetto.dev).
+    Quando la cattura è ferma ogni fase costa solo il controllo di un flag.
+    """
+    def __init__(self, output_dir, interval_ms=10):
+        self.output_dir = output_dir
+        self.interval = max(interval_ms, 1) / 1000
+        self.active = False
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.sampler = None
+        self.samples = {}
+        self.events = []
+        self.thread_names = {}
+        self.t0 = 0.0
+    
+    def start(self):
+        """Avvia la cattura (nessun effetto se è già attiva)"""
+        with self.lock:
+            if self.active:
+                return
+            self.samples = {}
+            self.events = []
+            self.thread_names = {}
+            self.t0 = time.perf_counter()
+            self.stop_event.clear()
+            self.active = True
+        self.sampler = threading.Thread(target=self._sample_loop, name="ProfilerSampler", daemon=True)
+        self.sampler.start()
+        logger.info("Profilazione avviata")
+    
+    def stop(self):
+        """
+        Ferma la cattura e scrive i risultati
+        
+        Returns:
+            str: Cartella dei risultati o None se la cattura non era attiva
+        """
+        with self.lock:
+            if not self.active:
+                return None
+            self.active = False
+        self.stop_event.set()
+        self.sampler.join()
+        output_path = self._write()
+        logger.info(f"Profilazione terminata, risultati in: {output_path}")
+        return output_path
+    
+    def phase(self, name):
+        """Context manager che registra una fase nella timeline, se la cattura è attiva"""
+        if not self.active:
+            return NULL_PHASE
+        return _ProfilerPhase(self, name)
+    
+    def add_event(self, name, start, end):
+        """Aggiunge un evento completo (ph 'X') alla timeline"""
+        thread = threading.current_thread()
+        with self.lock:
+            if not self.active:
+                return
+            self.thread_names[thread.ident] = thread.name
+            self.events.append({
+                "name": name,
+                "cat": "update_data",
+                "ph": "X",
+                "ts": round((start - self.t0) * 1e6),
+                "dur": round((end - start) * 1e6),
+                "pid": os.getpid(),
+                "tid": thread.ident
+            })
+    
+    def _sample_loop(self):
+        """Campiona lo stack di tutti i thread fino all'arresto della cattura"""
+        own_ident = threading.get_ident()
+        while not self.stop_event.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)})")
+                    frame = frame.f_back
+                folded = ";".join(reversed(stack))
+                thread_samples = self.samples.setdefault(names.get(ident, str(ident)), {})
+                thread_samples[folded] = thread_samples.get(folded, 0) + 1
+    
+    def _write(self):
+        """Scrive i profili per thread e la timeline, restituisce la cartella dei risultati"""
+        output_path = os.path.join(self.output_dir, datetime.now().strftime('%Y%m%d_%H%M%S'))
+        try:
+            os.makedirs(output_path, exist_ok=True)
+            for thread_name, stacks in self.samples.items():
+                safe_name = "".join(c if c.isalnum() or c in "-_" else "_" for c in thread_name)
+                with open(os.path.join(output_path, f"{safe_name}.folded"), 'w', encoding='utf-8') as f:
+                    for stack, count in sorted(stacks.items(), key=lambda item: -item[1]):
+                        f.write(f"{stack} {count}\n")
+            
+            metadata = [
+                {"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": ident, "args": {"name": name}}
+                for ident, name in self.thread_names.items()
+            ]
+            with open(os.path.join(output_path, "trace.json"), 'w', encoding='utf-8') as f:
+                json.dump({"traceEvents": metadata + self.events, "displayTimeUnit": "ms"}, f)
+        except OSError as e:
+            logger.error(f"Errore nel salvataggio della profilazione: {e}")
+        return output_path
+
+class _ProfilerPhase:
+    """Fase della timeline restituita da ProfilerCapture.phase"""
+    def __init__(self, capture, name):
+        self.capture = capture
+        self.name = name
+        self.start = 0.0
+    
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.capture.add_event(self.name, self.start, time.perf_counter())
+        return False
+
+NULL_PHASE = contextlib.nullcontext()
+
+profiler = ProfilerCapture(PROFILE_DIR, PROFILE_SAMPLE_MS)
+if PROFILE_ON_START:
+    profiler.start()
+
+# ===== ULTIMI VALORI =====
+
+def save_last_values(power_value, status, daily_energy, dt):
+    """Salva gli ultimi valori letti, mostrati all'avvio prima del caricamento dei dati"""
+    data = {
+        "power": power_value,
+        "status": status,
+        "daily_energy": daily_energy,
+        "timestamp": dt.strftime('%Y-%m-%d %H:%M:%S')
+    }
+    try:
+        temp_path = LAST_VALUES_PATH + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(temp_path, LAST_VALUES_PATH)
+    except OSError as e:
+        logger.error(f"Errore nel salvataggio degli ultimi valori: {e}")
+
+def load_last_values():
+    """Carica gli ultimi valori salvati, None se non disponibili"""
+    try:
+        with open(LAST_VALUES_PATH, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+# ===== CLIENT FUSIONSOLAR =====
+
+# Il login avviene in background dopo la visualizzazione della finestra
+client = None
+
+def create_client():
+    """
+    Crea il client FusionSolar effettuando il login.
+    Il modulo fusion_solar_py (e il modello captcha) viene importato solo al primo utilizzo.
+    """
+    from fusion_solar_py.client import FusionSolarClient
+    return network.create_client(
+        FusionSolarClient,
         USERNAME, PASSWORD,
         captcha_model_path=CAPTCHA_MODEL_PATH,
         huawei_subdomain=SUBDOMAIN
     )
-except Exception as e:
-    print(f"Errore nell'inizializzazione del client: {e}")
-    client = None
 
 # ===== FUNZIONI PER LA GESTIONE DEI DATI XML =====
 
+def write_xml_tree(tree):
+    """
+    Scrive l'albero XML in modo atomico (file temporaneo + rinomina): chi legge il file
+    nello stesso momento (es. il primo caricamento del grafico) vede il file precedente
+    o quello nuovo, mai un file scritto a metà
+    """
+    temp_path = f"{XML_FILE_PATH}.tmp"
+    tree.write(temp_path)
+    for _ in range(10):
+        try:
+            os.replace(temp_path, XML_FILE_PATH)
+            return
+        except PermissionError:
+            # Su Windows la sostituzione fallisce se il file è aperto in lettura
+            time.sleep(0.05)
+    os.replace(temp_path, XML_FILE_PATH)
+
 def initialize_xml_file():
     """
     Inizializza il file XML se non esiste o carica quello esistente
@@ -81,7 +477,7 @@ def initialize_xml_file():
     if not os.path.exists(XML_FILE_PATH):
         root = ET.Element("energy_data")
         tree = ET.ElementTree(root)
-        tree.write(XML_FILE_PATH)
+        write_xml_tree(tree)
         return tree
     else:
         try:
@@ -93,7 +489,7 @@ def initialize_xml_file():
             # Fallback in caso di XML corrotto
             root = ET.Element("energy_data")
             tree = ET.ElementTree(root)
-            tree.write(XML_FILE_PATH)
+            write_xml_tree(tree)
             return tree
 
 def clean_old_data(tree):
@@ -106,16 +502,24 @@ def clean_old_data(tree):
     retention_str = retention_date.strftime('%Y-%m-%d')
     
     # Trova tutti i giorni più vecchi del periodo di conservazione
+    removed = 0
     for day_elem in root.findall("./day"):
         day_date = day_elem.get('date')
         if day_date < retention_str:
             root.remove(day_elem)
+            removed += 1
     
-    tree.write(XML_FILE_PATH)
+    # Il file viene riscritto solo se è cambiato
+    if removed:
+        write_xml_tree(tree)
 
-def save_power_data(timestamp, power_value):
+@metrics.timed('save_power_data')
+def save_power_data(timestamp, power_value, plant_values=None, energy_today=None, energy_total=None, failed=None):
     """
     Salva i dati di potenza nel file XML
+    plant_values: potenza dei singoli impianti {id: kW}, salvata come figli del campione
+    energy_today, energy_total: contatori di energia dell'inverter (kWh di oggi e totali)
+    failed: impianti che non hanno risposto: il totale è parziale ed è escluso dalle serie del totale
     """
     try:
         tree = ET.parse(XML_FILE_PATH)
@@ -142,16 +546,36 @@ def save_power_data(timestamp, power_value):
         power_elem = ET.SubElement(day_elem, "power")
         power_elem.set("time", time_str)
         power_elem.set("value", str(power_value))
+        # I contatori dell'inverter permettono di calcolare l'energia per differenza, senza integrare la potenza.
+        # L'ultimo valore resta anche sul giorno, così le statistiche non devono scorrerne i campioni
+        if energy_today is not None:
+            power_elem.set("today", str(energy_today))
+            day_elem.set("today", str(energy_today))
+        if energy_total is not None:
+            power_elem.set("total", str(energy_total))
+            day_elem.set("total", str(energy_total))
+        if failed:
+            power_elem.set("failed", ",".join(failed))
+        for plant_id, plant_value in (plant_values or {}).items():
+            plant_elem = ET.SubElement(power_elem, "plant")
+            plant_elem.set("id", plant_id)
+            plant_elem.set("value", str(plant_value))
         
         # Salva il file XML
-        tree.write(XML_FILE_PATH)
+        write_xml_tree(tree)
+        metrics.inc('samples_ingested')
     except Exception as e:
-        print(f"Errore nel salvataggio dati XML: {e}")
+        metrics.record_error('save_power_data')
+        logger.error(f"Errore nel salvataggio dati XML: {e}")
 
-def load_recent_data(days=1):
+@metrics.timed('load_recent_data')
+def load_recent_data(days=1, plant=None, with_counters=False):
     """
     Carica i dati più recenti dal file XML
     days: numero di giorni da caricare (default: 1 - solo oggi)
+    plant: id dell'impianto da caricare (default: None - totale di tutti gli impianti)
+    with_counters: restituisce anche {data: {"today": kWh, "total": kWh}} dei giorni con contatori,
+                   letti nella stessa lettura del file
     """
     try:
         tree = ET.parse(XML_FILE_PATH)
@@ -159,6 +583,7 @@ def load_recent_data(days=1):
         
         timestamps = []
         powers = []
+        counters = {}
         
         # Calcola le date per il periodo richiesto
         today = datetime.now()
@@ -169,9 +594,21 @@ def load_recent_data(days=1):
         for day_elem in root.findall("./day"):
             day_date = day_elem.get('date')
             if day_date >= start_date_str:
+                if with_counters:
+                    counters_of_day = day_counters(day_elem)
+                    if counters_of_day is not None:
+                        counters[day_date] = counters_of_day
                 for power_elem in day_elem.findall("./power"):
                     time_str = power_elem.get('time')
-                    power_value = float(power_elem.get('value'))
+                    if plant is None:
+                        if power_elem.get('failed') is not None:
+                            continue  # Totale parziale: alcuni impianti non hanno risposto
+                        power_value = float(power_elem.get('value'))
+                    else:
+                        plant_elem = power_elem.find(f"./plant[@id='{plant}']")
+                        if plant_elem is None:
+                            continue
+                        power_value = float(plant_elem.get('value'))
                     
                     # Crea un timestamp completo
                     dt = datetime.strptime(f"{day_date} {time_str}", '%Y-%m-%d %H:%M:%S')
@@ -184,20 +621,149 @@ def load_recent_data(days=1):
             timestamps, powers = zip(*sorted_data)
         else:
             timestamps, powers = [], []
-            
+        
+        if with_counters:
+            return timestamps, powers, counters
         return timestamps, powers
     except Exception as e:
-        print(f"Errore nel caricamento dati XML: {e}")
-        return [], []
+        metrics.record_error('load_recent_data')
+        logger.error(f"Errore nel caricamento dati XML: {e}")
+        return ([], [], {}) if with_counters else ([], [])
+
+@metrics.timed('load_daily_energy')
+def load_daily_energy():
+    """
+    Energia prodotta in ogni giorno memorizzato, con una sola lettura del file
+    Per i giorni con i contatori dell'inverter si usa il contatore giornaliero senza leggere i campioni;
+    solo gli altri giorni vengono integrati. Restituisce {data: kWh}
+    """
+    try:
+        tree = ET.parse(XML_FILE_PATH)
+        daily_energy = {}
+        for day_elem in tree.getroot().findall("./day"):
+            energy = day_energy(day_elem)
+            if energy is not None:
+                daily_energy[day_elem.get('date')] = energy
+        return daily_energy
+    except Exception as e:
+        metrics.record_error('load_daily_energy')
+        logger.error(f"Errore nel calcolo dell'energia giornaliera: {e}")
+        return {}
+
+# ===== FINESTRA DATI IN MEMORIA =====
+
+class LiveWindow:
+    """
+    Buffer circolare a capacità fissa con gli ultimi campioni (timestamp, potenza).
+    
+    I valori sono memorizzati in due array preallocati, quindi l'occupazione di
+    memoria non cresce con il tempo di esecuzione: raggiunta la capacità, ogni
+    nuovo campione sovrascrive il più vecchio. I campioni devono essere aggiunti
+    in ordine cronologico.
+    """
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.times = array('d', bytes(8 * capacity))  # secondi epoch
+        self.powers = array('d', bytes(8 * capacity))  # kW
+        self.start = 0
+        self.count = 0
+        self.lock = threading.Lock()
+    
+    def append(self, dt, power_value):
+        """Aggiunge un campione, sovrascrivendo il più vecchio se il buffer è pieno"""
+        with self.lock:
+            index = (self.start + self.count) % self.capacity
+            self.times[index] = dt.timestamp()
+            self.powers[index] = power_value
+            if self.count < self.capacity:
+                self.count += 1
+            else:
+                self.start = (self.start + 1) % self.capacity
+    
+    def clear(self):
+        """Svuota il buffer"""
+        with self.lock:
+            self.start = 0
+            self.count = 0
+    
+    def extend(self, timestamps, power_values):
+        """Aggiunge una serie di campioni (es. i dati storici caricati all'avvio)"""
+        for dt, power_value in zip(timestamps, power_values):
+            self.append(dt, power_value)
+    
+    def covers(self, since):
+        """
+        Verifica se il buffer contiene tutti i campioni a partire da since (datetime),
+        cioè se nessun campione successivo a since è stato sovrascritto
+        """
+        with self.lock:
+            if self.count < self.capacity:
+                return True
+            return self.times[self.start] <= since.timestamp()
+    
+    def _indices_since(self, since):
+        """Indici in ordine cronologico dei campioni a partire da since (lock già acquisito)"""
+        since_secs = since.timestamp() if since is not None else float('-inf')
+        for offset in range(self.count):
+            index = (self.start + offset) % self.capacity
+            if self.times[index] >= since_secs:
+                yield index
+    
+    def samples(self, since=None):
+        """
+        Restituisce i campioni a partire da since (datetime, None = tutti)
+        come tuple (timestamps, power_values), nello stesso formato di load_recent_data
+        """
+        with self.lock:
+            indices = list(self._indices_since(since))
+            timestamps = [datetime.fromtimestamp(self.times[i]) for i in indices]
+            power_values = [self.powers[i] for i in indices]
+        return timestamps, power_values
+    
+    def energy_since(self, since):
+        """
+        Calcola l'energia (kWh) prodotta a partire da since con la regola del trapezio,
+        come calculate_statistics, senza accedere al disco
+        """
+        energy = 0.0
+        with self.lock:
+            previous = None
+            for index in self._indices_since(since):
+                if previous is not None:
+                    delta_hours = (self.times[index] - self.times[previous]) / 3600
+                    energy += (self.powers[index] + self.powers[previous]) / 2 * delta_hours
+                previous = index
+        return energy
+
+def today_start():
+    """Restituisce la mezzanotte del giorno corrente"""
+    return datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+# Ultime LIVE_WINDOW_HOURS ore di campioni (almeno un giorno intero), alla frequenza di aggiornamento configurata
+live_window = LiveWindow(int(max(LIVE_WINDOW_HOURS, 24) * 3600 / max(INTERVAL, 1)) + 1)
+
+def today_energy():
+    """
+    Energia prodotta oggi (kWh) integrando i campioni: dalla finestra in memoria se contiene
+    tutti i campioni da mezzanotte, altrimenti (intervallo ridotto durante l'esecuzione) dai dati su disco
+    """
+    since = today_start()
+    if live_window.covers(since):
+        return live_window.energy_since(since)
+    timestamps, power_values = load_recent_data(days=1)
+    day_window = LiveWindow(len(timestamps) + 1)
+    day_window.extend(timestamps, power_values)
+    return day_window.energy_since(since)
 
 # ===== FUNZIONI STATISTICHE =====
 
+@metrics.timed('calculate_statistics')
 def calculate_statistics(days=30):
     """
     Calcola statistiche dettagliate dai dati memorizzati
     """
     try:
-        timestamps, power_values = load_recent_data(days=days)
+        timestamps, power_values, counters = load_recent_data(days=days, with_counters=True)
         
         if not timestamps or not power_values:
             return {
@@ -227,10 +793,12 @@ def calculate_statistics(days=30):
             daily_data[day_str]["powers"].append(power_values[i])
             daily_data[day_str]["times"].append(dt)
         
-        # Calcola energia giornaliera per ogni giorno
-        daily_energy = {}
+        # Energia dei giorni con i contatori dell'inverter: ultimo valore del contatore giornaliero
+        daily_energy = {day: counter["today"] for day, counter in counters.items() if day in daily_data}
+        
+        # Per i giorni senza contatori (dati precedenti) l'energia viene integrata dai campioni
         for day, data in daily_data.items():
-            if len(data["times"]) < 2:
+            if day in daily_energy or len(data["times"]) < 2:
                 continue
                 
             # Ordina i dati per orario
@@ -269,6 +837,9 @@ def calculate_statistics(days=30):
         current_month = datetime.now().strftime('%Y-%m')
         monthly_energy = sum(energy for day, energy in daily_energy.items() if day.startswith(current_month))
         
+        # Energia totale prodotta dall'inverter dall'installazione (contatore più recente)
+        lifetime_totals = [counters[day]["total"] for day in sorted(counters) if counters[day]["total"] is not None]
+        
         return {
             "max_power": max_power,
             "max_time": max_time.strftime('%Y-%m-%d %H:%M'),
@@ -278,11 +849,181 @@ def calculate_statistics(days=30):
             "days_with_data": len(daily_energy),
             "best_day": best_day,
             "monthly_energy": monthly_energy,
-            "daily_energy": daily_energy
+            "daily_energy": daily_energy,
+            "lifetime_energy": lifetime_totals[-1] if lifetime_totals else None
         }
     except Exception as e:
-        print(f"Errore nel calcolo delle statistiche: {e}")
+        metrics.record_error('calculate_statistics')
+        logger.error(f"Errore nel calcolo delle statistiche: {e}")
+        return None
+
+@metrics.timed('calculate_monthly_energy')
+def calculate_monthly_energy():
+    """
+    Calcola l'energia prodotta per ogni mese a partire da tutti i dati memorizzati
+    Restituisce None se non ci sono dati
+    """
+    # Energia di ogni giorno: contatori dell'inverter dove presenti, integrazione dei campioni per gli altri
+    daily_energy = load_daily_energy()
+    
+    if not daily_energy:
         return None
+    
+    monthly_energy = {}
+    for day, energy in daily_energy.items():
+        monthly_energy[day[:7]] = monthly_energy.get(day[:7], 0.0) + energy
+    
+    return monthly_energy
+
+# ===== CODA DI AGGIORNAMENTO INTERFACCIA =====
+
+class UIDispatcher:
+    """
+    Coda thread-safe per gli aggiornamenti dell'interfaccia.
+    
+    I thread di lavoro non toccano mai i widget: accodano le operazioni, che il
+    thread di Tkinter esegue a frequenza fissa. Ad ogni frame viene elaborato un
+    numero limitato di elementi; le configurazioni dello stesso widget vengono
+    unite e le chiamate con la stessa chiave (es. il ridisegno del grafico)
+    sostituiscono quelle precedenti ancora in coda.
+    """
+    FRAME_MS = 100  # 10 frame al secondo
+    MAX_ITEMS_PER_FRAME = 200
+    
+    def __init__(self, tk_root):
+        self.tk_root = tk_root
+        self.queue = queue.Queue()
+        self.sequence = itertools.count()
+    
+    def call(self, func, *args, key=None):
+        """
+        Accoda una chiamata da eseguire nel thread di Tkinter
+        key: se indicata, la chiamata sostituisce quelle in coda con la stessa chiave
+        """
+        self.queue.put(('call', key, (func, args)))
+    
+    def configure(self, widget, **options):
+        """Accoda una configurazione del widget, unita alle altre dello stesso widget"""
+        self.queue.put(('configure', widget, options))
+    
+    def request_plot(self):
+        """Richiede un ridisegno del grafico, le richieste superate vengono scartate"""
+        self.call(plot_graph, key='plot')
+    
+    def start(self):
+        """Avvia lo svuotamento periodico della coda"""
+        self.tk_root.after(self.FRAME_MS, self._drain)
+    
+    def _drain(self):
+        """Esegue nel thread di Tkinter gli aggiornamenti accodati per questo frame"""
+        batch = OrderedDict()
+        for _ in range(self.MAX_ITEMS_PER_FRAME):
+            try:
+                kind, key, payload = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            
+            if kind == 'configure':
+                slot = ('configure', key)
+                if slot in batch:
+                    batch[slot].update(payload)
+                else:
+                    batch[slot] = dict(payload)
+            else:
+                # Le chiamate senza chiave non vengono mai unite
+                slot = ('call', key if key is not None else ('seq', next(self.sequence)))
+                batch.pop(slot, None)
+                batch[slot] = payload
+        
+        with profiler.phase('ui'):
+            for slot, payload in batch.items():
+                try:
+                    if slot[0] == 'configure':
+                        slot[1].config(**payload)
+                    else:
+                        func, args = payload
+                        func(*args)
+                except Exception as e:
+                    logger.error(f"Errore nell'aggiornamento dell'interfaccia: {e}")
+        
+        self.tk_root.after(self.FRAME_MS, self._drain)
+
+# ===== CARICAMENTO DATI IN BACKGROUND =====
+
+class BackgroundLoader:
+    """
+    Esegue il caricamento dei dati e i calcoli statistici fuori dal thread di Tkinter
+    e consegna i risultati al thread principale tramite la coda dell'interfaccia.
+    
+    Ogni richiesta appartiene a un canale (es. 'plot'): una nuova richiesta sullo stesso
+    canale rende obsoleta quella precedente, mentre una richiesta identica a quella
+    ancora in corso viene accorpata e riceve lo stesso risultato.
+    """
+    def __init__(self, dispatcher, max_workers=2):
+        self.dispatcher = dispatcher
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="BackgroundLoader")
+        self.lock = threading.Lock()
+        self.current = {}  # canale -> richiesta in corso
+    
+    def submit(self, channel, key, func, on_done, on_error=None):
+        """
+        Accoda func nel pool di background
+        
+        channel: canale della richiesta, le richieste precedenti sullo stesso canale vengono annullate
+        key: identifica la richiesta, richieste identiche in corso vengono accorpate
+        on_done: callback eseguita nel thread di Tkinter con il risultato
+        on_error: callback eseguita nel thread di Tkinter con l'eccezione
+        Restituisce False se la richiesta è stata accorpata a una già in corso
+        """
+        with self.lock:
+            request = self.current.get(channel)
+            if request is not None and request['key'] == key and not request['future'].done():
+                request['callbacks'].append((on_done, on_error))
+                return False
+            
+            # Annulla la richiesta obsoleta se non è ancora partita
+            if request is not None:
+                request['future'].cancel()
+            
+            request = {'key': key, 'callbacks': [(on_done, on_error)]}
+            request['future'] = self.executor.submit(func)
+            self.current[channel] = request
+        
+        request['future'].add_done_callback(lambda future: self._on_future_done(channel, request))
+        return True
+    
+    def is_loading(self, channel):
+        """Verifica se c'è una richiesta in corso sul canale"""
+        with self.lock:
+            return channel in self.current
+    
+    def _on_future_done(self, channel, request):
+        """Chiamata nel thread di background al termine del calcolo"""
+        if request['future'].cancelled():
+            return
+        self.dispatcher.call(self._deliver, channel, request)
+    
+    def _deliver(self, channel, request):
+        """Consegna il risultato alle callback nel thread di Tkinter"""
+        with self.lock:
+            # Scarta i risultati di richieste superate da una più recente
+            if self.current.get(channel) is not request:
+                return
+            del self.current[channel]
+        
+        future = request['future']
+        error = future.exception()
+        for on_done, on_error in request['callbacks']:
+            if error is None:
+                on_done(future.result())
+            elif on_error is not None:
+                on_error(error)
+            else:
+                log_message(f"Errore nel caricamento dati in background: {error}")
+    
+    def shutdown(self):
+        """Arresta il pool annullando le richieste in attesa"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
 
 # ===== SISTEMA DI ALLARME =====
 
@@ -295,7 +1036,7 @@ def trigger_alarm():
     alarm_active = True
     
     # Mostra l'overlay di allarme
-    alarm_overlay.place(x=0, y=0, relwidth=1, relheight=1)
+    ui.call(lambda: alarm_overlay.place(x=0, y=0, relwidth=1, relheight=1), key='alarm_overlay')
     
     # Avvia il thread per l'allarme
     threading.Thread(target=alarm_blink, daemon=True).start()
@@ -303,9 +1044,11 @@ def trigger_alarm():
 def alarm_blink():
     """Funzione per far lampeggiare l'allarme e emettere suoni"""
     blink_count = 0
+    blink_red = True
     while alarm_active:
         # Alterna i colori dell'overlay
-        alarm_overlay.config(bg="red" if alarm_overlay.cget("bg") == "black" else "black")
+        blink_red = not blink_red
+        ui.configure(alarm_overlay, bg="red" if blink_red else "black")
         
         # Emetti un suono
         winsound.Beep(1000, 500)
@@ -322,46 +1065,136 @@ def reset_alarm():
     """Disattiva l'allarme"""
     global alarm_active
     alarm_active = False
-    alarm_overlay.place_forget()  # Nascondi l'overlay
+    ui.call(alarm_overlay.place_forget, key='alarm_overlay')  # Nascondi l'overlay
 
 # ===== CONNESSIONE CLIENT =====
 
 def is_session_valid():
     """
-    Funzione per verificare se la sessione FusionSolar è ancora attiva.
+    Funzione per verificare se la sessione FusionSolar è utilizzabile, senza chiamate al portale.
+    La sessione vera e propria è verificata dalla lettura del ciclo, che se non riesce porta al rinnovo del login.
     """
-    try:
-        # Prima verifichiamo se c'è connessione internet
-        socket.create_connection(("www.google.com", 80), timeout=2)
-        
-        # Poi verifichiamo se la sessione è valida
-        test_status = client.get_power_status()
-        return True  # Se la richiesta va a buon fine, la sessione è valida
-    except socket.error:
-        print("Nessuna connessione internet disponibile")
+    if client is None:
         return False
-    except Exception as e:
-        print(f"Sessione scaduta o errore API: {e}")
-        return False  # Se c'è un errore, potrebbe essere necessario rieffettuare il login
+    # Nessun traffico aggiuntivo se l'ultima richiesta al portale è riuscita,
+    # altrimenti una sonda verso l'host del portale (non verso un sito esterno)
+    if not network.connectivity.is_online():
+        logger.warning("Portale FusionSolar non raggiungibile")
+        return False
+    return True
 
+@metrics.timed('renew_session')
 def renew_session():
     """
     Funzione per effettuare nuovamente il login in caso di sessione scaduta.
     """
     global client
     try:
-        print("Rinnovo della sessione FusionSolar...")
-        client = FusionSolarClient(
-            USERNAME, PASSWORD,
-            captcha_model_path=CAPTCHA_MODEL_PATH,
-            huawei_subdomain=SUBDOMAIN
-        )
-        print("Sessione rinnovata con successo!")
+        logger.info("Rinnovo della sessione FusionSolar...")
+        metrics.inc('api_calls')
+        client = create_client()
+        logger.info("Sessione rinnovata con successo!")
         return True
     except Exception as e:
-        print(f"Errore nel rinnovo della sessione: {e}")
+        metrics.record_error('renew_session')
+        logger.error(f"Errore nel rinnovo della sessione: {e}")
         return False
 
+# ===== IMPIANTI MULTIPLI =====
+
+# Impianti monitorati {id: nome}, letti dall'account al primo ciclo
+plants = {}
+
+def load_plants():
+    """
+    Legge l'elenco degli impianti dell'account, filtrato su PLANT_IDS se configurato
+    """
+    global plants
+    metrics.inc('api_calls')
+    if hasattr(client, 'get_station_list'):
+        stations = network.call('get_station_list', client.get_station_list)
+        available = {station['dn']: station.get('name', station['dn']) for station in stations}
+    else:
+        available = {plant_id: plant_id for plant_id in network.call('get_plant_ids', client.get_plant_ids)}
+    if PLANT_IDS:
+        available = {plant_id: available.get(plant_id, plant_id) for plant_id in PLANT_IDS}
+    plants = available
+    logger.info(f"Impianti monitorati: {', '.join(plants.values()) or 'nessuno'}")
+    ui.call(build_plant_rows, key='plant_list')
+
+@metrics.timed('get_plant_power')
+def read_plant(plant_id):
+    """
+    Legge potenza attuale e contatori di energia di un singolo impianto
+    Restituisce (kW, kWh di oggi, kWh totali), None per i contatori non disponibili
+    """
+    metrics.inc('api_calls')
+    return plant_counters(client.get_current_plant_data(plant_id))
+
+def read_power():
+    """
+    Lettura del ciclo, da un impianto o da tutti gli impianti in parallelo
+    
+    Returns:
+        tuple: (potenza totale in kW, {id impianto: kW} o None, [impianti che non hanno risposto],
+                contatore di oggi in kWh, contatore totale in kWh)
+    """
+    if MULTI_PLANT_ENABLED:
+        # Lettura concorrente di tutti gli impianti con la sessione condivisa
+        return poll_plants()
+    
+    # Ottenere lo stato di potenza dall'impianto
+    metrics.inc('api_calls')
+    with metrics.timer('get_power_status'):
+        stats = network.call('get_power_status', client.get_power_status)
+    energy_today, energy_total = energy_counters(stats)
+    return stats.current_power_kw, None, [], energy_today, energy_total
+
+def poll_plants():
+    """
+    Legge in parallelo la potenza di tutti gli impianti.
+    Le letture usano il pool condiviso delle chiamate di rete (al massimo PLANT_POLL_WORKERS
+    impianti alla volta) e il ciclo attende al massimo REQUEST_TIMEOUT: un impianto che
+    non risponde non blocca gli altri e il totale di questo ciclo viene segnato come parziale.
+    
+    I contatori di energia sono la somma di quelli degli impianti, solo se hanno risposto tutti.
+    
+    Returns:
+        tuple: (potenza totale in kW, {id impianto: kW}, [id degli impianti che non hanno risposto],
+                contatore di oggi in kWh, contatore totale in kWh)
+    """
+    if not plants:
+        load_plants()
+    
+    plant_ids = list(plants)
+    plant_values = {}
+    plant_today = []
+    plant_total = []
+    for start in range(0, len(plant_ids), PLANT_POLL_WORKERS):
+        batch = plant_ids[start:start + PLANT_POLL_WORKERS]
+        futures = {plant_id: network.submit('get_plant_power', read_plant, plant_id) for plant_id in batch}
+        done, pending = wait(futures.values(), timeout=network.executor.request_timeout)
+        for plant_id, future in futures.items():
+            if future in pending:
+                future.cancel()
+                metrics.inc('network_timeouts')
+                log_message(f"Lettura dell'impianto {plants[plant_id]} scaduta", logging.WARNING)
+                continue
+            try:
+                plant_values[plant_id], today, total = future.result()
+                plant_today.append(today)
+                plant_total.append(total)
+            except Exception as e:
+                log_message(f"Lettura dell'impianto {plants[plant_id]} non riuscita: {e}", logging.WARNING)
+    
+    if not plant_values:
+        raise RuntimeError("Nessun impianto ha risposto")
+    failed = [plant_id for plant_id in plant_ids if plant_id not in plant_values]
+    # Con impianti mancanti la somma dei contatori sarebbe parziale
+    if failed:
+        return sum(plant_values.values()), plant_values, failed, None, None
+    return sum(plant_values.values()), plant_values, failed, sum_counters(plant_today), sum_counters(plant_total)
+
 # ===== FUNZIONI PER LE FINESTRE E VISUALIZZAZIONI =====
 
 def open_settings():
@@ -461,7 +1294,11 @@ def open_settings():
         DATA_RETENTION_DAYS = retention_var.get()
         config.set('SETTINGS', 'DATA_RETENTION_DAYS', str(DATA_RETENTION_DAYS))
         save_config()
-        clean_old_data(xml_tree)
+        if EXTERNAL_COLLECTOR:
+            # Il file XML è scritto solo dal collector: la pulizia è a suo carico
+            log_message("La conservazione dati sarà applicata dal collector al prossimo avvio.")
+        else:
+            clean_old_data(ET.parse(XML_FILE_PATH))
         log_message(f"MODIFICATE IMPOSTAZIONI - Conservazione dati: {DATA_RETENTION_DAYS} giorni")
     
     ttk.Button(data_tab, text="Salva Impostazione", style='Success.TButton', 
@@ -542,14 +1379,11 @@ def open_settings():
         config.set('CREDENTIALS', 'SUBDOMAIN', SUBDOMAIN)
         config.set('CREDENTIALS', 'CAPTCHA_MODEL_PATH', CAPTCHA_MODEL_PATH)
         save_config()
+        network.connectivity.set_host(network.fusionsolar_host(SUBDOMAIN))
         
         # Reinizializza il client
         try:
-            client = FusionSolarClient(
-                USERNAME, PASSWORD,
-                captcha_model_path=CAPTCHA_MODEL_PATH,
-                huawei_subdomain=SUBDOMAIN
-            )
+            client = create_client()
             log_message("Credenziali aggiornate e client reinizializzato")
             messagebox.showinfo("Successo", "Credenziali aggiornate con successo!")
         except Exception as e:
@@ -593,13 +1427,28 @@ def show_statistics():
     # Titolo
     ttk.Label(main_stats_frame, text="STATISTICHE IMPIANTO FV", style='Title.TLabel').pack(pady=10)
     
+    # Le statistiche vengono calcolate in background per non bloccare l'interfaccia
+    loading_label = ttk.Label(main_stats_frame, text="⏳ Calcolo statistiche in corso...", style='Subtitle.TLabel')
+    loading_label.pack(pady=10)
+    
+    loader.submit(
+        'statistics', 30, calculate_statistics,
+        lambda stats: populate_statistics(stats_window, main_stats_frame, loading_label, stats),
+        lambda e: populate_statistics(stats_window, main_stats_frame, loading_label, None)
+    )
+
+def populate_statistics(stats_window, main_stats_frame, loading_label, stats):
+    """Riempie la finestra delle statistiche con i dati calcolati in background"""
+    # La finestra potrebbe essere stata chiusa durante il calcolo
+    if not stats_window.winfo_exists():
+        return
+    loading_label.destroy()
+    load_plotting_modules()
+    
     # Frame per le statistiche generali
     general_frame = ttk.LabelFrame(main_stats_frame, text="Statistiche Generali", style='Card.TFrame')
     general_frame.pack(fill="x", padx=10, pady=5)
     
-    # Calcola le statistiche
-    stats = calculate_statistics()
-    
     if not stats:
         ttk.Label(general_frame, text="Nessun dato disponibile", style='Warning.TLabel').pack(pady=10)
         return
@@ -634,6 +1483,11 @@ def show_statistics():
     ttk.Label(col2, text=f"Ore Funzionamento:", style='TLabel').grid(row=2, column=0, sticky="w", padx=5, pady=2)
     ttk.Label(col2, text=f"{stats['operating_hours']:.1f} ore", style='TLabel').grid(row=2, column=1, sticky="e", padx=5, pady=2)
     
+    # Contatore dell'inverter, disponibile solo per i dati salvati con i contatori
+    if stats.get('lifetime_energy') is not None:
+        ttk.Label(col2, text=f"Energia dall'Installazione:", style='TLabel').grid(row=3, column=0, sticky="w", padx=5, pady=2)
+        ttk.Label(col2, text=f"{stats['lifetime_energy']:.0f} kWh", style='TLabel').grid(row=3, column=1, sticky="e", padx=5, pady=2)
+    
     # Terza colonna
     col3 = ttk.Frame(stats_grid, style='Card.TFrame')
     col3.pack(side="left", fill="both", expand=True)
@@ -763,41 +1617,27 @@ def show_monthly_comparison():
     # Titolo
     ttk.Label(compare_frame, text="CONFRONTO PRODUZIONE MENSILE", style='Title.TLabel').pack(pady=10)
     
-    # Carica tutti i dati
-    timestamps, power_values = load_recent_data(days=9999)  # Carica tutti i dati disponibili
+    # L'aggregazione mensile richiede tutti i dati, viene eseguita in background
+    loading_label = ttk.Label(compare_frame, text="⏳ Calcolo dati mensili in corso...", style='Subtitle.TLabel')
+    loading_label.pack(pady=10)
     
-    if not timestamps:
-        ttk.Label(compare_frame, text="Dati insufficienti per il confronto", style='Warning.TLabel').pack(pady=10)
+    loader.submit(
+        'monthly', None, calculate_monthly_energy,
+        lambda monthly_energy: populate_monthly_comparison(compare_window, compare_frame, loading_label, monthly_energy),
+        lambda e: populate_monthly_comparison(compare_window, compare_frame, loading_label, None)
+    )
+
+def populate_monthly_comparison(compare_window, compare_frame, loading_label, monthly_energy):
+    """Riempie la finestra del confronto mensile con i dati calcolati in background"""
+    # La finestra potrebbe essere stata chiusa durante il calcolo
+    if not compare_window.winfo_exists():
         return
+    loading_label.destroy()
+    load_plotting_modules()
     
-    # Raggruppa i dati per mese
-    monthly_data = {}
-    for i, dt in enumerate(timestamps):
-        month_key = dt.strftime('%Y-%m')
-        if month_key not in monthly_data:
-            monthly_data[month_key] = {"powers": [], "times": []}
-        monthly_data[month_key]["powers"].append(power_values[i])
-        monthly_data[month_key]["times"].append(dt)
-    
-    # Calcola l'energia mensile
-    monthly_energy = {}
-    for month, data in monthly_data.items():
-        if len(data["times"]) < 2:
-            continue
-            
-        # Ordina i dati per orario
-        sorted_data = sorted(zip(data["times"], data["powers"]), key=lambda x: x[0])
-        times, powers = zip(*sorted_data)
-        
-        # Calcola l'energia del mese (integrale della potenza nel tempo)
-        month_energy = 0
-        for i in range(1, len(times)):
-            delta_hours = (times[i] - times[i-1]).total_seconds() / 3600
-            avg_power_segment = (powers[i] + powers[i-1]) / 2
-            segment_energy = avg_power_segment * delta_hours
-            month_energy += segment_energy
-        
-        monthly_energy[month] = month_energy
+    if monthly_energy is None:
+        ttk.Label(compare_frame, text="Dati insufficienti per il confronto", style='Warning.TLabel').pack(pady=10)
+        return
     
     # Grafico del confronto mensile
     chart_frame = ttk.Frame(compare_frame, style='Card.TFrame')
@@ -894,6 +1734,7 @@ def show_monthly_comparison():
     ttk.Button(buttons_frame, text="Chiudi", style='Warning.TButton', 
               command=compare_window.destroy).pack(side="right", padx=5, pady=5)
 
+@metrics.timed('export_xml')
 def export_data():
     """Esporta i dati in XML"""
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -916,9 +1757,11 @@ def export_data():
         log_message(f"Dati esportati con successo in: {export_path}")
         messagebox.showinfo("Esportazione completata", f"Dati esportati in:\n{export_path}")
     except Exception as e:
+        metrics.record_error('export_xml')
         log_message(f"Errore nell'esportazione dati: {e}")
         messagebox.showerror("Errore", f"Errore nell'esportazione dati: {e}")
 
+@metrics.timed('export_csv')
 def export_csv():
     """Esporta i dati in CSV"""
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -945,6 +1788,7 @@ def export_csv():
         log_message(f"Dati esportati in CSV: {export_path}")
         messagebox.showinfo("Esportazione completata", f"Dati esportati in CSV:\n{export_path}")
     except Exception as e:
+        metrics.record_error('export_csv')
         log_message(f"Errore nell'esportazione CSV: {e}")
         messagebox.showerror("Errore", f"Errore nell'esportazione CSV: {e}")
 def setup_auto_export():
@@ -1014,8 +1858,10 @@ def setup_auto_export():
         
         save_config()
         
-        # Avvia il thread di esportazione automatica se abilitato
-        if export_enabled.get():
+        # Avvia il thread di esportazione automatica se abilitato (con il collector esterno esporta il collector)
+        if export_enabled.get() and EXTERNAL_COLLECTOR:
+            log_message("Esportazione automatica affidata al collector, attiva dal prossimo avvio.")
+        elif export_enabled.get():
             threading.Thread(target=auto_export_thread, daemon=True).start()
             log_message(f"Esportazione automatica abilitata ogni {export_interval.get()} ore")
         
@@ -1047,6 +1893,7 @@ def auto_export_thread():
         # Formato di esportazione
         export_format = config.get('EXPORT', 'AUTO_EXPORT_FORMAT', fallback='csv')
         
+        export_start = time.perf_counter()
         try:
             # Crea un timestamp per il nome file
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -1070,8 +1917,10 @@ def auto_export_thread():
                 import shutil
                 shutil.copy2(XML_FILE_PATH, xml_path)
                 log_message(f"Esportazione automatica XML completata: {xml_path}")
+            metrics.registry.observe('auto_export', time.perf_counter() - export_start)
             
         except Exception as e:
+            metrics.registry.observe('auto_export', time.perf_counter() - export_start, error=True)
             log_message(f"Errore nell'esportazione automatica: {e}")
         
         # Attendi l'intervallo specificato
@@ -1079,88 +1928,199 @@ def auto_export_thread():
 
 # ===== AGGIORNAMENTO DATI =====
 
-# Aggiungi questa riga all'inizio del file, dopo le importazioni
-plot_lock = threading.Lock()
+# Generazione del thread di aggiornamento: il watchdog ne avvia una nuova se il ciclo resta bloccato
+update_generation = 0
+
+def start_update_data():
+    """Avvia il thread di aggiornamento dati (una nuova generazione sostituisce la precedente)"""
+    global update_generation
+    update_generation += 1
+    threading.Thread(target=update_data, args=(update_generation,), daemon=True).start()
 
-def update_data():
+def restart_update_data():
+    """Chiamata dal watchdog: abbandona il ciclo bloccato e ne avvia uno nuovo"""
+    log_message("Ciclo di aggiornamento bloccato: riavvio.", logging.ERROR)
+    if not alarm_active:
+        trigger_alarm()
+    start_update_data()
+
+update_watchdog = network.Watchdog("update_data", network.watchdog_timeout(config, INTERVAL), restart_update_data)
+
+def update_data(generation):
     """
     Aggiorna i dati solo se il refresh non è in pausa.
+    Termina quando il watchdog avvia una nuova generazione del thread.
     """
     global alarm_active
-    last_energy_update = time.time()
     
-    while True:
+    while generation == update_generation:
+        update_watchdog.beat()
         if not refresh_paused:  # Controllo se il refresh è attivo
             try:
-                # Verifica se la sessione è ancora attiva, altrimenti rifai il login
-                if not is_session_valid():
-                    if not renew_session():
-                        # Se il rinnovo della sessione fallisce, attiva l'allarme
-                        if not alarm_active:
-                            log_message("Impossibile rinnovare la sessione, attivazione allarme.")
-                            trigger_alarm()
-                        time.sleep(INTERVAL)
-                        continue
-
-                # Ottenere lo stato di potenza dall'impianto
-                stats = client.get_power_status()
-                current_power = stats.current_power_kw
-                inverter_status = "✅ Operativo" if current_power > 0 else "⚠️ Nessuna Produzione"
-                
-                # Aggiorna le etichette dell'interfaccia
-                power_value_label.config(text=f"{current_power:.2f} kW")
-                status_value_label.config(text=inverter_status)
+                # La lettura stessa verifica la sessione: se non riesce si rifà il login e si ripete una volta
+                with profiler.phase('poll'):
+                    reading = None
+                    if is_session_valid() or renew_session():
+                        try:
+                            reading = read_power()
+                        except Exception as e:
+                            logger.warning(f"Sessione scaduta o errore API: {e}")
+                            if renew_session():
+                                reading = read_power()
+                    session_ok = reading is not None
+                    if session_ok:
+                        current_power, plant_values, failed_plants, energy_today, energy_total = reading
                 
-                # Aggiorna il colore in base allo stato
-                if current_power > 0:
-                    power_value_label.config(foreground=COLOR_SECONDARY)
-                    status_value_label.config(foreground=COLOR_SECONDARY)
-                else:
-                    power_value_label.config(foreground=COLOR_WARNING)
-                    status_value_label.config(foreground=COLOR_WARNING)
+                if not session_ok:
+                    # Se il rinnovo della sessione fallisce, attiva l'allarme
+                    if not alarm_active:
+                        log_message("Impossibile rinnovare la sessione, attivazione allarme.")
+                        trigger_alarm()
+                    time.sleep(INTERVAL)
+                    continue
+
+                inverter_status = "✅ Operativo" if current_power > 0 else "⚠️ Nessuna Produzione"
                 
-                current_time = time.strftime('%H:%M:%S')
-                times.append(current_time)
-                powers.append(current_power)
+                # Aggiorna le etichette dell'interfaccia con il colore in base allo stato
+                status_color = COLOR_SECONDARY if current_power > 0 else COLOR_WARNING
+                ui.configure(power_value_label, text=f"{current_power:.2f} kW", foreground=status_color)
+                ui.configure(status_value_label, text=inverter_status, foreground=status_color)
+                if plant_values is not None:
+                    ui.call(update_plant_rows, plant_values, key='plant_rows')
                 
-                # Salva i dati nel file XML
-                save_power_data(current_time, current_power)
+                with profiler.phase('save'):
+                    now = datetime.now()
+                    current_time = now.strftime('%H:%M:%S')
+                    # Un totale parziale non entra nella serie del totale (grafico ed energia giornaliera)
+                    if not failed_plants:
+                        live_window.append(now, current_power)
+                    
+                    # Salva i dati nel file XML
+                    save_power_data(current_time, current_power, plant_values, energy_today, energy_total, failed_plants)
+                    
+                    # Energia giornaliera dal contatore dell'inverter, altrimenti calcolata dai campioni in memoria
+                    daily_energy = energy_today if energy_today is not None else today_energy()
+                    ui.configure(daily_energy_value_label, text=f"{daily_energy:.2f} kWh")
+                    save_last_values(current_power, inverter_status, daily_energy, now)
                 
-                # Aggiorna il grafico con i dati XML - Usa il lock e root.after per evitare problemi di concorrenza
-                with plot_lock:
-                    # Utilizza root.after per eseguire l'aggiornamento del grafico nel thread principale di tkinter
-                    root.after(0, lambda: plot_graph())
+                # Aggiorna il grafico con i dati XML nel thread principale di tkinter
+                ui.request_plot()
                 
                 log_message(f"Potenza: {current_power:.2f} kW - Stato: {inverter_status}")
                 
-                # Aggiorna il calcolo dell'energia giornaliera ogni ora
-                current_time_secs = time.time()
-                if current_time_secs - last_energy_update > 3600:  # 3600 secondi = 1 ora
-                    # Calcola l'energia per la giornata corrente
-                    stats = calculate_statistics(days=1)
-                    if stats and 'total_energy' in stats:
-                        daily_energy_value_label.config(text=f"{stats['total_energy']:.2f} kWh")
-                    last_energy_update = current_time_secs
-                
-                # Controllo allarme
-                if not is_session_valid():
-                    log_message("Errore di comunicazione con l'impianto: sessione non valida.")
-                    if not alarm_active:
-                        trigger_alarm()  # Attiva sempre l'allarme per errore di comunicazione
-                elif ALARM_ENABLED and current_power == 0:
-                    log_message("Attivazione allarme per produzione 0.")
-                    if not alarm_active:
-                        trigger_alarm()  # Attiva l'allarme solo se ALARM_ENABLED è attivo
-                else:
-                    # Se tutto è a posto, resetta l'allarme se era attivo
-                    if alarm_active:
-                        reset_alarm()
+                # Controllo allarme: la lettura di questo ciclo è riuscita, quindi la sessione è valida
+                with profiler.phase('alarm'):
+                    if ALARM_ENABLED and current_power == 0:
+                        log_message("Attivazione allarme per produzione 0.")
+                        if not alarm_active:
+                            trigger_alarm()  # Attiva l'allarme solo se ALARM_ENABLED è attivo
+                    else:
+                        # Se tutto è a posto, resetta l'allarme se era attivo
+                        if alarm_active:
+                            reset_alarm()
 
             except Exception as e:
                 log_message(f"Errore di comunicazione con l'impianto: {e}")
                 if not alarm_active:
                     trigger_alarm()  # Attiva sempre l'allarme per errore di comunicazione
 
+        # Attendi l'intervallo specificato (non conta come tempo di blocco per il watchdog)
+        update_watchdog.beat()
+        time.sleep(INTERVAL)
+
+# ===== COLLECTOR ESTERNO =====
+
+def read_collector_status():
+    """Legge il file di stato scritto dal collector (test/collector.py), None se non disponibile"""
+    try:
+        with open(COLLECTOR_STATUS_PATH, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def reload_today_from_storage():
+    """Ricarica dal file XML i dati di oggi nella finestra in memoria"""
+    timestamps, power_values = load_recent_data(days=1)
+    live_window.clear()
+    live_window.extend(timestamps, power_values)
+
+def watch_collector():
+    """
+    Alternativa a update_data quando la raccolta dati è affidata al processo collector.
+    L'interfaccia non interroga l'impianto: legge solo il file di stato del collector
+    e, se ha perso dei campioni, il file XML.
+    """
+    global alarm_active
+    last_sample_count = None
+    collector_alive = True
+    
+    while True:
+        if not refresh_paused:  # Controllo se il refresh è attivo
+            try:
+                status = read_collector_status()
+                
+                # Il collector è considerato fermo se non aggiorna lo stato per tre cicli
+                timeout = 3 * max(status.get('interval', INTERVAL), INTERVAL) if status else 0
+                if status is None or time.time() - status.get('heartbeat', 0) > timeout:
+                    if collector_alive:
+                        log_message("Collector non attivo: nessun dato aggiornato.", logging.ERROR)
+                        collector_alive = False
+                    ui.configure(status_value_label, text="⚠️ Collector non attivo", foreground=COLOR_WARNING)
+                    if not alarm_active:
+                        trigger_alarm()
+                    time.sleep(INTERVAL)
+                    continue
+                
+                if not collector_alive:
+                    log_message("Collector di nuovo attivo.")
+                    collector_alive = True
+                
+                sample = status.get('sample')
+                sample_count = status.get('sample_count')
+                if sample and sample_count != last_sample_count:
+                    sample_time = datetime.strptime(sample['timestamp'], '%Y-%m-%d %H:%M:%S')
+                    current_power = sample['power']
+                    
+                    # Un solo campione nuovo viene aggiunto in memoria, altrimenti si rilegge lo storage
+                    if last_sample_count is not None and sample_count == last_sample_count + 1:
+                        live_window.append(sample_time, current_power)
+                    else:
+                        reload_today_from_storage()
+                    last_sample_count = sample_count
+                    
+                    inverter_status = "✅ Operativo" if current_power > 0 else "⚠️ Nessuna Produzione"
+                    status_color = COLOR_SECONDARY if current_power > 0 else COLOR_WARNING
+                    ui.configure(power_value_label, text=f"{current_power:.2f} kW", foreground=status_color)
+                    ui.configure(status_value_label, text=inverter_status, foreground=status_color)
+                    if sample.get('plants'):
+                        # Con il collector multi-impianto i nomi non sono noti: si usano gli id
+                        if not set(sample['plants']) <= set(plants):
+                            plants.clear()
+                            plants.update({plant_id: plant_id for plant_id in sample['plants']})
+                            ui.call(build_plant_rows, key='plant_list')
+                        ui.call(update_plant_rows, sample['plants'], key='plant_rows')
+                    
+                    daily_energy = sample.get('energy_today')
+                    if daily_energy is None:
+                        daily_energy = today_energy()
+                    ui.configure(daily_energy_value_label, text=f"{daily_energy:.2f} kWh")
+                    save_last_values(current_power, inverter_status, daily_energy, sample_time)
+                    
+                    ui.request_plot()
+                    log_message(f"Potenza: {current_power:.2f} kW - Stato: {inverter_status}")
+                
+                # Le condizioni di allarme sono valutate dal collector
+                alarm = status.get('alarm') or {}
+                if alarm.get('active'):
+                    if not alarm_active:
+                        log_message(f"Attivazione allarme: {alarm.get('reason')}")
+                        trigger_alarm()
+                elif alarm_active:
+                    reset_alarm()
+            
+            except Exception as e:
+                log_message(f"Errore nella lettura dei dati del collector: {e}", logging.ERROR)
+        
         # Attendi l'intervallo specificato
         time.sleep(INTERVAL)
 
@@ -1168,48 +2128,77 @@ def on_closing():
     """Gestisce la chiusura dell'applicazione"""
     if messagebox.askokcancel("Chiusura", "Vuoi davvero chiudere l'applicazione?"):
         # Esegui operazioni di pulizia se necessario
+        loader.shutdown()
+        update_watchdog.stop()
+        network.executor.shutdown()
+        profiler.stop()
         root.destroy()
+        log_listener.stop()
 
-def log_message(message):
-    """Aggiunge un messaggio all'area di log"""
-    log_text.insert(tk.END, f"[{time.strftime('%H:%M:%S')}] {message}\n")
-    log_text.see(tk.END)
+def log_message(message, level=logging.INFO):
+    """Registra un messaggio nel log (console e file), può essere chiamata da qualsiasi thread"""
+    logger.log(level, message)
 
 def plot_graph():
-    """Aggiorna il grafico con i dati del periodo selezionato"""
+    """Richiede in background i dati del periodo selezionato per aggiornare il grafico"""
+    # Il grafico viene creato solo dopo la visualizzazione della finestra
+    if canvas is None:
+        return
+    days = display_period.get()
+    plant = plant_choices.get(selected_plant.get())
+    graph_loading_label.config(text="⏳ Caricamento dati...")
+    loader.submit('plot', (days, plant), lambda: load_plot_data(days, plant),
+                  lambda data: render_graph(days, *data), on_plot_error)
+
+def load_plot_data(days, plant=None):
+    """
+    Carica i dati del grafico (eseguita nel thread di background, non deve accedere ai widget).
+    La vista di oggi viene letta dalla finestra in memoria, le altre e quelle dei singoli
+    impianti dal file XML.
+    """
+    with profiler.phase('plot_load'):
+        if plant is not None:
+            return load_recent_data(days=days, plant=plant)
+        if days <= 1:
+            midnight = today_start()
+            if live_window.covers(midnight):
+                return live_window.samples(since=midnight)
+        
+        # Carica i dati dal file XML in base al periodo selezionato
+        return load_recent_data(days=days)
+
+def on_plot_error(e):
+    """Gestisce un errore nel caricamento in background dei dati del grafico"""
+    graph_loading_label.config(text="")
+    log_message(f"Errore nel caricamento dati del grafico: {e}")
+
+@metrics.timed('plot_graph')
+def render_graph(days, timestamps, power_values):
+    """Aggiorna il grafico con i dati caricati in background"""
+    with profiler.phase('plot'):
+        _render_graph(days, timestamps, power_values)
+
+def _render_graph(days, timestamps, power_values):
+    """Disegna il grafico (chiamata da render_graph)"""
     global cursor
     
+    graph_loading_label.config(text="")
+    
     try:
         ax.clear()
         
-        # Carica i dati dal file XML in base al periodo selezionato
-        timestamps, power_values = load_recent_data(days=display_period.get())
-        
         if timestamps and power_values and len(timestamps) > 0 and len(power_values) > 0:
             # Plot dei dati
             line, = ax.plot(timestamps, power_values, color=COLOR_PRIMARY, linewidth=2, marker="o", markersize=4)
             
             # Configura il formato dell'asse X in base al periodo
-            if display_period.get() <= 1:  # Visualizzazione giornaliera
+            if days <= 1:  # Visualizzazione giornaliera
                 ax.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M'))
                 ax.set_xlabel("Ora")
             else:  # Visualizzazione multi-giorno
                 ax.xaxis.set_major_formatter(mdates.DateFormatter('%d/%m %H:%M'))
                 ax.set_xlabel("Data e Ora")
             
-            # Calcola l'energia giornaliera approssimativa (area sotto la curva)
-            if timestamps:
-                today = datetime.now().strftime('%Y-%m-%d')
-                today_timestamps = [ts for ts in timestamps if ts.strftime('%Y-%m-%d') == today]
-                today_powers = [power_values[timestamps.index(ts)] for ts in today_timestamps]
-                
-                if today_powers and len(today_powers) > 0:
-                    # Calcolo approssimativo dell'energia (kWh) come media delle potenze * ore
-                    avg_power = sum(today_powers) / len(today_powers)
-                    hours = (max(today_timestamps) - min(today_timestamps)).total_seconds() / 3600 if len(today_timestamps) > 1 else 0
-                    daily_energy = avg_power * hours
-                    daily_energy_value_label.config(text=f"{daily_energy:.2f} kWh")
-            
             # Aggiunge annotazioni per i valori massimi
             if power_values and len(power_values) > 0:
                 max_power = max(power_values)
@@ -1289,6 +2278,7 @@ def plot_graph():
         canvas.draw_idle()  # Usa draw_idle invece di draw per evitare aggiornamenti eccessivi
         
     except Exception as e:
+        metrics.record_error('plot_graph')
         log_message(f"Errore nell'aggiornamento del grafico: {e}")
         
         # Tenta di ripristinare il grafico
@@ -1312,8 +2302,12 @@ root.state('zoomed')
 root.configure(bg="#f5f5f5")
 root.iconbitmap("icon.ico") if os.path.exists("icon.ico") else None
 
-# Inizializza il file XML
-xml_tree = initialize_xml_file()
+# Coda per gli aggiornamenti dell'interfaccia provenienti dai thread di lavoro
+ui = UIDispatcher(root)
+ui.start()
+
+# Pool per il caricamento dati e i calcoli fuori dal thread dell'interfaccia
+loader = BackgroundLoader(ui)
 
 # Stili e colori
 COLOR_PRIMARY = "#1976D2"
@@ -1401,6 +2395,39 @@ ttk.Label(daily_energy_frame, text="Energia Giornaliera", style='Subtitle.TLabel
 daily_energy_value_label = ttk.Label(daily_energy_frame, text="-- kWh", style='Value.TLabel')
 daily_energy_value_label.pack(pady=(0, 5), padx=10)
 
+# Card per la potenza dei singoli impianti (solo con il monitoraggio multi-impianto)
+plants_frame = ttk.Frame(left_frame, style='Card.TFrame')
+if MULTI_PLANT_ENABLED:
+    plants_frame.pack(fill="x", padx=10, pady=5)
+ttk.Label(plants_frame, text="Impianti", style='Subtitle.TLabel').pack(anchor="w", padx=10, pady=(5, 0))
+plant_rows_frame = ttk.Frame(plants_frame, style='Card.TFrame')
+plant_rows_frame.pack(fill="x", padx=10, pady=(0, 5))
+plant_value_labels = {}
+
+def build_plant_rows():
+    """Crea una riga per ogni impianto monitorato e aggiorna la scelta dell'impianto del grafico"""
+    for child in plant_rows_frame.winfo_children():
+        child.destroy()
+    plant_value_labels.clear()
+    for plant_id, name in plants.items():
+        row = ttk.Frame(plant_rows_frame, style='Card.TFrame')
+        row.pack(fill="x")
+        ttk.Label(row, text=name, style='TLabel').pack(side="left")
+        plant_value_labels[plant_id] = ttk.Label(row, text="-- kW", style='TLabel')
+        plant_value_labels[plant_id].pack(side="right")
+    
+    plant_choices.clear()
+    plant_choices["Totale"] = None
+    plant_choices.update({name: plant_id for plant_id, name in plants.items()})
+    plant_selector.config(values=list(plant_choices))
+
+def update_plant_rows(plant_values):
+    """Aggiorna la potenza dei singoli impianti, gli impianti che non hanno risposto restano n.d."""
+    for plant_id, label in plant_value_labels.items():
+        value = plant_values.get(plant_id)
+        label.config(text=f"{value:.2f} kW" if value is not None else "n.d.",
+                     foreground=COLOR_SECONDARY if value else COLOR_WARNING)
+
 # Separatore
 ttk.Separator(left_frame, orient='horizontal').pack(fill='x', padx=10, pady=5)
 
@@ -1416,6 +2443,9 @@ log_scrollbar.pack(side="right", fill="y")
 log_text.config(yscrollcommand=log_scrollbar.set)
 log_scrollbar.config(command=log_text.yview)
 
+# La console mostra solo le ultime righe, lo storico completo è nel file di log
+console_log_handler.attach(ui, log_text)
+
 # Pulsanti di azione
 buttons_frame = ttk.Frame(left_frame, style='Card.TFrame')
 buttons_frame.pack(fill="x", padx=10, pady=(5, 10))
@@ -1473,6 +2503,20 @@ days7_btn.pack(side="left", padx=5)
 days30_btn = ttk.Button(graph_controls, text="30 Giorni", style='Primary.TButton', command=lambda: update_period(30))
 days30_btn.pack(side="left", padx=5)
 
+# Scelta dell'impianto visualizzato: il totale o un singolo impianto
+plant_choices = {"Totale": None}
+selected_plant = tk.StringVar(value="Totale")
+plant_selector = ttk.Combobox(graph_controls, textvariable=selected_plant, values=list(plant_choices),
+                              state="readonly", width=18)
+if MULTI_PLANT_ENABLED:
+    ttk.Label(graph_controls, text="Impianto:", style='TLabel').pack(side="left", padx=(15, 5))
+    plant_selector.pack(side="left", padx=5)
+plant_selector.bind("<<ComboboxSelected>>", lambda event: plot_graph())
+
+# Indicatore di caricamento dati in background
+graph_loading_label = ttk.Label(graph_controls, text="", style='TLabel')
+graph_loading_label.pack(side="left", padx=10)
+
 # Variabile di stato per il refresh dei dati
 refresh_paused = False
 
@@ -1494,25 +2538,39 @@ refresh_button.pack(side="right", padx=5)
 graph_frame = ttk.Frame(right_frame, style='Card.TFrame')
 graph_frame.pack(fill="both", expand=True, padx=10, pady=5)
 
-# Creazione del grafico con matplotlib
-fig = Figure(figsize=(8, 5), dpi=100)
-ax = fig.add_subplot(111)
-
-# Canvas per il grafico
-canvas = FigureCanvasTkAgg(fig, master=graph_frame)
-canvas.get_tk_widget().pack(fill="both", expand=True)
-
-# Toolbar per il grafico
-toolbar_frame = ttk.Frame(graph_frame)
-toolbar_frame.pack(fill="x")
-toolbar = NavigationToolbar2Tk(canvas, toolbar_frame)
-toolbar.update()
+# Il grafico matplotlib viene creato da create_plot_area dopo il primo frame
+graph_placeholder_label = ttk.Label(graph_frame, text="⏳ Caricamento grafico...", style='Subtitle.TLabel')
+graph_placeholder_label.pack(expand=True)
+fig = None
+ax = None
+canvas = None
+toolbar = None
 
 # Cursore per i tooltip sui punti del grafico
 cursor = None
 
-# Dati per il grafico
-times, powers = [], []
+def create_plot_area():
+    """Importa matplotlib e crea il grafico principale al posto del segnaposto"""
+    global fig, ax, canvas, toolbar
+    load_plotting_modules()
+    graph_placeholder_label.destroy()
+    
+    # Creazione del grafico con matplotlib
+    fig = Figure(figsize=(8, 5), dpi=100)
+    ax = fig.add_subplot(111)
+    
+    # Canvas per il grafico
+    canvas = FigureCanvasTkAgg(fig, master=graph_frame)
+    canvas.get_tk_widget().pack(fill="both", expand=True)
+    
+    # Toolbar per il grafico
+    toolbar_frame = ttk.Frame(graph_frame)
+    toolbar_frame.pack(fill="x")
+    toolbar = NavigationToolbar2Tk(canvas, toolbar_frame)
+    toolbar.update()
+    
+    startup_profiler.mark('plot_ready')
+    plot_graph()
 
 # Creazione dell'overlay per l'allarme
 alarm_overlay = tk.Frame(root, bg="red", width=1200, height=700)
@@ -1552,6 +2610,19 @@ main_menu.add_cascade(label="Strumenti", menu=tools_menu)
 tools_menu.add_command(label="Statistiche", command=show_statistics)
 tools_menu.add_command(label="Confronto Mensile", command=show_monthly_comparison)
 tools_menu.add_command(label="Simula Allarme", command=trigger_alarm)
+tools_menu.add_separator()
+
+def toggle_profiling():
+    """Avvia o ferma la cattura del profilo dal menu Strumenti"""
+    if profiler.active:
+        output_path = profiler.stop()
+        messagebox.showinfo("Profilazione", f"Profilo salvato in:\n{output_path}")
+    else:
+        profiler.start()
+    tools_menu.entryconfig(profiling_menu_index, label="Ferma Profilazione" if profiler.active else "Avvia Profilazione")
+
+tools_menu.add_command(label="Ferma Profilazione" if profiler.active else "Avvia Profilazione", command=toggle_profiling)
+profiling_menu_index = tools_menu.index('end')
 
 # Menu Aiuto
 help_menu = tk.Menu(main_menu, tearoff=0)
@@ -1561,34 +2632,97 @@ help_menu.add_command(label="Informazioni", command=lambda: messagebox.showinfo(
 # Registra il gestore di eventi per la chiusura dell'applicazione
 root.protocol("WM_DELETE_WINDOW", on_closing)
 
-# Leggi le impostazioni di esportazione automatica
-# Leggi le impostazioni di esportazione automatica
-if 'EXPORT' in config and config.getboolean('EXPORT', 'AUTO_EXPORT_ENABLED', fallback=False):
-    threading.Thread(target=auto_export_thread, daemon=True).start()
-    log_message(f"Esportazione automatica abilitata ogni {config.getint('EXPORT', 'AUTO_EXPORT_INTERVAL_HOURS', fallback=24)} ore")
+# ===== AVVIO A FASI =====
 
-# Carica dati iniziali se disponibili
-if os.path.exists(XML_FILE_PATH):
+def show_cached_values():
+    """Mostra subito gli ultimi valori salvati, in attesa dei dati aggiornati"""
+    last_values = load_last_values()
+    if not last_values:
+        return
+    try:
+        status_color = COLOR_SECONDARY if last_values["power"] > 0 else COLOR_WARNING
+        power_value_label.config(text=f"{last_values['power']:.2f} kW", foreground=status_color)
+        status_value_label.config(text=last_values["status"], foreground=status_color)
+        daily_energy_value_label.config(text=f"{last_values['daily_energy']:.2f} kWh")
+        log_message(f"Ultimi valori registrati il {last_values['timestamp']}")
+    except (KeyError, TypeError, ValueError) as e:
+        logger.warning(f"Ultimi valori salvati non validi: {e}")
+
+def load_history():
+    """Prepara il file XML e carica i dati di oggi nella finestra in memoria"""
     log_message("Caricamento dati storici...")
     try:
-        timestamps, power_values = load_recent_data(days=display_period.get())
+        # Pulizia dei dati oltre il periodo di conservazione, a carico del collector se esterno
+        if not EXTERNAL_COLLECTOR:
+            initialize_xml_file()
+        
+        # I dati di oggi popolano la finestra in memoria usata dal grafico in tempo reale
+        timestamps, power_values = load_recent_data(days=1)
+        live_window.extend(timestamps, power_values)
         if timestamps:
             log_message(f"Caricati {len(timestamps)} punti dati.")
-            plot_graph()
             
             # Calcola l'energia giornaliera
-            stats = calculate_statistics(days=1)
-            if stats and 'total_energy' in stats:
-                daily_energy_value_label.config(text=f"{stats['total_energy']:.2f} kWh")
+            ui.configure(daily_energy_value_label, text=f"{today_energy():.2f} kWh")
         else:
             log_message("Nessun dato storico trovato.")
-            plot_graph()  # Visualizza il grafico vuoto con il messaggio appropriato
     except Exception as e:
         log_message(f"Errore nel caricamento dati storici: {e}")
+    
+    startup_profiler.mark('history_loaded')
+    # Visualizza il grafico (vuoto con il messaggio appropriato se non ci sono dati)
+    ui.request_plot()
+
+def connect_client():
+    """Effettua il primo login a FusionSolar"""
+    global client
+    try:
+        client = create_client()
+    except Exception as e:
+        logger.error(f"Errore nell'inizializzazione del client: {e}")
+        client = None
+    startup_profiler.mark('login_done')
+
+def background_startup():
+    """
+    Fasi di avvio eseguite in background dopo il primo frame: dati storici, login
+    e avvio del thread di aggiornamento dati, che richiede la finestra in memoria già popolata
+    """
+    load_history()
+    
+    if EXTERNAL_COLLECTOR:
+        # La raccolta dati è svolta dal processo collector, l'interfaccia legge solo lo storage
+        log_message("Raccolta dati affidata al collector esterno.")
+        threading.Thread(target=watch_collector, daemon=True).start()
+        return
+    
+    connect_client()
+    
+    # Avvia il thread di aggiornamento dati, sorvegliato dal watchdog
+    start_update_data()
+    update_watchdog.start()
+
+def on_first_frame():
+    """Chiamata quando la finestra è stata disegnata per la prima volta"""
+    root.update_idletasks()
+    startup_profiler.mark('first_frame')
+    
+    threading.Thread(target=background_startup, daemon=True).start()
+    
+    # Il grafico viene creato al ciclo successivo per non ritardare il primo frame
+    root.after(1, create_plot_area)
+
+# Leggi le impostazioni di esportazione automatica (con il collector esterno esporta il collector)
+if not EXTERNAL_COLLECTOR and 'EXPORT' in config and config.getboolean('EXPORT', 'AUTO_EXPORT_ENABLED', fallback=False):
+    threading.Thread(target=auto_export_thread, daemon=True).start()
+    log_message(f"Esportazione automatica abilitata ogni {config.getint('EXPORT', 'AUTO_EXPORT_INTERVAL_HOURS', fallback=24)} ore")
 
-# Avvia il thread di aggiornamento dati
-update_thread = threading.Thread(target=update_data, daemon=True)
-update_thread.start()
+# Prima fase: finestra e ultimi valori noti, il resto dopo il primo frame
+show_cached_values()
+startup_profiler.mark('window_built')
+# Il profilo di avvio è completo quando ci sono sia il grafico (thread di Tk) sia l'ultima fase in background
+startup_profiler.save_when_complete(STARTUP_PROFILE_PATH, 'plot_ready', 'history_loaded' if EXTERNAL_COLLECTOR else 'login_done')
+root.after_idle(on_first_frame)
 
 # Avvia l'applicazione
-root.mainloop()
\ No newline at end of file
+root.mainloop()
@@ -54,7 +54,8 @@ class UpdaterApp:
 
         # Scarica il contenuto del repository come file ZIP
         self.log_message("Scarico la repository...")
-        response = requests.get(REPO_URL)
+        # Timeout (connessione, lettura): una rete bloccata non lascia l'aggiornamento in attesa per sempre
+        response = requests.get(REPO_URL, timeout=(10, 60))
         if response.status_code == 200:
             zip_file = ZipFile(BytesIO(response.content))
             
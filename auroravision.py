@@ -1,107 +1,289 @@
 import dash
 from dash import dcc, html
 import plotly.graph_objs as go
-import requests
 import datetime
-from dash.dependencies import Input, Output
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from dash.dependencies import Input, Output, State
 import pandas as pd
 
+from pull_generation import AbbAccess
+
 # Configurazione dell'app Flask
 USERNAME = "tomacarburanti"
 PASSWORD = "Riccardo@01"
 ENTITY_IDS = ["14370648", "14354021", "14349631"]
-BASE_URL = "https://easyview.auroravision.net/easyview/services/gmi/summary/GenerationEnergy.json"
 
-# Funzione per ottenere i dati di produzione
-def get_production():
-    session = requests.Session()
-    login_url = "https://www.auroravision.net/ums/v1/login?setCookie=true"
+# Sessione AuroraVision condivisa da tutte le callback e le schede del browser:
+# il login viene rifatto solo quando il portale risponde 401
+# Il pool di connessioni keep-alive ha un posto per ogni impianto letto in parallelo
+access = AbbAccess(USERNAME, PASSWORD, timeout=(3.05, 10), pool_size=len(ENTITY_IDS))
+
+# Le letture degli impianti avvengono in parallelo: la latenza è quella dell'impianto più lento
+fetch_executor = ThreadPoolExecutor(max_workers=len(ENTITY_IDS), thread_name_prefix="AuroraVision")
+# Attesa massima dei primi dati all'apertura della pagina: gli impianti più lenti arrivano con gli aggiornamenti
+FETCH_DEADLINE = 8
+
+# Durata in cache delle risposte in base all'ampiezza delle fasce (secondi)
+BIN_TTL = {"Min5": 60, "Min15": 180, "Hour": 600, "Day": 3600, "Month": 6 * 3600}
+# I periodi già conclusi non cambiano più
+CLOSED_RANGE_TTL = 24 * 3600
+
+_cache = {}
+_cache_lock = threading.Lock()
+# Lock per chiave con il numero di richieste che lo usano: rimosso quando l'ultima lo rilascia
+_key_locks = {}
+
+def _acquire_key_lock(key):
+    """Lock della chiave, creato se manca; va sempre restituito con _release_key_lock"""
+    with _cache_lock:
+        entry = _key_locks.setdefault(key, [threading.Lock(), 0])
+        entry[1] += 1
+        return entry[0]
+
+def _release_key_lock(key):
+    """Rilascia l'uso del lock della chiave e lo rimuove se nessun'altra richiesta lo attende"""
+    with _cache_lock:
+        entry = _key_locks[key]
+        entry[1] -= 1
+        if entry[1] == 0:
+            del _key_locks[key]
+
+def fetch_generation(eid, start, end, bin_size="Hour", fetched_after=None):
+    """
+    Energia generata da un impianto, con cache per (eid, start, end, binSize).
+    Richieste contemporanee per la stessa chiave attendono un'unica chiamata al portale.
+    fetched_after: epoch minimo della risposta in cache (es. l'inizio della fascia oraria in corso):
+    una risposta letta prima viene ignorata anche se il TTL non è scaduto.
+    """
+    key = (eid, start, end, bin_size)
+    key_lock = _acquire_key_lock(key)
+    try:
+        with key_lock:
+            cached = _cache.get(key)
+            if cached and cached[0] > time.monotonic() and (fetched_after is None or cached[2] >= fetched_after):
+                return cached[1]
+            
+            fetched = time.time()
+            data = access.get_generation(eid, start, end, bin_size)
+            closed = end <= datetime.date.today().strftime("%Y%m%d")
+            ttl = CLOSED_RANGE_TTL if closed else BIN_TTL.get(bin_size, 600)
+            with _cache_lock:
+                # Rimuove le voci scadute e le letture concluse (anche non riuscite) per non far crescere la cache con le date passate
+                now = time.monotonic()
+                for old_key in [k for k, (expires, _, _) in _cache.items() if expires <= now]:
+                    del _cache[old_key]
+                for old_key in [k for k, future in _inflight.items() if future.done()]:
+                    del _inflight[old_key]
+                _cache[key] = (now + ttl, data, fetched)
+            return data
+    finally:
+        _release_key_lock(key)
+
+_inflight = {}
+
+def submit_fetch(eid, start, end, bin_size="Hour", fetched_after=None):
+    """Avvia la lettura nel pool, riusando quella già in corso per la stessa chiave"""
+    key = (eid, start, end, bin_size)
+    with _cache_lock:
+        future = _inflight.get(key)
+        if future is None or future.done():
+            future = fetch_executor.submit(fetch_generation, eid, start, end, bin_size, fetched_after)
+            _inflight[key] = future
+        return future
+
+class ProductionStore:
+    """
+    Ultimi dati di produzione di ogni entità, aggiornati dal thread di background.
+    Le callback leggono solo da qui: la loro latenza non dipende dal portale e il
+    carico verso AuroraVision non cresce con il numero di pagine aperte.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = {}
+        self._ready = threading.Event()
     
-    # Effettua login
-    response = session.get(login_url, auth=requests.auth.HTTPBasicAuth(USERNAME, PASSWORD))
-    print(f"Login response: {response.status_code}")  # Log di risposta per il login
+    def update(self, entity, entity_data):
+        with self._lock:
+            self._data[entity] = entity_data
+            if len(self._data) == len(ENTITY_IDS):
+                self._ready.set()
     
-    # Gestione date
+    def snapshot(self):
+        with self._lock:
+            return dict(self._data)
+    
+    def wait_ready(self, timeout):
+        """Attende il primo giro di letture (al massimo timeout secondi)"""
+        return self._ready.wait(timeout)
+
+store = ProductionStore()
+_refresher = None
+_refresher_lock = threading.Lock()
+
+def next_refresh_delay(bin_size="Hour"):
+    """
+    Attesa fino al prossimo aggiornamento: ogni TTL delle fasce e subito dopo
+    l'inizio di una nuova fascia oraria, quando la precedente si chiude
+    """
+    now = datetime.datetime.now()
+    next_bin = now.replace(minute=0, second=0, microsecond=0) + datetime.timedelta(hours=1, seconds=60)
+    return min(BIN_TTL.get(bin_size, 600), (next_bin - now).total_seconds())
+
+def refresh_production():
+    """Legge in parallelo tutte le entità e aggiorna lo store man mano che arrivano le risposte"""
     start_date = datetime.date.today().strftime("%Y%m%d")
     end_date = (datetime.date.today() + datetime.timedelta(days=1)).strftime("%Y%m%d")
+    # Dopo l'inizio di una nuova fascia la risposta in cache non contiene la fascia appena chiusa:
+    # il primo aggiornamento dell'ora la rilegge dal portale anche se il TTL non è scaduto
+    hour_start = datetime.datetime.now().replace(minute=0, second=0, microsecond=0).timestamp()
     
-    production_data = {}
+    def store_result(entity, future):
+        try:
+            store.update(entity, future.result())
+        except Exception as e:
+            # Log dell'errore dell'API, lo store mantiene gli ultimi dati validi
+            print(f"API error for {entity}: {e}")
+            if entity not in store.snapshot():
+                store.update(entity, {"error": "Failed to retrieve data"})
     
+    futures = []
     for entity in ENTITY_IDS:
-        url = f"{BASE_URL}?type=GenerationEnergy&eids={entity}&tz=US%2FPacific&start={start_date}&end={end_date}&binSize=Hour"
-        response = session.get(url)
-        
-        # Log della risposta dell'API
-        print(f"API Response for {entity}: {response.status_code}")
-        
-        if response.status_code == 200:
-            production_data[entity] = response.json()
-        else:
-            production_data[entity] = {"error": "Failed to retrieve data"}
-    
-    print("Production data received:", production_data)  # Log dei dati ricevuti
-    return production_data
+        future = submit_fetch(entity, start_date, end_date, "Hour", hour_start)
+        future.add_done_callback(lambda f, entity=entity: store_result(entity, f))
+        futures.append(future)
+    wait(futures)
+
+def refresher_loop():
+    while True:
+        try:
+            refresh_production()
+        except Exception as e:
+            print(f"Refresh error: {e}")
+        time.sleep(next_refresh_delay("Hour"))
+
+def start_refresher():
+    """Avvia (una sola volta) il thread che aggiorna lo store in background"""
+    global _refresher
+    with _refresher_lock:
+        if _refresher is None:
+            _refresher = threading.Thread(target=refresher_loop, name="AuroraVisionRefresher", daemon=True)
+            _refresher.start()
+
+# Funzione per ottenere i dati di produzione (solo lettura dallo store, nessuna chiamata di rete)
+def get_production():
+    return store.snapshot()
+
+# Punti mantenuti in ogni grafico (una settimana di fasce orarie)
+MAX_POINTS = 24 * 7
+
+def entity_series(entity_data):
+    """
+    Fasce con un valore di ogni campo di un'entità: [(nome, [(etichetta, valore)])].
+    L'ultima fascia con un valore è quella in corso e cambia ancora: viene esclusa
+    dalle serie e restituita a parte.
+    """
+    series = []
+    current = None
+    for field in entity_data.get('fields', []):
+        points = [(entry['startLabel'], entry['value']) for entry in field.get('values', [])
+                  if entry.get('value') is not None and entry.get('startLabel')]
+        if points:
+            current = points[-1]
+        series.append((field.get('entityName', ''), points[:-1]))
+    return series, current
+
+def current_text(current):
+    return f"Fascia in corso ({current[0]}): {current[1]} kWh" if current else ""
 
 # Inizializzazione dell'app Dash
 app = dash.Dash(__name__)
 
-# Layout dell'app
-app.layout = html.Div([
-    html.H1("Monitoraggio Impianti"),
-    dcc.Interval(
+def serve_layout():
+    """
+    Layout creato a ogni apertura della pagina con lo storico disponibile: un grafico per
+    entità (una traccia per campo) con ID stabili. Gli aggiornamenti successivi aggiungono
+    solo le fasce nuove con extendData, partendo dall'ultima etichetta salvata nello Store.
+    """
+    start_refresher()
+    store.wait_ready(FETCH_DEADLINE)
+    data = get_production()
+    children = [html.H1("Monitoraggio Impianti")]
+    last_labels = {}
+    
+    for entity_id in ENTITY_IDS:
+        series, current = entity_series(data.get(entity_id, {}))
+        # Almeno una traccia, così l'entità può ricevere dati anche se ora non risponde
+        traces = [{'x': [label for label, _ in points], 'y': [value for _, value in points],
+                   'type': 'line', 'name': name} for name, points in series] or [{'x': [], 'y': [], 'type': 'line', 'name': entity_id}]
+        last_labels[entity_id] = [points[-1][0] if points else "" for _, points in series] or [""]
+        title = next((name for name, _ in series if name), entity_id)
+        
+        children.append(dcc.Graph(
+            id=f'graph-{entity_id}',
+            figure={
+                'data': traces,
+                'layout': {
+                    'title': title,
+                    'xaxis': {'title': 'Time'},
+                    'yaxis': {'title': 'Generation Energy (kWh)'},
+                    'uirevision': entity_id
+                }
+            }
+        ))
+        children.append(html.Div(current_text(current), id=f'current-{entity_id}'))
+    
+    children.append(dcc.Store(id="last-labels", data=last_labels))
+    children.append(dcc.Interval(
         id="interval-update",
         interval=3 * 1000,  # Aggiorna ogni 3 secondi
         n_intervals=0
-    ),
-    html.Div(id="live-graphs")
-])
+    ))
+    return html.Div(children)
 
-# Callback per aggiornare i grafici
+# Layout dell'app (funzione: ogni pagina parte dallo storico aggiornato)
+app.layout = serve_layout
+
+# Callback per aggiornare i grafici: invia solo le fasce successive all'ultima già mostrata
 @app.callback(
-    Output("live-graphs", "children"),
-    Input("interval-update", "n_intervals")
+    [Output(f'graph-{entity_id}', 'extendData') for entity_id in ENTITY_IDS]
+    + [Output(f'current-{entity_id}', 'children') for entity_id in ENTITY_IDS]
+    + [Output("last-labels", "data")],
+    Input("interval-update", "n_intervals"),
+    State("last-labels", "data")
 )
-def update_graph(n_intervals):
+def update_graph(n_intervals, last_labels):
     data = get_production()  # Ottieni i dati di produzione
-    graphs = []
-
-    # Verifica se i dati sono nel formato corretto
-    if not data:
-        return [html.Div("No data available at the moment")]
-
-    for entity_id, entity_data in data.items():
-        print(f"Entity data for {entity_id}: {entity_data}")  # Log dei dati per ogni entità
+    extensions = []
+    currents = []
+    
+    for entity_id in ENTITY_IDS:
+        entity_data = data.get(entity_id, {})
+        if 'fields' not in entity_data:
+            # Entità non disponibile in questo giro: grafico e fascia in corso restano invariati
+            extensions.append(dash.no_update)
+            currents.append(dash.no_update)
+            continue
         
-        # Verifica se 'fields' è presente nei dati
-        if 'fields' in entity_data:
-            for field in entity_data['fields']:
-                # Verifica se 'values' è presente nel campo
-                if 'values' in field:
-                    values = [entry.get('value', None) for entry in field['values']]  # Usa get() per evitare KeyError
-                    labels = [entry.get('startLabel', '') for entry in field['values']]  # Usa get() per evitare KeyError
-                    
-                    # Crea il grafico con i dati di valori e etichette
-                    graphs.append(dcc.Graph(
-                        id=f'graph-{entity_id}',
-                        figure={
-                            'data': [
-                                {'x': labels, 'y': values, 'type': 'line', 'name': field['entityName']}
-                            ],
-                            'layout': {
-                                'title': field['entityName'],
-                                'xaxis': {'title': 'Time'},
-                                'yaxis': {'title': 'Generation Energy (kWh)'},
-                            }
-                        }
-                    ))
-        else:
-            graphs.append(html.Div(f"Error: No fields found for {entity_id}"))
-
-    if not graphs:
-        return [html.Div("No data to display")]
-
-    return graphs
+        series, current = entity_series(entity_data)
+        labels = last_labels.get(entity_id, [""])
+        xs, ys, indices = [], [], []
+        for index, (_, points) in enumerate(series[:len(labels)]):
+            new_points = [(label, value) for label, value in points if label > labels[index]]
+            if new_points:
+                xs.append([label for label, _ in new_points])
+                ys.append([value for _, value in new_points])
+                indices.append(index)
+                labels[index] = new_points[-1][0]
+        
+        last_labels[entity_id] = labels
+        extensions.append((dict(x=xs, y=ys), indices, MAX_POINTS) if indices else dash.no_update)
+        currents.append(current_text(current))
+    
+    return extensions + currents + [last_labels]
 
 # Avvio dell'app
 if __name__ == '__main__':
+    start_refresher()
     app.run_server(debug=True)
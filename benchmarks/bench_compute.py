@@ -0,0 +1,141 @@
+"""
+Benchmark dei calcoli statistici e del disegno dei grafici su dati sintetici.
+
+Misura StatisticsCalculator (calculate_statistics, calculate_monthly_data,
+calculate_daily_energy), PlottingManager.update_main_plot e i grafici della finestra
+Statistiche. Il disegno usa il backend Agg, quindi non serve un display; se matplotlib
+non è installato i benchmark di disegno vengono saltati.
+
+Esempio:
+    python benchmarks/bench_compute.py --days 30
+    python benchmarks/compare.py benchmarks/baseline_compute.json benchmarks/results/compute_<data>.json
+"""
+import argparse
+import os
+import shutil
+import tempfile
+
+import common
+from synthetic import PVCurveGenerator, aggregate, days_ending_today, write_energy_xml
+
+from config_manager import ConfigManager
+from data_storage import DataStorage
+from energy_statistics import StatisticsCalculator
+
+def run_statistics(calculator, repeat):
+    """Misura i calcoli statistici"""
+    results = {}
+    durations, _ = common.measure(lambda: calculator.calculate_statistics(30), repeat)
+    results["calculate_statistics_30d"] = common.summarize(durations)
+    durations, _ = common.measure(calculator.calculate_monthly_data, repeat)
+    results["calculate_monthly_data"] = common.summarize(durations)
+    durations, _ = common.measure(calculator.calculate_daily_energy, repeat)
+    results["calculate_daily_energy"] = common.summarize(durations)
+    return results
+
+def run_rendering(storage, calculator, repeat):
+    """
+    Misura il disegno dei grafici con il backend Agg
+
+    Returns:
+        dict: Risultati o None se matplotlib non è disponibile
+    """
+    try:
+        import matplotlib
+        matplotlib.use('Agg')
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from plotting import PlottingManager
+    except ImportError:
+        return None
+
+    manager = PlottingManager(storage, calculator)
+    results = {}
+
+    # Grafico principale: su un canvas Agg draw_idle disegna subito, quindi il disegno è incluso
+    fig = Figure(figsize=(10, 5), dpi=100)
+    ax = fig.add_subplot(111)
+    canvas = FigureCanvasAgg(fig)
+    for days in (1, 7):
+        durations, _ = common.measure(lambda: manager.update_main_plot(fig, ax, canvas, days), repeat)
+        results[f"update_main_plot_{days}d"] = common.summarize(durations)
+
+    # Grafici della finestra Statistiche, con dati già calcolati per misurare solo il disegno
+    stats = calculator.calculate_statistics(30)
+    monthly_energy = calculator.calculate_monthly_data()
+
+    def draw_statistics():
+        figure, _ = manager.build_statistics_figure(stats)
+        if figure is not None:
+            FigureCanvasAgg(figure).draw()
+
+    def draw_monthly():
+        figure, _ = manager.build_monthly_figure(monthly_energy)
+        if figure is not None:
+            FigureCanvasAgg(figure).draw()
+
+    durations, _ = common.measure(draw_statistics, repeat)
+    results["statistics_daily_plot"] = common.summarize(durations)
+    durations, _ = common.measure(draw_monthly, repeat)
+    results["statistics_monthly_plot"] = common.summarize(durations)
+    return results
+
+def run(days, cadence, repeat, seed):
+    """
+    Esegue tutti i benchmark di calcolo e disegno
+
+    Returns:
+        dict: Risultati del benchmark
+    """
+    results = {
+        "benchmark": "compute",
+        "environment": common.environment_info(),
+        "parameters": {"days": days, "cadence_seconds": cadence, "repeat": repeat, "seed": seed},
+        "benchmarks": {}
+    }
+
+    work_dir = tempfile.mkdtemp(prefix="energy_bench_")
+    try:
+        generator = PVCurveGenerator(cadence_seconds=cadence, seed=seed)
+        samples = aggregate(generator.generate(days_ending_today(days), days))
+        xml_path = os.path.join(work_dir, 'energy_data.xml')
+        write_energy_xml(xml_path, samples)
+        results["dataset"] = {"samples": len(samples), "file_size_bytes": os.path.getsize(xml_path)}
+
+        config_manager = ConfigManager(os.path.join(work_dir, 'config.ini'))
+        config_manager.set_setting('XML_FILE_PATH', xml_path)
+        config_manager.set_setting('DATA_RETENTION_DAYS', days + 1)
+        storage = DataStorage(config_manager)
+        calculator = StatisticsCalculator(storage)
+
+        results["benchmarks"].update(run_statistics(calculator, repeat))
+        rendering = run_rendering(storage, calculator, repeat)
+        if rendering is None:
+            results["skipped"] = ["rendering (matplotlib non disponibile)"]
+        else:
+            results["benchmarks"].update(rendering)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark di statistiche e grafici di Energy Monitor")
+    parser.add_argument("--days", type=int, default=30, help="Giorni di dati da generare")
+    parser.add_argument("--cadence", type=int, default=5, help="Intervallo tra i campioni in secondi")
+    parser.add_argument("--repeat", type=int, default=3, help="Ripetizioni di ogni misura")
+    parser.add_argument("--seed", type=int, default=42, help="Seme del generatore")
+    parser.add_argument("-o", "--output", help="File JSON dei risultati (default benchmarks/results/)")
+    args = parser.parse_args()
+
+    results = run(args.days, args.cadence, args.repeat, args.seed)
+    output_path = common.write_results(results, args.output, "compute")
+
+    for name, stats in results["benchmarks"].items():
+        print(f"{name:26} p50 {stats['p50_ms']:9.2f} ms  p99 {stats['p99_ms']:9.2f} ms")
+    for skipped in results.get("skipped", []):
+        print(f"Saltato: {skipped}")
+    print(f"Risultati salvati in: {output_path}")
+
+if __name__ == '__main__':
+    main()
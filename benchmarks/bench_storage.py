@@ -0,0 +1,135 @@
+"""
+Benchmark dello storage dei dati (DataStorage) su dati sintetici.
+
+Genera una serie realistica di più giorni (ed eventualmente più impianti, sommati
+nello storage che oggi è a impianto singolo), la scrive nel file XML e misura
+salvataggio, caricamento su 1/7/30/365 giorni, pulizia dei dati vecchi ed esportazioni.
+I risultati (percentili di latenza, throughput, picco di memoria, dimensione del file)
+vengono scritti in JSON per confrontare le esecuzioni nel tempo.
+
+Esempio:
+    python benchmarks/bench_storage.py --days 30 --plants 1
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+
+import common
+from synthetic import PVCurveGenerator, aggregate, days_ending_today, write_energy_xml
+
+from config_manager import ConfigManager
+from data_storage import DataStorage
+
+LOAD_WINDOWS = (1, 7, 30, 365)
+
+def create_storage(work_dir, xml_path, retention_days):
+    """Crea un DataStorage che usa il file XML indicato e una configurazione temporanea"""
+    config_manager = ConfigManager(os.path.join(work_dir, 'config.ini'))
+    config_manager.set_setting('XML_FILE_PATH', xml_path)
+    config_manager.set_setting('DATA_RETENTION_DAYS', retention_days)
+    return DataStorage(config_manager)
+
+def run(days, plants, cadence, repeat, save_calls, seed):
+    """
+    Esegue tutti i benchmark dello storage
+
+    Returns:
+        dict: Risultati del benchmark
+    """
+    results = {
+        "benchmark": "storage",
+        "environment": common.environment_info(),
+        "parameters": {"days": days, "plants": plants, "cadence_seconds": cadence,
+                       "repeat": repeat, "save_calls": save_calls, "seed": seed},
+        "backends": {}
+    }
+
+    work_dir = tempfile.mkdtemp(prefix="energy_bench_")
+    try:
+        generation_start = time.perf_counter()
+        generator = PVCurveGenerator(cadence_seconds=cadence, seed=seed)
+        samples = aggregate(generator.generate(days_ending_today(days), days, plants))
+        generation_seconds = time.perf_counter() - generation_start
+
+        source_path = os.path.join(work_dir, 'source.xml')
+        write_energy_xml(source_path, samples)
+        results["dataset"] = {
+            "samples": len(samples),
+            "generation_seconds": generation_seconds,
+            "file_size_bytes": os.path.getsize(source_path)
+        }
+
+        # Lo storage attuale ha un solo backend (file XML)
+        results["backends"]["xml"] = run_backend(work_dir, source_path, days, repeat, save_calls)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return results
+
+def run_backend(work_dir, source_path, days, repeat, save_calls):
+    """Esegue i benchmark su una copia del file generato"""
+    xml_path = os.path.join(work_dir, 'energy_data.xml')
+    shutil.copy2(source_path, xml_path)
+    storage = create_storage(work_dir, xml_path, days + 1)
+    backend = {}
+
+    # Caricamento su finestre crescenti (quelle più lunghe dei dati generati caricano tutto)
+    for window in LOAD_WINDOWS:
+        durations, (timestamps, _) = common.measure(lambda: storage.load_recent_data(days=window), repeat)
+        backend[f"load_{window}d"] = dict(common.summarize(durations, len(timestamps)),
+                                          covered_days=min(window, days))
+
+    # Salvataggio di un campione (il file viene riletto e riscritto ad ogni chiamata)
+    size_before = os.path.getsize(xml_path)
+    save_durations, _ = common.measure(lambda: storage.save_power_data(time.strftime('%H:%M:%S'), 1.234), save_calls)
+    backend["save"] = common.summarize(save_durations, 1)
+    backend["save"]["file_size_bytes"] = os.path.getsize(xml_path)
+    backend["save"]["bytes_per_sample"] = (os.path.getsize(xml_path) - size_before) / max(save_calls, 1)
+
+    # Pulizia dei dati più vecchi della metà del periodo, ripartendo ogni volta dal file completo
+    storage.retention_days = max(days // 2, 1)
+    clean_durations, _ = common.measure(
+        lambda: storage.clean_old_data(ET.parse(xml_path)),
+        repeat,
+        setup=lambda: shutil.copy2(source_path, xml_path)
+    )
+    backend["clean_old_data"] = common.summarize(clean_durations)
+    backend["clean_old_data"]["file_size_after_bytes"] = os.path.getsize(xml_path)
+    shutil.copy2(source_path, xml_path)
+
+    # Esportazioni di tutti i dati
+    csv_path = os.path.join(work_dir, 'export.csv')
+    csv_durations, _ = common.measure(lambda: storage.export_to_csv(csv_path), repeat)
+    backend["export_csv"] = common.summarize(csv_durations)
+    backend["export_csv"]["file_size_bytes"] = os.path.getsize(csv_path)
+
+    export_xml_path = os.path.join(work_dir, 'export.xml')
+    xml_durations, _ = common.measure(lambda: storage.export_to_xml(export_xml_path), repeat)
+    backend["export_xml"] = common.summarize(xml_durations)
+    backend["export_xml"]["file_size_bytes"] = os.path.getsize(export_xml_path)
+
+    return backend
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dello storage di Energy Monitor su dati sintetici")
+    parser.add_argument("--days", type=int, default=30, help="Giorni di dati da generare")
+    parser.add_argument("--plants", type=int, default=1, help="Numero di impianti (sommati nello storage)")
+    parser.add_argument("--cadence", type=int, default=5, help="Intervallo tra i campioni in secondi")
+    parser.add_argument("--repeat", type=int, default=5, help="Ripetizioni di ogni misura")
+    parser.add_argument("--save-calls", type=int, default=20, help="Numero di salvataggi misurati")
+    parser.add_argument("--seed", type=int, default=42, help="Seme del generatore")
+    parser.add_argument("-o", "--output", help="File JSON dei risultati (default benchmarks/results/)")
+    args = parser.parse_args()
+
+    results = run(args.days, args.plants, args.cadence, args.repeat, args.save_calls, args.seed)
+    output_path = common.write_results(results, args.output, "storage")
+
+    for name, stats in results["backends"]["xml"].items():
+        print(f"{name:16} p50 {stats['p50_ms']:9.2f} ms  p99 {stats['p99_ms']:9.2f} ms")
+    print(f"Risultati salvati in: {output_path}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime
+
+# I benchmark usano i moduli di test/ (DataStorage, StatisticsCalculator, ...);
+# quelli condivisi (metrics, network) sono installati con il progetto (pip install -e .)
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(BENCHMARKS_DIR)
+# In coda: i moduli di test/ non devono nascondere quelli della libreria standard
+sys.path.append(os.path.join(PROJECT_DIR, 'test'))
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+def percentile(sorted_values, fraction):
+    """Percentile per interpolazione lineare di una lista già ordinata"""
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+def summarize(durations, items_per_call=None):
+    """
+    Riassume le durate di una serie di chiamate
+
+    Args:
+        durations: Durate in secondi
+        items_per_call: Elementi elaborati per chiamata, per il calcolo del throughput
+
+    Returns:
+        dict: Numero di chiamate, percentili in ms ed eventuale throughput (elementi/s)
+    """
+    ordered = sorted(durations)
+    result = {
+        "calls": len(ordered),
+        "mean_ms": sum(ordered) / len(ordered) * 1000 if ordered else None,
+        "p50_ms": percentile(ordered, 0.50) * 1000 if ordered else None,
+        "p90_ms": percentile(ordered, 0.90) * 1000 if ordered else None,
+        "p99_ms": percentile(ordered, 0.99) * 1000 if ordered else None,
+        "max_ms": ordered[-1] * 1000 if ordered else None,
+        "peak_rss_mb": peak_rss_mb()
+    }
+    if items_per_call is not None and ordered:
+        result["items_per_call"] = items_per_call
+        result["throughput_per_s"] = items_per_call / (sum(ordered) / len(ordered))
+    return result
+
+def measure(func, repeat, setup=None):
+    """
+    Misura `repeat` esecuzioni di func, eseguendo setup (non misurato) prima di ognuna
+
+    Returns:
+        tuple: (durate in secondi, risultato dell'ultima chiamata)
+    """
+    durations = []
+    result = None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        result = func()
+        durations.append(time.perf_counter() - start)
+    return durations, result
+
+def peak_rss_mb():
+    """Picco di memoria residente del processo in MB (None se non disponibile)"""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux restituisce kB, macOS byte
+        return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+    try:
+        import psutil
+        return psutil.Process().memory_info().peak_wset / (1024 * 1024)
+    except (ImportError, AttributeError):
+        return None
+
+def current_rss_mb():
+    """Memoria residente attuale del processo in MB (None se non disponibile)"""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    except ImportError:
+        pass
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def environment_info():
+    """Informazioni sull'ambiente di esecuzione da allegare ai risultati"""
+    return {
+        "date": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine()
+    }
+
+def write_results(results, output_path, prefix):
+    """
+    Scrive i risultati in JSON
+
+    Args:
+        results: Dizionario dei risultati
+        output_path: Percorso del file o None per benchmarks/results/<prefix>_<data>.json
+        prefix: Prefisso del nome file predefinito
+
+    Returns:
+        str: Percorso del file scritto
+    """
+    if output_path is None:
+        results_dir = os.path.join(BENCHMARKS_DIR, 'results')
+        os.makedirs(results_dir, exist_ok=True)
+        output_path = os.path.join(results_dir, f"{prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+        f.write("\n")
+    return output_path
@@ -0,0 +1,104 @@
+"""
+Confronta i risultati di un benchmark con una baseline e segnala le regressioni.
+
+Per ogni misura presente in entrambi i file confronta il tempo mediano (p50): una
+misura più lenta della baseline oltre la soglia è una regressione e il comando termina
+con codice 1, così può essere usato in uno script di verifica.
+
+Esempio:
+    python benchmarks/compare.py benchmarks/baseline_compute.json risultati.json --threshold 0.25
+    python benchmarks/compare.py benchmarks/baseline_compute.json risultati.json --update
+"""
+import argparse
+import json
+import shutil
+import sys
+
+def flatten(results, prefix=""):
+    """
+    Estrae le misure (dizionari con p50_ms) da un file di risultati, a qualunque livello
+
+    Returns:
+        dict: Percorso della misura (es. 'backends.xml.save') -> p50 in ms
+    """
+    measures = {}
+    for key, value in results.items():
+        if not isinstance(value, dict):
+            continue
+        path = f"{prefix}{key}"
+        if value.get("p50_ms") is not None:
+            measures[path] = value["p50_ms"]
+        else:
+            measures.update(flatten(value, f"{path}."))
+    return measures
+
+def compare(baseline, current, threshold):
+    """
+    Confronta due insiemi di misure
+
+    Args:
+        baseline: Risultati di riferimento
+        current: Risultati da verificare
+        threshold: Rallentamento relativo tollerato (0.2 = 20%)
+
+    Returns:
+        tuple: (righe del rapporto, numero di regressioni)
+    """
+    baseline_measures = flatten(baseline)
+    current_measures = flatten(current)
+    lines = []
+    regressions = 0
+
+    for name in sorted(set(baseline_measures) | set(current_measures)):
+        if name not in current_measures:
+            lines.append(f"  {name:45} assente nei risultati correnti")
+            continue
+        if name not in baseline_measures:
+            lines.append(f"  {name:45} nuova misura ({current_measures[name]:.2f} ms)")
+            continue
+        before = baseline_measures[name]
+        after = current_measures[name]
+        change = (after - before) / before if before > 0 else 0.0
+        if change > threshold:
+            status = "REGRESSIONE"
+            regressions += 1
+        elif change < -threshold:
+            status = "miglioramento"
+        else:
+            status = "ok"
+        lines.append(f"  {name:45} {before:10.2f} -> {after:10.2f} ms  {change:+7.1%}  {status}")
+
+    return lines, regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Confronto dei risultati dei benchmark con una baseline")
+    parser.add_argument("baseline", help="File JSON della baseline")
+    parser.add_argument("current", help="File JSON dei risultati da verificare")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Rallentamento tollerato (default 0.2 = 20%%)")
+    parser.add_argument("--update", action="store_true", help="Sostituisce la baseline con i risultati correnti")
+    args = parser.parse_args()
+
+    if args.update:
+        shutil.copyfile(args.current, args.baseline)
+        print(f"Baseline aggiornata: {args.baseline}")
+        return 0
+
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    with open(args.current, encoding='utf-8') as f:
+        current = json.load(f)
+
+    if baseline.get("parameters") != current.get("parameters"):
+        print("Attenzione: i parametri dei due benchmark sono diversi, il confronto può non essere significativo")
+
+    lines, regressions = compare(baseline, current, args.threshold)
+    print(f"Confronto con {args.baseline} (soglia {args.threshold:.0%}):")
+    print("\n".join(lines))
+    if regressions:
+        print(f"{regressions} regressioni oltre la soglia")
+        return 1
+    print("Nessuna regressione")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
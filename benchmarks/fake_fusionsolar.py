@@ -0,0 +1,220 @@
+"""
+Client FusionSolar simulato e orologio virtuale per le prove di lunga durata.
+
+FakeFusionSolarClient ha la stessa interfaccia usata da FusionSolarInterface
+(costruttore con login, get_power_status, get_plant_info) e restituisce curve di
+produzione sintetiche con i contatori di energia dell'inverter, con guasti iniettati: sessioni scadute, timeout e captcha al login.
+VirtualClock sostituisce datetime.now, time.time, time.monotonic, time.strftime e
+time.sleep nei moduli indicati, così giorni di funzionamento scorrono in pochi minuti.
+"""
+import random
+import sys
+import time as real_time
+import types
+from datetime import datetime, timedelta
+
+from synthetic import PVCurveGenerator
+
+class SessionExpiredError(Exception):
+    """Sessione scaduta lato server"""
+
+class CaptchaRequiredError(Exception):
+    """Il login richiede la risoluzione di un captcha"""
+
+class VirtualClock:
+    """Orologio che avanza solo quando richiesto"""
+    def __init__(self, start):
+        """
+        Args:
+            start: Istante iniziale (datetime)
+        """
+        self.current = start
+        self.epoch_offset = start.timestamp()
+        self.elapsed = 0.0
+
+    def now(self):
+        return self.current
+
+    def advance(self, seconds):
+        """Fa avanzare l'orologio di `seconds` secondi"""
+        self.elapsed += seconds
+        self.current += timedelta(seconds=seconds)
+
+    def install(self, *modules):
+        """
+        Sostituisce datetime e time nei moduli indicati con versioni basate sull'orologio
+
+        Args:
+            modules: Moduli che hanno importato `datetime` (classe) e/o `time`
+        """
+        clock = self
+
+        class VirtualDateTime(datetime):
+            @classmethod
+            def now(cls, tz=None):
+                return clock.current
+
+            @classmethod
+            def today(cls):
+                return clock.current
+
+        virtual_time = types.SimpleNamespace(
+            time=lambda: clock.epoch_offset + clock.elapsed,
+            monotonic=lambda: clock.elapsed,
+            perf_counter=real_time.perf_counter,
+            sleep=clock.advance,
+            strftime=lambda fmt, t=None: real_time.strftime(fmt, t if t is not None else clock.current.timetuple()),
+            localtime=lambda secs=None: real_time.localtime(secs if secs is not None else clock.epoch_offset + clock.elapsed)
+        )
+
+        for module in modules:
+            if isinstance(getattr(module, 'datetime', None), type):
+                module.datetime = VirtualDateTime
+            if getattr(module, 'time', None) is real_time:
+                module.time = virtual_time
+
+class FaultPlan:
+    """Probabilità e durate dei guasti iniettati nel client simulato"""
+    def __init__(self, session_ttl=6 * 3600, timeout_rate=0.002, captcha_rate=0.05, outage_rate=0.0005, seed=7):
+        """
+        Args:
+            session_ttl: Durata di una sessione in secondi virtuali (0 = infinita)
+            timeout_rate: Probabilità che una lettura vada in timeout
+            captcha_rate: Probabilità che un login richieda un captcha
+            outage_rate: Probabilità che una richiesta o una sonda non raggiunga il portale (rete assente)
+            seed: Seme del generatore casuale
+        """
+        self.session_ttl = session_ttl
+        self.timeout_rate = timeout_rate
+        self.captcha_rate = captcha_rate
+        self.outage_rate = outage_rate
+        self.rng = random.Random(seed)
+        self.counts = {"logins": 0, "captcha": 0, "timeouts": 0, "expired": 0, "outages": 0, "reads": 0,
+                       "probes": 0, "dns_lookups": 0}
+
+    def hit(self, rate):
+        return rate > 0 and self.rng.random() < rate
+
+class FakeFusionSolarClient:
+    """Sostituto in-process di fusion_solar_py.client.FusionSolarClient"""
+    clock = None
+    faults = None
+    plants = 1
+    generator = PVCurveGenerator()
+    energy_today = 0.0
+    energy_total = 0.0
+    counters_time = None
+
+    def __init__(self, username, password, captcha_model_path=None, huawei_subdomain=None):
+        self.faults.counts["logins"] += 1
+        if self.faults.hit(self.faults.captcha_rate):
+            self.faults.counts["captcha"] += 1
+            raise CaptchaRequiredError("Login fallito: captcha richiesto")
+        self.login_time = self.clock.elapsed
+        self.attenuation = 1.0
+
+    def _check_session(self):
+        if self.faults.hit(self.faults.outage_rate):
+            self.faults.counts["outages"] += 1
+            raise ConnectionError("Rete non raggiungibile (simulata)")
+        if self.faults.session_ttl and self.clock.elapsed - self.login_time > self.faults.session_ttl:
+            self.faults.counts["expired"] += 1
+            raise SessionExpiredError("Sessione scaduta")
+        if self.faults.hit(self.faults.timeout_rate):
+            self.faults.counts["timeouts"] += 1
+            raise TimeoutError("Timeout della richiesta")
+
+    def get_power_status(self):
+        self._check_session()
+        self.faults.counts["reads"] += 1
+        self.attenuation = min(1.0, max(0.2, self.attenuation + self.faults.rng.gauss(0, 0.03)))
+        power = round(self.generator.clear_sky(self.clock.now()) * self.attenuation, 3)
+        self._update_counters(power)
+        return types.SimpleNamespace(current_power_kw=power, energy_today_kwh=round(FakeFusionSolarClient.energy_today, 3),
+                                     energy_kwh=round(FakeFusionSolarClient.energy_total, 3))
+
+    @classmethod
+    def _update_counters(cls, power):
+        """Contatori di energia dell'inverter simulato, condivisi tra le sessioni"""
+        now = cls.clock.now()
+        if cls.counters_time is not None:
+            if now.date() != cls.counters_time.date():
+                cls.energy_today = 0.0
+            energy = power * (now - cls.counters_time).total_seconds() / 3600
+            cls.energy_today += energy
+            cls.energy_total += energy
+        cls.counters_time = now
+
+    def get_station_list(self):
+        self._check_session()
+        return [{"dn": f"NE={1000 + i}", "name": f"Impianto simulato {i + 1}"} for i in range(self.plants)]
+
+    def get_current_plant_data(self, plant_id):
+        self._check_session()
+        self.faults.counts["reads"] += 1
+        plant_index = int(plant_id.split('=')[-1]) - 1000
+        power = self.generator.clear_sky(self.clock.now()) * (1.0 + 0.15 * plant_index) * self.attenuation
+        return {"currentPower": round(power, 3)}
+
+    def get_plant_info(self):
+        self._check_session()
+        return {"plant": "simulato"}
+
+class FakeNetwork:
+    """Sostituisce il modulo socket di network: risoluzione DNS e connessioni simulate"""
+    error = OSError
+
+    def __init__(self, faults):
+        self.faults = faults
+
+    def getaddrinfo(self, host, port, *args, **kwargs):
+        self.faults.counts["dns_lookups"] += 1
+        import socket
+        return [(socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP, '', ('127.0.0.1', port))]
+
+    def create_connection(self, address, timeout=None):
+        if self.faults.hit(self.faults.outage_rate):
+            self.faults.counts["outages"] += 1
+            raise OSError("Rete non raggiungibile (simulata)")
+        return types.SimpleNamespace(close=lambda: None)
+
+    def __getattr__(self, name):
+        import socket
+        return getattr(socket, name)
+
+class FakeProbeConnection:
+    """Sostituto di network.KeepAliveConnection: connessione keep-alive della sonda su FakeNetwork"""
+    network = None
+
+    def __init__(self, host, port, address, timeout=None):
+        self.address = (address, port)
+        self.timeout = timeout
+        self.sock = None
+
+    def request(self, method, url):
+        if self.sock is None:
+            self.sock = self.network.create_connection(self.address, self.timeout)
+        self.network.faults.counts["probes"] += 1
+
+    def getresponse(self):
+        return types.SimpleNamespace(status=302, read=lambda: b'')
+
+    def close(self):
+        self.sock = None
+
+def import_fusion_solar_interface():
+    """
+    Importa fusion_solar_interface anche dove fusion_solar_py non è installato:
+    la prova usa comunque solo il client simulato.
+    """
+    try:
+        import fusion_solar_py.client  # noqa: F401
+    except ImportError:
+        package = types.ModuleType('fusion_solar_py')
+        client_module = types.ModuleType('fusion_solar_py.client')
+        client_module.FusionSolarClient = FakeFusionSolarClient
+        package.client = client_module
+        sys.modules['fusion_solar_py'] = package
+        sys.modules['fusion_solar_py.client'] = client_module
+    import fusion_solar_interface
+    return fusion_solar_interface
@@ -0,0 +1,393 @@
+"""
+Server HTTP locale che simula gli endpoint FusionSolar usati da fusion_solar_py.
+
+Implementa login (pubkey, validateUser, conferma del ticket), keep-alive con token CSRF,
+elenco impianti e potenza attuale (totale e per impianto), con latenza, percentuale di
+errori, captcha e scadenza della sessione configurabili. È scritto con asyncio (stream
+e HTTP/1.1 con keep-alive) e non richiede librerie esterne.
+
+Il comando `load` avvia il server in un thread e simula uno o più account, ciascuno con
+una sessione del vero FusionSolarInterface (serve fusion_solar_py installato) e un
+PlantPoller che legge tutti i suoi impianti a ogni ciclo. Le connessioni verso
+*.fusionsolar.huawei.com vengono deviate al server locale senza cambiare gli URL visti
+dal client (cookie, redirect e sonda di connettività restano sul dominio del portale),
+quindi non serve rete.
+
+Esempi:
+    python benchmarks/mock_fusionsolar_server.py serve --port 8800 --latency-ms 150 --error-rate 0.02
+    python benchmarks/mock_fusionsolar_server.py load --port 0 --sessions 2 --plants 10 --duration 60 --session-ttl 120
+"""
+import argparse
+import asyncio
+import http.client
+import json
+import os
+import random
+import secrets
+import socket
+import tempfile
+import threading
+import time
+import types
+from datetime import datetime
+from urllib.parse import urlsplit, parse_qs
+
+import common
+from synthetic import PVCurveGenerator
+
+PORTAL_DOMAIN = "fusionsolar.huawei.com"
+
+REASONS = {200: "OK", 302: "Found", 401: "Unauthorized", 404: "Not Found", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+class MockSettings:
+    """Comportamento del server simulato"""
+    def __init__(self, latency_ms=100, latency_jitter_ms=50, error_rate=0.0, session_ttl=1800,
+                 captcha_rate=0.0, plants=1, seed=11):
+        """
+        Args:
+            latency_ms: Latenza media di ogni risposta
+            latency_jitter_ms: Variazione massima (+/-) della latenza
+            error_rate: Probabilità di rispondere 500/503 a una richiesta
+            session_ttl: Durata della sessione in secondi (0 = infinita)
+            captcha_rate: Probabilità che un login richieda un captcha
+            plants: Numero di impianti dell'account
+            seed: Seme del generatore casuale
+        """
+        self.latency_ms = latency_ms
+        self.latency_jitter_ms = latency_jitter_ms
+        self.error_rate = error_rate
+        self.session_ttl = session_ttl
+        self.captcha_rate = captcha_rate
+        self.plants = plants
+        self.rng = random.Random(seed)
+
+class MockFusionSolarServer:
+    """Server asyncio che risponde come il portale FusionSolar"""
+    def __init__(self, settings):
+        self.settings = settings
+        self.sessions = {}
+        self.generator = PVCurveGenerator()
+        self.stats = {"requests": 0, "logins": 0, "captcha": 0, "expired": 0, "errors": 0, "not_found": 0, "connections": 0}
+        self.server = None
+
+    async def start(self, host='127.0.0.1', port=8800):
+        self.server = await asyncio.start_server(self.handle_connection, host, port)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        """Chiude il server e le connessioni ancora aperte"""
+        self.server.close()
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def handle_connection(self, reader, writer):
+        """Serve le richieste di una connessione finché il client la mantiene aperta"""
+        self.stats["connections"] += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode('latin-1').split(' ', 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0) or 0))
+
+                status, response_headers, payload = await self.dispatch(method, target, headers, body)
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                head = [f"HTTP/1.1 {status} {REASONS.get(status, 'OK')}",
+                        f"Content-Length: {len(payload)}",
+                        f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+                head += [f"{name}: {value}" for name, value in response_headers]
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode('latin-1') + payload)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def dispatch(self, method, target, headers, body):
+        """
+        Smista la richiesta all'endpoint simulato
+
+        Returns:
+            tuple: (stato HTTP, lista di header, corpo in byte)
+        """
+        self.stats["requests"] += 1
+        settings = self.settings
+        latency = settings.latency_ms + settings.rng.uniform(-settings.latency_jitter_ms, settings.latency_jitter_ms)
+        await asyncio.sleep(max(latency, 0) / 1000)
+
+        url = urlsplit(target)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        path = url.path
+
+        if path == '/__stats':
+            return self.json(200, dict(self.stats, sessions=len(self.sessions)))
+        if settings.error_rate and settings.rng.random() < settings.error_rate:
+            self.stats["errors"] += 1
+            return self.json(settings.rng.choice((500, 503)), {"success": False, "message": "Errore simulato"})
+
+        if path.endswith('/unisso/pubkey'):
+            return self.json(200, {"enableEncrypt": False, "pubKey": "", "version": "mock"})
+        if 'validateUser' in path:
+            return self.login(headers)
+        if 'on-sso-credential-ready' in path or path.endswith('/unisso/login.action'):
+            return 302, [("Location", "/uniportal/pvmswebsite/assets/build/cloud.html")], b""
+        if path.endswith('cloud.html'):
+            return 200, [("Content-Type", "text/html")], b"<html></html>"
+
+        session = self.session_from_headers(headers)
+        if 'is-session-alive' in path:
+            return self.json(200, {"code": 0 if session is not None else 1})
+
+        # Tutti gli endpoint seguenti richiedono una sessione valida
+        if session is None:
+            return self.json(401, {"success": False, "message": "Sessione non valida o scaduta"})
+
+        if 'keep-alive' in path:
+            return self.json(200, {"code": 0, "payload": session["csrf"]})
+        if 'company/current' in path:
+            return self.json(200, {"data": {"moDn": "NE=1", "name": "Azienda simulata"}})
+        if 'station-list' in path:
+            return self.json(200, {"success": True, "data": {"total": settings.plants, "list": [
+                {"dn": f"NE={1000 + i}", "name": f"Impianto simulato {i + 1}", "capacity": 6.0 + i}
+                for i in range(settings.plants)]}})
+        if 'total-real-kpi' in path:
+            power = sum(self.plant_power(i) for i in range(settings.plants))
+            return self.json(200, {"success": True, "data": self.kpi(power)})
+        if 'station-real-kpi' in path or 'energy-flow' in path:
+            plant_index = int(params.get('stationDn', 'NE=1000').split('=')[-1]) - 1000
+            return self.json(200, {"success": True, "data": self.kpi(self.plant_power(plant_index))})
+
+        self.stats["not_found"] += 1
+        return self.json(404, {"success": False, "message": f"Endpoint non simulato: {path}"})
+
+    def login(self, headers):
+        """Simula validateUser: crea la sessione o richiede un captcha"""
+        self.stats["logins"] += 1
+        if self.settings.captcha_rate and self.settings.rng.random() < self.settings.captcha_rate:
+            self.stats["captcha"] += 1
+            return self.json(200, {"errorCode": "411", "errorMsg": "Verification code required"})
+        token = secrets.token_hex(16)
+        self.sessions[token] = {"created": time.monotonic(), "csrf": secrets.token_hex(8)}
+        cookie = f"dp-session={token}; Path=/"
+        # Come il portale: il cookie vale per tutti i sottodomini (login su eu5, dati su region01eu5)
+        if headers.get('host', '').split(':')[0].endswith(PORTAL_DOMAIN):
+            cookie += f"; Domain={PORTAL_DOMAIN}"
+        return 200, [("Set-Cookie", cookie), ("Content-Type", "application/json")], json.dumps({
+            "errorCode": None,
+            "errorMsg": None,
+            "respMultiRegionName": ["-1", f"/rest/dp/web/v1/auth/on-sso-credential-ready?ticket=ST-{token}&regionName=region001"],
+            "redirectURL": f"/rest/dp/web/v1/auth/on-sso-credential-ready?ticket=ST-{token}"
+        }).encode('utf-8')
+
+    def session_from_headers(self, headers):
+        """Restituisce la sessione indicata dal cookie, None se assente o scaduta"""
+        for part in headers.get('cookie', '').split(';'):
+            name, _, value = part.strip().partition('=')
+            if name == 'dp-session' and value in self.sessions:
+                session = self.sessions[value]
+                if self.settings.session_ttl and time.monotonic() - session["created"] > self.settings.session_ttl:
+                    del self.sessions[value]
+                    self.stats["expired"] += 1
+                    return None
+                return session
+        return None
+
+    def plant_power(self, plant_index):
+        """Potenza simulata di un impianto all'ora corrente"""
+        return round(self.generator.clear_sky(datetime.now()) * (1.0 + 0.15 * plant_index)
+                     * self.settings.rng.uniform(0.6, 1.0), 3)
+
+    def kpi(self, power):
+        return {"currentPower": power, "dailyEnergy": round(power * 4.2, 2), "cumulativeEnergy": round(power * 5000, 2),
+                "monthEnergy": round(power * 120, 2), "yearEnergy": round(power * 1400, 2)}
+
+    def json(self, status, data):
+        return status, [("Content-Type", "application/json")], json.dumps(data).encode('utf-8')
+
+class MockServerThread:
+    """Esegue il server simulato in un thread con il proprio event loop"""
+    def __init__(self, settings, host='127.0.0.1', port=0):
+        self.mock = MockFusionSolarServer(settings)
+        self.host = host
+        self.port = port
+        self.loop = asyncio.new_event_loop()
+        self.ready = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="MockFusionSolar", daemon=True)
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.port = self.loop.run_until_complete(self.mock.start(self.host, self.port))
+        self.ready.set()
+        self.loop.run_forever()
+
+    def start(self):
+        self.thread.start()
+        self.ready.wait()
+        return f"http://{self.host}:{self.port}"
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self.mock.stop(), self.loop).result(timeout=5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=5)
+
+def route_requests_to(base_url):
+    """
+    Devia al server locale le connessioni verso *.fusionsolar.huawei.com
+
+    Il client continua a usare gli URL del portale: solo la richiesta inviata sulla rete
+    (una copia, con l'header Host originale) va al server simulato, mentre risposta e
+    richiesta restituite a requests mantengono l'URL del portale. Cookie e redirect
+    vengono quindi gestiti sul dominio del portale come in produzione. Anche la sonda
+    di connettività di network risolve il portale sull'indirizzo del server simulato.
+
+    Args:
+        base_url: Indirizzo del server simulato (es. http://127.0.0.1:8800)
+    """
+    import requests.adapters
+    import network
+    original_send = requests.adapters.HTTPAdapter.send
+    target = urlsplit(base_url)
+
+    def send(adapter, request, **kwargs):
+        url = urlsplit(request.url)
+        if not (url.hostname or '').endswith(PORTAL_DOMAIN):
+            return original_send(adapter, request, **kwargs)
+        routed = request.copy()
+        routed.url = url._replace(scheme=target.scheme, netloc=target.netloc).geturl()
+        routed.headers['Host'] = url.netloc
+        response = original_send(adapter, routed, **kwargs)
+        response.url = request.url
+        response.request = request
+        return response
+
+    def getaddrinfo(host, port, *args, **kwargs):
+        if host.endswith(PORTAL_DOMAIN):
+            host, port = target.hostname, target.port
+        return socket.getaddrinfo(host, port, *args, **kwargs)
+
+    class MockProbeConnection(http.client.HTTPConnection):
+        """Sonda di network.ConnectivityMonitor in HTTP verso il server simulato"""
+        def __init__(self, host, port, address, timeout=None):
+            super().__init__(address, target.port, timeout=timeout)
+
+    requests.adapters.HTTPAdapter.send = send
+    network.socket = types.SimpleNamespace(getaddrinfo=getaddrinfo, create_connection=socket.create_connection,
+                                           SOCK_STREAM=socket.SOCK_STREAM)
+    network.ConnectivityMonitor.connection_class = MockProbeConnection
+
+def run_load(args):
+    """
+    Simula più account, ciascuno con una sessione FusionSolarInterface e un PlantPoller
+    che legge in parallelo tutti gli impianti dell'account, contro il server simulato
+
+    Returns:
+        dict: Durata dei cicli, letture degli impianti, errori e comportamento dei login
+    """
+    from config_manager import ConfigManager
+    from fusion_solar_interface import FusionSolarInterface
+    from plant_poller import PlantPoller
+
+    settings = MockSettings(args.latency_ms, args.jitter_ms, args.error_rate, args.session_ttl, args.captcha_rate, args.plants)
+    server = MockServerThread(settings, port=args.port)
+    base_url = server.start()
+    route_requests_to(base_url)
+
+    work_dir = tempfile.mkdtemp(prefix="energy_mock_")
+    config_manager = ConfigManager(os.path.join(work_dir, 'config.ini'))
+    config_manager.set_credential('USERNAME', 'mock')
+    config_manager.set_credential('PASSWORD', 'mock')
+    config_manager.set_credential('SUBDOMAIN', 'region01eu5')
+
+    cycles = []
+    counts = {"plant_reads": 0, "plant_failures": 0, "failed_cycles": 0}
+    lock = threading.Lock()
+    deadline = time.monotonic() + args.duration
+
+    def poll_account():
+        interface = FusionSolarInterface(config_manager)
+        poller = PlantPoller(interface, max_workers=args.workers)
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            status = poller.poll()
+            with lock:
+                cycles.append(time.perf_counter() - start)
+                if status is None:
+                    counts["failed_cycles"] += 1
+                else:
+                    counts["plant_reads"] += len(status.plants)
+                    counts["plant_failures"] += len(status.failed)
+            time.sleep(args.interval)
+        poller.shutdown()
+
+    threads = [threading.Thread(target=poll_account, daemon=True) for _ in range(args.sessions)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    server.stop()
+
+    return {
+        "benchmark": "fusionsolar_load",
+        "environment": common.environment_info(),
+        "parameters": vars(args),
+        "cycles": dict(common.summarize(cycles), failed=counts["failed_cycles"]),
+        "plants": {"reads": counts["plant_reads"], "failures": counts["plant_failures"],
+                   "reads_per_second": counts["plant_reads"] / args.duration},
+        "server": dict(server.mock.stats)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Server FusionSolar simulato per prove di carico senza rete")
+    parser.add_argument("mode", choices=("serve", "load"), help="serve: solo server, load: server e prova di carico")
+    parser.add_argument("--port", type=int, default=8800, help="Porta del server (0 = libera)")
+    parser.add_argument("--latency-ms", type=float, default=100, help="Latenza media delle risposte")
+    parser.add_argument("--jitter-ms", type=float, default=50, help="Variazione della latenza")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probabilità di errore 5xx")
+    parser.add_argument("--session-ttl", type=int, default=1800, help="Durata della sessione in secondi")
+    parser.add_argument("--captcha-rate", type=float, default=0.0, help="Probabilità di captcha al login")
+    parser.add_argument("--plants", type=int, default=1, help="Impianti simulati per account")
+    parser.add_argument("--sessions", type=int, default=1, help="Account simulati in parallelo, ciascuno con la propria sessione (load)")
+    parser.add_argument("--workers", type=int, default=8, help="Letture contemporanee degli impianti di una sessione (load)")
+    parser.add_argument("--duration", type=float, default=60, help="Durata della prova di carico in secondi")
+    parser.add_argument("--interval", type=float, default=1, help="Pausa tra due cicli di lettura di ogni account")
+    parser.add_argument("-o", "--output", help="File JSON dei risultati della prova (default benchmarks/results/)")
+    args = parser.parse_args()
+
+    if args.mode == 'serve':
+        settings = MockSettings(args.latency_ms, args.jitter_ms, args.error_rate, args.session_ttl,
+                                args.captcha_rate, args.plants)
+
+        async def serve():
+            mock = MockFusionSolarServer(settings)
+            port = await mock.start(port=args.port)
+            print(f"Server FusionSolar simulato su http://127.0.0.1:{port} (statistiche su /__stats)")
+            await asyncio.Event().wait()
+
+        try:
+            asyncio.run(serve())
+        except KeyboardInterrupt:
+            pass
+        return
+
+    results = run_load(args)
+    output_path = common.write_results(results, args.output, "fusionsolar_load")
+    cycles, plants = results["cycles"], results["plants"]
+    print(f"{cycles['calls']} cicli (p50 {cycles['p50_ms']:.1f} ms, falliti {cycles['failed']}), "
+          f"{plants['reads']} letture impianti ({plants['reads_per_second']:.1f}/s, errori {plants['failures']}), "
+          f"login {results['server']['logins']}")
+    print(f"Risultati salvati in: {output_path}")
+
+if __name__ == '__main__':
+    main()
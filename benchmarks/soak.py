@@ -0,0 +1,188 @@
+"""
+Prova di lunga durata accelerata del ciclo di raccolta.
+
+Esegue il ciclo completo del collector (lettura, salvataggio, conservazione, allarme,
+esportazione automatica e file di stato) contro un client FusionSolar simulato con
+guasti iniettati, usando un orologio virtuale: 30 giorni di funzionamento scorrono in
+pochi minuti. Per ogni periodo di report registra latenza dei cicli, memoria,
+dimensione dei file e numero di thread, per individuare perdite lente e crescite O(n).
+
+Esempio:
+    python benchmarks/soak.py --days 30 --interval 300
+"""
+import argparse
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import common
+import fake_fusionsolar
+from fake_fusionsolar import FakeFusionSolarClient, FakeNetwork, FakeProbeConnection, FaultPlan, VirtualClock
+
+import metrics
+
+class LogCounter(logging.Handler):
+    """Conta i messaggi di log per livello senza stamparli"""
+    def __init__(self):
+        super().__init__(logging.WARNING)
+        self.counts = {}
+
+    def emit(self, record):
+        self.counts[record.levelname] = self.counts.get(record.levelname, 0) + 1
+
+def folder_size(path):
+    """Dimensione totale dei file di una cartella in byte"""
+    return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+
+def window_summary(durations):
+    """Percentili della latenza dei cicli di un periodo, in ms"""
+    ordered = sorted(durations)
+    return {
+        "cycles": len(ordered),
+        "p50_ms": common.percentile(ordered, 0.50) * 1000,
+        "p99_ms": common.percentile(ordered, 0.99) * 1000,
+        "max_ms": ordered[-1] * 1000
+    }
+
+def run(args):
+    """
+    Esegue la prova
+
+    Returns:
+        dict: Andamento per periodo e riepilogo
+    """
+    work_dir = tempfile.mkdtemp(prefix="energy_soak_")
+    export_dir = os.path.join(work_dir, 'exports')
+    os.makedirs(export_dir)
+    xml_path = os.path.join(work_dir, 'energy_data.xml')
+
+    log_counter = LogCounter()
+    root_logger = logging.getLogger()
+    root_logger.setLevel(logging.WARNING)
+    root_logger.addHandler(log_counter)
+
+    clock = VirtualClock(datetime.now().replace(hour=0, minute=0, second=0, microsecond=0))
+    faults = FaultPlan(session_ttl=args.session_ttl, timeout_rate=args.timeout_rate,
+                       captcha_rate=args.captcha_rate, outage_rate=args.outage_rate, seed=args.seed)
+    FakeFusionSolarClient.clock = clock
+    FakeFusionSolarClient.faults = faults
+    FakeFusionSolarClient.plants = args.plants
+
+    fusion_solar_interface = fake_fusionsolar.import_fusion_solar_interface()
+    import collector
+    import data_sources
+    import data_storage
+    import metric_scheduler
+    import network
+    import plant_poller
+    from config_manager import ConfigManager
+
+    fusion_solar_interface.FusionSolarClient = FakeFusionSolarClient
+    # Sonda di connettività (attiva solo dopo un errore) su rete e DNS simulati
+    FakeProbeConnection.network = network.socket = FakeNetwork(faults)
+    network.ConnectivityMonitor.connection_class = FakeProbeConnection
+    clock.install(collector, data_sources, data_storage, fusion_solar_interface, metric_scheduler, network, plant_poller)
+
+    config_manager = ConfigManager(os.path.join(work_dir, 'config.ini'))
+    config_manager.set_credential('USERNAME', 'soak')
+    config_manager.set_credential('PASSWORD', 'soak')
+    config_manager.set_setting('XML_FILE_PATH', xml_path)
+    config_manager.set_setting('TIME_INTERVAL', args.interval)
+    config_manager.set_setting('DATA_RETENTION_DAYS', args.retention)
+    config_manager.set_setting('MULTI_PLANT_ENABLED', args.plants > 1)
+    config_manager.set_setting('COLLECTOR_STATUS_PATH', os.path.join(work_dir, 'collector_status.json'))
+    config_manager.set('EXPORT', 'AUTO_EXPORT_ENABLED', args.export_hours > 0)
+    config_manager.set('EXPORT', 'AUTO_EXPORT_INTERVAL_HOURS', max(args.export_hours, 1))
+    config_manager.set('EXPORT', 'AUTO_EXPORT_FOLDER', export_dir)
+    config_manager.set('EXPORT', 'AUTO_EXPORT_FORMAT', 'csv')
+
+    soak_collector = collector.Collector(config_manager)
+    total_cycles = int(args.days * 86400 / args.interval)
+    cycles_per_report = max(int(args.report_hours * 3600 / args.interval), 1)
+
+    timeline = []
+    window = []
+    alarm_cycles = 0
+    real_start = time.perf_counter()
+    try:
+        for cycle in range(1, total_cycles + 1):
+            start = time.perf_counter()
+            soak_collector.run_cycle()
+            window.append(time.perf_counter() - start)
+            if soak_collector.alarm_active:
+                alarm_cycles += 1
+            clock.advance(args.interval)
+
+            if cycle % cycles_per_report == 0 or cycle == total_cycles:
+                entry = window_summary(window)
+                entry.update({
+                    "virtual_time": clock.now().strftime('%Y-%m-%d %H:%M:%S'),
+                    "real_seconds": time.perf_counter() - real_start,
+                    "rss_mb": common.current_rss_mb(),
+                    "xml_size_bytes": os.path.getsize(xml_path),
+                    "export_dir_bytes": folder_size(export_dir),
+                    "threads": threading.active_count(),
+                    "faults": dict(faults.counts)
+                })
+                timeline.append(entry)
+                window = []
+                if not args.quiet:
+                    print(f"{entry['virtual_time']}  p50 {entry['p50_ms']:8.2f} ms  p99 {entry['p99_ms']:8.2f} ms  "
+                          f"RSS {entry['rss_mb'] or 0:7.1f} MB  XML {entry['xml_size_bytes'] / 1024:9.1f} kB  "
+                          f"thread {entry['threads']}")
+    finally:
+        root_logger.removeHandler(log_counter)
+        soak_collector.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    first, last = timeline[0], timeline[-1]
+    return {
+        "benchmark": "soak",
+        "environment": common.environment_info(),
+        "parameters": vars(args),
+        "summary": {
+            "cycles": total_cycles,
+            "real_seconds": time.perf_counter() - real_start,
+            "alarm_cycles": alarm_cycles,
+            "log_counts": log_counter.counts,
+            "faults": dict(faults.counts),
+            # Rapporti ultimo/primo periodo: valori molto sopra 1 indicano crescita con i dati o perdite
+            "latency_growth": last["p50_ms"] / first["p50_ms"] if first["p50_ms"] else None,
+            "rss_growth_mb": (last["rss_mb"] - first["rss_mb"]) if first["rss_mb"] is not None else None,
+            "thread_growth": last["threads"] - first["threads"],
+            "peak_rss_mb": common.peak_rss_mb()
+        },
+        "timeline": timeline,
+        "metrics": metrics.registry.snapshot()
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Prova di lunga durata accelerata del collector")
+    parser.add_argument("--days", type=float, default=30, help="Giorni virtuali di funzionamento")
+    parser.add_argument("--interval", type=int, default=300, help="Intervallo di raccolta in secondi virtuali")
+    parser.add_argument("--plants", type=int, default=1, help="Impianti simulati (più di uno attiva la lettura multi-impianto)")
+    parser.add_argument("--retention", type=int, default=7, help="Giorni di conservazione dei dati")
+    parser.add_argument("--export-hours", type=int, default=24, help="Intervallo dell'esportazione automatica (0 = disattivata)")
+    parser.add_argument("--report-hours", type=float, default=24, help="Ore virtuali per ogni riga del report")
+    parser.add_argument("--session-ttl", type=int, default=6 * 3600, help="Durata della sessione simulata in secondi")
+    parser.add_argument("--timeout-rate", type=float, default=0.002, help="Probabilità di timeout per lettura")
+    parser.add_argument("--captcha-rate", type=float, default=0.05, help="Probabilità di captcha per login")
+    parser.add_argument("--outage-rate", type=float, default=0.0005, help="Probabilità di rete assente per richiesta")
+    parser.add_argument("--seed", type=int, default=7, help="Seme dei guasti simulati")
+    parser.add_argument("-q", "--quiet", action="store_true", help="Non stampa l'andamento")
+    parser.add_argument("-o", "--output", help="File JSON dei risultati (default benchmarks/results/)")
+    args = parser.parse_args()
+
+    results = run(args)
+    output_path = common.write_results(results, args.output, "soak")
+    summary = results["summary"]
+    print(f"Cicli: {summary['cycles']} in {summary['real_seconds']:.1f} s reali - "
+          f"crescita latenza x{summary['latency_growth'] or 0:.2f}, thread {summary['thread_growth']:+d}")
+    print(f"Risultati salvati in: {output_path}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+import math
+import random
+import xml.etree.ElementTree as ET
+from datetime import datetime, timedelta
+
+class PVCurveGenerator:
+    """
+    Generatore di curve di produzione fotovoltaica realistiche per i benchmark.
+
+    La forma di base è quella di cielo sereno (seno elevato a potenza tra alba e tramonto,
+    con durata del giorno e picco che variano con la stagione); le nuvole sono simulate
+    da un'attenuazione che segue un processo autoregressivo, con passaggi nuvolosi più
+    marcati nei giorni coperti. Con lo stesso seed la serie generata è sempre la stessa.
+    """
+    def __init__(self, peak_kw=6.0, cadence_seconds=5, seed=42):
+        """
+        Inizializza il generatore
+
+        Args:
+            peak_kw: Potenza di picco dell'impianto a mezzogiorno d'estate in kW
+            cadence_seconds: Intervallo tra due campioni
+            seed: Seme del generatore casuale
+        """
+        self.peak_kw = peak_kw
+        self.cadence_seconds = cadence_seconds
+        self.seed = seed
+
+    def clear_sky(self, dt):
+        """
+        Potenza a cielo sereno in un istante
+
+        Args:
+            dt: Istante (datetime)
+
+        Returns:
+            float: Potenza in kW
+        """
+        day_of_year = dt.timetuple().tm_yday
+        # Variazione stagionale: giorno più lungo e picco più alto a fine giugno
+        season = math.cos(2 * math.pi * (day_of_year - 172) / 365)
+        day_length = 12 + 3.5 * season
+        sunrise = 13 - day_length / 2
+        hour = dt.hour + dt.minute / 60 + dt.second / 3600
+        if hour <= sunrise or hour >= sunrise + day_length:
+            return 0.0
+        shape = math.sin(math.pi * (hour - sunrise) / day_length) ** 1.5
+        return self.peak_kw * (0.75 + 0.25 * season) * shape
+
+    def generate_plant(self, start, days, plant_index=0):
+        """
+        Genera la serie di un impianto
+
+        Args:
+            start: Mezzanotte del primo giorno (datetime)
+            days: Numero di giorni
+            plant_index: Indice dell'impianto (varia seed e potenza di picco)
+
+        Yields:
+            tuple: (datetime, potenza in kW)
+        """
+        rng = random.Random(self.seed * 1000 + plant_index)
+        scale = 1.0 + 0.15 * plant_index
+        step = timedelta(seconds=self.cadence_seconds)
+        samples_per_day = 86400 // self.cadence_seconds
+        attenuation = 1.0
+
+        for day in range(days):
+            day_start = start + timedelta(days=day)
+            # Copertura del giorno: 0 sereno, 1 coperto
+            cloudiness = rng.random() ** 2
+            for i in range(samples_per_day):
+                dt = day_start + i * step
+                base = self.clear_sky(dt) * scale
+                if base == 0.0:
+                    yield dt, 0.0
+                    continue
+                # Processo AR(1) verso il livello di attenuazione del giorno, con nuvole improvvise
+                target = 1.0 - 0.7 * cloudiness
+                attenuation += 0.02 * (target - attenuation) + rng.gauss(0, 0.01 + 0.03 * cloudiness)
+                if rng.random() < 0.002 * cloudiness:
+                    attenuation -= rng.uniform(0.2, 0.5)
+                attenuation = min(1.05, max(0.1, attenuation))
+                yield dt, round(base * attenuation, 3)
+
+    def generate(self, start, days, plants=1):
+        """
+        Genera le serie di più impianti
+
+        Args:
+            start: Mezzanotte del primo giorno (datetime)
+            days: Numero di giorni
+            plants: Numero di impianti
+
+        Returns:
+            dict: Indice dell'impianto -> lista di (datetime, potenza)
+        """
+        return {plant: list(self.generate_plant(start, days, plant)) for plant in range(plants)}
+
+def aggregate(series_by_plant):
+    """
+    Somma campione per campione le serie di più impianti con la stessa cadenza
+
+    Args:
+        series_by_plant: Dizionario indice impianto -> lista di (datetime, potenza)
+
+    Returns:
+        list: Lista di (datetime, potenza totale)
+    """
+    series = list(series_by_plant.values())
+    return [(samples[0][0], round(sum(s[1] for s in samples), 3)) for samples in zip(*series)]
+
+def write_energy_xml(path, samples):
+    """
+    Scrive i campioni nel formato XML di Energy Monitor (<energy_data><day><power/>)
+
+    Args:
+        path: Percorso del file XML
+        samples: Lista ordinata di (datetime, potenza)
+    """
+    root = ET.Element("energy_data")
+    day_elem = None
+    current_date = None
+    for dt, power in samples:
+        date_str = dt.strftime('%Y-%m-%d')
+        if date_str != current_date:
+            day_elem = ET.SubElement(root, "day")
+            day_elem.set("date", date_str)
+            current_date = date_str
+        power_elem = ET.SubElement(day_elem, "power")
+        power_elem.set("time", dt.strftime('%H:%M:%S'))
+        power_elem.set("value", str(power))
+    ET.ElementTree(root).write(path)
+
+def days_ending_today(days):
+    """Mezzanotte del primo di `days` giorni che terminano oggi"""
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    return today - timedelta(days=days - 1)
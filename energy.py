@@ -0,0 +1,115 @@
+"""
+Calcoli sull'energia condivisi da EnergyMonitor.py e dai moduli di test/ (storage, statistiche,
+interfaccia FusionSolar): contatori dell'inverter nelle risposte del portale, contatori
+giornalieri salvati nel file XML e integrazione dei campioni di potenza.
+"""
+from datetime import datetime
+
+def _to_float(value):
+    """Valore numerico del portale (numero o stringa), None se assente o non valido"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def energy_counters(stats):
+    """
+    Contatori di energia dell'inverter presenti nella risposta di fusion_solar_py
+
+    Args:
+        stats: Stato di potenza restituito da FusionSolarClient.get_power_status
+
+    Returns:
+        tuple: (kWh prodotti oggi, kWh totali), None per i contatori non disponibili
+    """
+    # Le versioni recenti usano energy_*, quelle precedenti total_power_*
+    today = getattr(stats, 'energy_today_kwh', None)
+    if today is None:
+        today = getattr(stats, 'total_power_today_kwh', None)
+    total = getattr(stats, 'energy_kwh', None)
+    if total is None:
+        total = getattr(stats, 'total_power_kwh', None)
+    return today, total
+
+def plant_counters(plant_data):
+    """
+    Potenza e contatori di energia di un impianto dalla risposta di get_current_plant_data
+
+    Args:
+        plant_data: Dati dell'impianto (station-real-kpi)
+
+    Returns:
+        tuple: (kW, kWh prodotti oggi, kWh totali), None per i contatori non disponibili
+    """
+    return (float(plant_data['currentPower']), _to_float(plant_data.get('dailyEnergy')),
+            _to_float(plant_data.get('cumulativeEnergy')))
+
+def sum_counters(counters):
+    """
+    Somma i contatori di più impianti
+
+    Args:
+        counters: Contatori (kWh) degli impianti letti, None per quelli non disponibili
+
+    Returns:
+        float: La somma, None se manca il contatore di almeno un impianto
+    """
+    counters = list(counters)
+    if not counters or any(value is None for value in counters):
+        return None
+    return sum(counters)
+
+def day_counters(day_elem):
+    """
+    Contatori di energia di un giorno del file XML: il riepilogo sull'elemento <day> o,
+    per i giorni salvati prima del riepilogo, l'ultimo campione con i contatori
+
+    Args:
+        day_elem: Elemento <day>
+
+    Returns:
+        dict: {"today": kWh del giorno, "total": kWh totali o None}, None se il giorno non ha contatori
+    """
+    today, total = day_elem.get('today'), day_elem.get('total')
+    if today is None:
+        for power_elem in reversed(day_elem.findall("./power")):
+            if power_elem.get('today') is not None:
+                today, total = power_elem.get('today'), power_elem.get('total')
+                break
+        else:
+            return None
+    return {"today": float(today), "total": float(total) if total is not None else None}
+
+def integrate_day(day_elem):
+    """
+    Energia di un giorno del file XML integrando i campioni del totale (regola del trapezio).
+    I totali parziali (attributo failed) sono esclusi.
+
+    Args:
+        day_elem: Elemento <day>
+
+    Returns:
+        float: kWh del giorno, None se i campioni sono meno di due
+    """
+    samples = sorted(
+        (datetime.strptime(power_elem.get('time'), '%H:%M:%S'), float(power_elem.get('value')))
+        for power_elem in day_elem.findall("./power") if power_elem.get('failed') is None
+    )
+    if len(samples) < 2:
+        return None
+    return sum((samples[i][1] + samples[i-1][1]) / 2 * (samples[i][0] - samples[i-1][0]).total_seconds() / 3600
+               for i in range(1, len(samples)))
+
+def day_energy(day_elem):
+    """
+    Energia prodotta in un giorno del file XML: il contatore giornaliero dell'inverter se
+    presente (senza leggere i campioni), altrimenti l'integrale dei campioni
+
+    Args:
+        day_elem: Elemento <day>
+
+    Returns:
+        float: kWh del giorno, None se non calcolabile
+    """
+    counters = day_counters(day_elem)
+    return counters["today"] if counters is not None else integrate_day(day_elem)
@@ -0,0 +1,273 @@
+import bisect
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+# Limiti superiori (secondi) dei bucket degli istogrammi di latenza
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+class TimerStats:
+    """Istogramma di latenza con numero di chiamate ed errori di una funzione"""
+    def __init__(self):
+        self.bucket_counts = [0] * (len(LATENCY_BUCKETS) + 1)  # l'ultimo bucket è +Inf
+        self.calls = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def observe(self, seconds):
+        self.bucket_counts[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.calls += 1
+        self.total_seconds += seconds
+        if seconds > self.max_seconds:
+            self.max_seconds = seconds
+
+class MetricsRegistry:
+    """
+    Raccolta delle metriche dei percorsi critici: tempi delle funzioni e contatori.
+
+    Ogni misura costa due letture di perf_counter e un lock, quindi la strumentazione
+    può restare attiva in produzione.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.timers = {}
+        self.counters = {}
+        self.started = time.time()
+
+    def observe(self, name, seconds, error=False):
+        """
+        Registra la durata di una chiamata
+
+        Args:
+            name: Nome della funzione misurata
+            seconds: Durata in secondi
+            error: True se la chiamata è terminata con un errore
+        """
+        with self.lock:
+            stats = self.timers.get(name)
+            if stats is None:
+                stats = self.timers[name] = TimerStats()
+            stats.observe(seconds)
+            if error:
+                stats.errors += 1
+
+    def record_error(self, name):
+        """Registra un errore gestito all'interno della funzione (senza eccezione propagata)"""
+        with self.lock:
+            stats = self.timers.get(name)
+            if stats is None:
+                stats = self.timers[name] = TimerStats()
+            stats.errors += 1
+
+    def inc(self, name, value=1):
+        """Incrementa un contatore"""
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def timed(self, name):
+        """
+        Decoratore che misura durata, chiamate ed eccezioni della funzione
+
+        Args:
+            name: Nome della metrica
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    result = func(*args, **kwargs)
+                except BaseException:
+                    self.observe(name, time.perf_counter() - start, error=True)
+                    raise
+                self.observe(name, time.perf_counter() - start)
+                return result
+            return wrapper
+        return decorator
+
+    def timer(self, name):
+        """
+        Context manager che misura un blocco di codice
+
+        Args:
+            name: Nome della metrica
+        """
+        return _TimerContext(self, name)
+
+    def snapshot(self):
+        """
+        Restituisce lo stato corrente delle metriche
+
+        Returns:
+            dict: Contatori e, per ogni funzione, chiamate, errori, tempi e istogramma
+        """
+        with self.lock:
+            timers = {}
+            for name, stats in self.timers.items():
+                timers[name] = {
+                    "calls": stats.calls,
+                    "errors": stats.errors,
+                    "total_seconds": stats.total_seconds,
+                    "avg_seconds": stats.total_seconds / stats.calls if stats.calls else 0.0,
+                    "max_seconds": stats.max_seconds,
+                    "buckets": dict(zip([str(b) for b in LATENCY_BUCKETS] + ["+Inf"], stats.bucket_counts))
+                }
+            return {
+                "timestamp": time.time(),
+                "uptime_seconds": time.time() - self.started,
+                "counters": dict(self.counters),
+                "timers": timers
+            }
+
+    def to_prometheus(self):
+        """
+        Esporta le metriche nel formato testuale di Prometheus
+
+        Returns:
+            str: Metriche in formato text/plain version 0.0.4
+        """
+        snapshot = self.snapshot()
+        lines = [
+            "# HELP energymonitor_call_duration_seconds Durata delle chiamate delle funzioni strumentate",
+            "# TYPE energymonitor_call_duration_seconds histogram"
+        ]
+        for name, stats in sorted(snapshot["timers"].items()):
+            cumulative = 0
+            for bound, count in stats["buckets"].items():
+                cumulative += count
+                lines.append(f'energymonitor_call_duration_seconds_bucket{{function="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'energymonitor_call_duration_seconds_sum{{function="{name}"}} {stats["total_seconds"]}')
+            lines.append(f'energymonitor_call_duration_seconds_count{{function="{name}"}} {stats["calls"]}')
+
+        lines.append("# HELP energymonitor_call_errors_total Errori delle funzioni strumentate")
+        lines.append("# TYPE energymonitor_call_errors_total counter")
+        for name, stats in sorted(snapshot["timers"].items()):
+            lines.append(f'energymonitor_call_errors_total{{function="{name}"}} {stats["errors"]}')
+
+        for name, value in sorted(snapshot["counters"].items()):
+            lines.append(f"# TYPE energymonitor_{name}_total counter")
+            lines.append(f"energymonitor_{name}_total {value}")
+
+        lines.append("# TYPE energymonitor_uptime_seconds gauge")
+        lines.append(f"energymonitor_uptime_seconds {snapshot['uptime_seconds']}")
+        return "\n".join(lines) + "\n"
+
+class _TimerContext:
+    """Context manager restituito da MetricsRegistry.timer"""
+    def __init__(self, registry, name):
+        self.registry = registry
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.registry.observe(self.name, time.perf_counter() - self.start, error=exc_type is not None)
+        return False
+
+# Registro condiviso dal processo
+registry = MetricsRegistry()
+timed = registry.timed
+timer = registry.timer
+inc = registry.inc
+record_error = registry.record_error
+
+def write_snapshot(path):
+    """
+    Scrive in modo atomico lo snapshot JSON delle metriche
+
+    Args:
+        path: Percorso del file JSON
+    """
+    temp_path = f"{path}.tmp"
+    try:
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(registry.snapshot(), f, indent=2)
+        os.replace(temp_path, path)
+    except OSError as e:
+        logger.error(f"Errore nella scrittura dello snapshot delle metriche: {e}")
+
+def start_snapshot_writer(path, interval_seconds=60):
+    """
+    Avvia un thread che scrive periodicamente lo snapshot JSON delle metriche
+
+    Args:
+        path: Percorso del file JSON
+        interval_seconds: Intervallo tra due scritture
+
+    Returns:
+        threading.Event: Evento da impostare per fermare il thread
+    """
+    stop_event = threading.Event()
+
+    def run():
+        while not stop_event.wait(interval_seconds):
+            write_snapshot(path)
+        write_snapshot(path)
+
+    threading.Thread(target=run, name="MetricsSnapshot", daemon=True).start()
+    return stop_event
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    """Espone /metrics (Prometheus) e /metrics.json"""
+    def do_GET(self):
+        if self.path == '/metrics':
+            body = registry.to_prometheus().encode('utf-8')
+            content_type = 'text/plain; version=0.0.4; charset=utf-8'
+        elif self.path == '/metrics.json':
+            body = json.dumps(registry.snapshot()).encode('utf-8')
+            content_type = 'application/json; charset=utf-8'
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+def start_metrics_server(host='127.0.0.1', port=9108):
+    """
+    Avvia in background il server HTTP delle metriche
+
+    Args:
+        host: Indirizzo di ascolto (default solo locale)
+        port: Porta di ascolto
+
+    Returns:
+        ThreadingHTTPServer: Server avviato, da fermare con shutdown()
+    """
+    server = ThreadingHTTPServer((host, port), MetricsRequestHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="MetricsServer", daemon=True).start()
+    logger.info(f"Metriche disponibili su http://{host}:{port}/metrics")
+    return server
+
+def start_from_config(config):
+    """
+    Avvia l'esposizione delle metriche in base alla sezione [METRICS] della configurazione
+
+    Args:
+        config: ConfigParser o ConfigManager (metodi get/getint/getboolean con fallback)
+    """
+    if config.getboolean('METRICS', 'SERVER_ENABLED', fallback=False):
+        try:
+            start_metrics_server(config.get('METRICS', 'HOST', fallback='127.0.0.1'),
+                                 config.getint('METRICS', 'PORT', fallback=9108))
+        except OSError as e:
+            logger.error(f"Impossibile avviare il server delle metriche: {e}")
+    snapshot_path = config.get('METRICS', 'SNAPSHOT_PATH', fallback='')
+    if snapshot_path:
+        start_snapshot_writer(snapshot_path, config.getint('METRICS', 'SNAPSHOT_INTERVAL', fallback=60))
@@ -0,0 +1,398 @@
+import http.client
+import inspect
+import logging
+import socket
+import threading
+import time
+from concurrent.futures import CancelledError, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from requests import HTTPError
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Scadenze predefinite (secondi) delle chiamate di rete
+REQUEST_TIMEOUT = 30.0
+LOGIN_TIMEOUT = 90.0
+# Scadenza massima per aprire una connessione (il socket usa la minore tra questa e quella delle richieste)
+CONNECT_TIMEOUT = 10.0
+
+# Sottodominio predefinito del portale FusionSolar (lo stesso di fusion_solar_py)
+DEFAULT_SUBDOMAIN = "region01eu5"
+
+class NetworkTimeout(Exception):
+    """Una chiamata di rete ha superato la propria scadenza"""
+
+def fusionsolar_host(subdomain):
+    """Host del portale FusionSolar per il sottodominio configurato (o un host completo)"""
+    subdomain = (subdomain or DEFAULT_SUBDOMAIN).strip()
+    return subdomain if '.' in subdomain else f"{subdomain}.fusionsolar.huawei.com"
+
+class KeepAliveConnection(http.client.HTTPSConnection):
+    """Connessione HTTPS keep-alive verso un indirizzo già risolto: nessuna risoluzione DNS alla riconnessione"""
+    def __init__(self, host, port, address, timeout=None):
+        super().__init__(host, port, timeout=timeout)
+        self.address = address
+
+    def connect(self):
+        sock = socket.create_connection((self.address, self.port), self.timeout)
+        # Il certificato viene comunque verificato sul nome dell'host
+        self.sock = self._context.wrap_socket(sock, server_hostname=self.host)
+
+class ConnectivityMonitor:
+    """
+    Stato della connessione verso il portale, ricavato dall'esito delle richieste reali.
+
+    Finché l'ultima richiesta è riuscita is_online() risponde senza traffico di rete.
+    Solo dopo un errore di rete viene eseguita una sonda attiva (HEAD sull'host del
+    portale) su una connessione keep-alive riusata, con l'indirizzo risolto in cache;
+    l'esito della sonda resta valido per probe_interval secondi.
+    """
+    connection_class = KeepAliveConnection
+
+    def __init__(self, host, port=443, probe_timeout=3.0, probe_interval=10.0, dns_ttl=3600.0):
+        """
+        Args:
+            host: Host del portale controllato
+            port: Porta HTTPS
+            probe_timeout: Scadenza della sonda in secondi
+            probe_interval: Secondi per cui l'esito di una sonda resta valido
+            dns_ttl: Secondi per cui l'indirizzo risolto resta in cache
+        """
+        self.port = port
+        self.probe_timeout = probe_timeout
+        self.probe_interval = probe_interval
+        self.dns_ttl = dns_ttl
+        self.consecutive_failures = 0
+        self.last_error = None
+        self._connection = None
+        self._lock = threading.Lock()
+        self.set_host(host)
+
+    def set_host(self, host):
+        """Cambia l'host controllato (ad esempio dopo la modifica del sottodominio)"""
+        with self._lock:
+            self.host = host
+            self._address = None
+            self._address_expiry = 0.0
+            self._last_probe = None
+            self._close_connection()
+
+    def record_success(self):
+        """Una richiesta reale ha ricevuto risposta dal portale"""
+        self.consecutive_failures = 0
+        self.last_error = None
+
+    def record_failure(self, error):
+        """Una richiesta reale non è arrivata al portale (errore di rete o scadenza)"""
+        self.consecutive_failures += 1
+        self.last_error = str(error)
+
+    def is_online(self):
+        """
+        True se il portale è raggiungibile
+
+        Returns:
+            bool: Senza traffico di rete se l'ultima richiesta è riuscita, altrimenti l'esito della sonda
+        """
+        if self.consecutive_failures == 0:
+            return True
+        return self.probe()
+
+    def probe(self):
+        """Sonda attiva del portale, al massimo una ogni probe_interval secondi"""
+        with self._lock:
+            now = time.monotonic()
+            if self._last_probe is not None and now - self._last_probe[0] < self.probe_interval:
+                return self._last_probe[1]
+            metrics.inc('connectivity_probes')
+            online = self._probe()
+            self._last_probe = (time.monotonic(), online)
+            return online
+
+    def _probe(self):
+        # Un secondo tentativo solo se la connessione keep-alive era già aperta (il server può averla chiusa)
+        for attempt in range(2):
+            reused = self._connection is not None
+            try:
+                if not reused:
+                    self._connection = self.connection_class(self.host, self.port, self._resolve(), timeout=self.probe_timeout)
+                self._connection.request('HEAD', '/')
+                self._connection.getresponse().read()
+                return True
+            except (OSError, http.client.HTTPException) as e:
+                self._close_connection()
+                if not reused:
+                    # L'indirizzo in cache può non essere più valido: nuova risoluzione alla prossima sonda
+                    self._address = None
+                    logger.warning(f"Portale {self.host} non raggiungibile: {e}")
+                    return False
+        return False
+
+    def _resolve(self):
+        now = time.monotonic()
+        if self._address is None or now >= self._address_expiry:
+            self._address = socket.getaddrinfo(self.host, self.port, type=socket.SOCK_STREAM)[0][4][0]
+            self._address_expiry = now + self.dns_ttl
+        return self._address
+
+    def _close_connection(self):
+        connection = self._connection
+        self._connection = None
+        if connection is not None:
+            connection.close()
+
+class NetworkExecutor:
+    """
+    Pool limitato condiviso da tutte le chiamate di rete verso i portali.
+
+    Ogni chiamata ha una scadenza: allo scadere il chiamante riceve NetworkTimeout e
+    la richiesta viene annullata se ancora in coda. Un thread Python non può essere
+    interrotto, quindi una connessione appesa occupa il proprio worker finché il socket
+    non si sblocca; il pool limitato impedisce che i thread crescano senza fine e
+    le chiamate successive scadono comunque entro la propria scadenza.
+
+    Per questo anche i socket hanno una scadenza (socket_timeout, applicata da
+    create_client alla sessione del client): un worker appeso si libera da solo.
+    Se comunque tutti i worker restano occupati da chiamate scadute, il pool viene
+    sostituito con uno nuovo, così le chiamate successive non restano in coda.
+    L'esito di ogni chiamata aggiorna lo stato di connectivity.
+    """
+    def __init__(self, max_workers=8, request_timeout=REQUEST_TIMEOUT, login_timeout=LOGIN_TIMEOUT):
+        """
+        Args:
+            max_workers: Numero massimo di chiamate di rete contemporanee
+            request_timeout: Scadenza predefinita delle richieste in secondi
+            login_timeout: Scadenza predefinita dei login in secondi
+        """
+        self.max_workers = max_workers
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="Network")
+        self.request_timeout = request_timeout
+        self.login_timeout = login_timeout
+        # (connessione, lettura) dei socket: il worker si libera entro la scadenza della richiesta
+        self.socket_timeout = (min(CONNECT_TIMEOUT, request_timeout), request_timeout)
+        # Chiamate scadute ancora in esecuzione in un worker del pool corrente
+        self._abandoned = set()
+        self._pool_lock = threading.Lock()
+
+    def submit(self, name, func, *args, **kwargs):
+        """
+        Accoda una chiamata di rete senza attenderla
+
+        Args:
+            name: Nome dell'operazione (metriche)
+            func: Funzione bloccante da eseguire
+
+        Returns:
+            Future: Risultato della chiamata
+        """
+        metrics.inc('network_calls')
+        with self._pool_lock:
+            return self.pool.submit(func, *args, **kwargs)
+
+    def call(self, name, func, *args, timeout=None, **kwargs):
+        """
+        Esegue una chiamata di rete attendendone il risultato al massimo timeout secondi
+
+        Args:
+            name: Nome dell'operazione (metriche e log)
+            func: Funzione bloccante da eseguire
+            timeout: Scadenza in secondi (default: request_timeout)
+
+        Returns:
+            Il risultato di func
+
+        Raises:
+            NetworkTimeout: Se la chiamata non termina entro la scadenza
+        """
+        timeout = self.request_timeout if timeout is None else timeout
+        future = self.submit(name, func, *args, **kwargs)
+        try:
+            result = future.result(timeout)
+        except (FutureTimeoutError, CancelledError):
+            if not future.cancel():
+                self._abandon(future)
+            metrics.inc('network_timeouts')
+            metrics.record_error(name)
+            error = NetworkTimeout(f"{name}: nessuna risposta entro {timeout:g} s")
+            connectivity.record_failure(error)
+            raise error from None
+        except HTTPError:
+            # Risposta di errore (401, 5xx): il portale ha risposto, lo stato di connettività non cambia.
+            # Va intercettata prima di OSError, di cui le eccezioni di requests sono sottoclassi
+            raise
+        except OSError as e:
+            # Errori di connessione (anche quelli di requests) e timeout del socket
+            connectivity.record_failure(e)
+            raise
+        except Exception:
+            # Il portale ha risposto, con un errore applicativo (sessione scaduta, captcha...)
+            connectivity.record_success()
+            raise
+        connectivity.record_success()
+        return result
+
+    def _abandon(self, future):
+        """Registra una chiamata scaduta ancora in esecuzione; sostituisce il pool se tutti i worker sono appesi"""
+        with self._pool_lock:
+            self._abandoned = {pending for pending in self._abandoned if not pending.done()}
+            self._abandoned.add(future)
+            if len(self._abandoned) < self.max_workers:
+                return
+            logger.error(f"Tutti i {self.max_workers} worker di rete sono bloccati: nuovo pool")
+            metrics.inc('network_pool_replacements')
+            stalled_pool = self.pool
+            self.pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="Network")
+            self._abandoned = set()
+        # Le chiamate ancora in coda nel vecchio pool vengono annullate (il chiamante riceve NetworkTimeout)
+        stalled_pool.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self):
+        """Termina il pool senza attendere le chiamate appese"""
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+class Watchdog:
+    """
+    Controlla che un ciclo di lettura segnali la propria attività (beat) almeno ogni
+    timeout secondi; in caso contrario chiama on_stall, che può riavviare il ciclo.
+    """
+    def __init__(self, name, timeout, on_stall):
+        """
+        Args:
+            name: Nome del ciclo controllato (log)
+            timeout: Secondi massimi tra due segnali di attività
+            on_stall: Funzione chiamata quando il ciclo risulta bloccato
+        """
+        self.name = name
+        self.timeout = timeout
+        self.on_stall = on_stall
+        self.last_beat = time.monotonic()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name=f"Watchdog-{name}", daemon=True)
+
+    def start(self):
+        self.beat()
+        self.thread.start()
+
+    def beat(self):
+        """Segnala che il ciclo è attivo"""
+        self.last_beat = time.monotonic()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _run(self):
+        while not self.stop_event.wait(min(self.timeout / 4, 30)):
+            stalled_for = time.monotonic() - self.last_beat
+            if stalled_for > self.timeout:
+                logger.error(f"Ciclo {self.name} bloccato da {stalled_for:.0f} s: riavvio")
+                metrics.inc('watchdog_restarts')
+                self.beat()
+                try:
+                    self.on_stall()
+                except Exception as e:
+                    logger.error(f"Errore nel riavvio del ciclo {self.name}: {e}")
+
+# Pool condiviso del processo, configurato da configure_from_config
+executor = NetworkExecutor()
+# Raggiungibilità del portale FusionSolar, aggiornata dall'esito delle chiamate di executor
+connectivity = ConnectivityMonitor(fusionsolar_host(None))
+
+def call(name, func, *args, timeout=None, **kwargs):
+    return executor.call(name, func, *args, timeout=timeout, **kwargs)
+
+def apply_session_timeout(session, timeout):
+    """
+    Applica una scadenza predefinita (connessione, lettura) a tutte le richieste di una sessione requests
+
+    Le richieste che indicano già un proprio timeout lo mantengono.
+    """
+    import requests.adapters
+
+    class TimeoutHTTPAdapter(requests.adapters.HTTPAdapter):
+        def send(self, request, timeout=None, **kwargs):
+            return super().send(request, timeout=timeout if timeout is not None else self.default_timeout, **kwargs)
+
+    for prefix in ('https://', 'http://'):
+        adapter = TimeoutHTTPAdapter()
+        adapter.default_timeout = timeout
+        session.mount(prefix, adapter)
+    return session
+
+_timeout_client_classes = {}
+
+def timeout_client_class(client_class):
+    """
+    Sottoclasse del client che applica la scadenza dei socket a ogni sessione che configura
+
+    fusion_solar_py sostituisce la sessione con una nuova requests.Session() a ogni login
+    (anche quando @logged_in trova la sessione scaduta) e poi chiama _configure_session:
+    la scadenza va applicata lì, non solo alla sessione creata dal primo login.
+    """
+    if not hasattr(client_class, '_configure_session'):
+        return client_class
+    if client_class not in _timeout_client_classes:
+        class TimeoutClient(client_class):
+            def _configure_session(self):
+                apply_session_timeout(self._session, executor.socket_timeout)
+                return super()._configure_session()
+
+        TimeoutClient.__name__ = TimeoutClient.__qualname__ = client_class.__name__
+        _timeout_client_classes[client_class] = TimeoutClient
+    return _timeout_client_classes[client_class]
+
+def create_client(client_class, *args, **kwargs):
+    """
+    Crea un client FusionSolar (login compreso) entro la scadenza dei login, con la scadenza
+    dei socket applicata alla sua sessione requests e a quelle dei login successivi
+
+    fusion_solar_py non imposta timeout sulle richieste: senza scadenza sui socket una
+    richiesta appesa occuperebbe per sempre un worker del pool.
+
+    Args:
+        client_class: Classe del client (FusionSolarClient)
+    """
+    client_class = timeout_client_class(client_class)
+    if 'session' in inspect.signature(client_class).parameters:
+        # Versioni che accettano una sessione esterna: scadenza applicata anche al login
+        import requests
+        kwargs['session'] = apply_session_timeout(requests.Session(), executor.socket_timeout)
+    client = call('login', client_class, *args, timeout=executor.login_timeout, **kwargs)
+    session = getattr(client, '_session', None)
+    if session is not None and 'session' not in kwargs:
+        apply_session_timeout(session, executor.socket_timeout)
+    return client
+
+def submit(name, func, *args, **kwargs):
+    return executor.submit(name, func, *args, **kwargs)
+
+def configure_from_config(config):
+    """
+    Configura il pool condiviso in base alla sezione [NETWORK] della configurazione
+
+    Args:
+        config: ConfigParser o ConfigManager (metodi getint/getfloat con fallback)
+    """
+    global executor
+    executor = NetworkExecutor(
+        max_workers=config.getint('NETWORK', 'WORKERS', fallback=8),
+        request_timeout=config.getfloat('NETWORK', 'REQUEST_TIMEOUT', fallback=REQUEST_TIMEOUT),
+        login_timeout=config.getfloat('NETWORK', 'LOGIN_TIMEOUT', fallback=LOGIN_TIMEOUT)
+    )
+    return executor
+
+def watchdog_timeout(config, interval=0):
+    """
+    Secondi senza attività dopo i quali il watchdog riavvia il ciclo di lettura
+
+    Args:
+        config: ConfigParser o ConfigManager
+        interval: Intervallo del ciclo in secondi: tra due segnali di attività possono passare
+            l'attesa e un ciclo con un login e una richiesta alla loro scadenza
+
+    Returns:
+        float: Il maggiore tra WATCHDOG_TIMEOUT e la durata massima di un ciclo sano
+    """
+    return max(config.getint('NETWORK', 'WATCHDOG_TIMEOUT', fallback=300),
+               interval + executor.login_timeout + executor.request_timeout)
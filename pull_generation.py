@@ -2,65 +2,338 @@
 
 import sys
 import requests
+import requests.adapters
 from requests.auth import HTTPBasicAuth
 import json
 import pprint
 import argparse
 import os
 import datetime
+import hashlib
+import threading
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
 
 
 
 
 
+#fuso orario se non è possibile ricavarlo dal sistema (gli impianti monitorati sono in Italia)
+DEFAULT_TZ = "Europe/Rome"
+
+#tentativi di scrittura del file dati se viene modificato da un altro processo durante l'unione
+WRITE_ATTEMPTS = 5
+WRITE_RETRY_DELAY = 0.2
+
+
+def local_timezone():
+    #nome IANA del fuso orario locale: le fasce vengono salvate nell'ora locale, come i campioni dal vivo
+    if os.environ.get("TZ"):
+        return os.environ["TZ"].lstrip(":")
+    try:
+        zone_path = os.path.realpath("/etc/localtime")
+        if "zoneinfo" + os.sep in zone_path:
+            return zone_path.split("zoneinfo" + os.sep, 1)[1]
+    except OSError:
+        pass
+    #Windows non usa nomi IANA
+    return DEFAULT_TZ
+
+
 class AbbAccess():
-    def __init__(self,username, password):
+    LOGIN_ORIGIN = "https://www.auroravision.net/ums/v1/loginPage"
+    LOGIN_URL = "https://www.auroravision.net/ums/v1/login?setCookie=true"
+    GENERATION_URL = "https://easyview.auroravision.net/easyview/services/gmi/summary/GenerationEnergy.json"
+
+    def __init__(self,username, password, timeout=(5, 30), pool_size=8):
         self._username = username
         self._password = password
+        #timeout (connessione, lettura) applicato a ogni richiesta
+        self._timeout = timeout
+        self._pool_size = pool_size
 
         self._session = None
+        #la sessione è condivisa tra thread: un solo login alla volta
+        self._session_lock = threading.Lock()
+        #produzione dei giorni conclusi {(eid, data): kWh}, non cambia più
+        self._daily_yields = {}
         return
 
 
     def _get_session(self):
         #check if one already exists
-        loginorigin = "https://www.auroravision.net/ums/v1/loginPage"
-        loginurl = "https://www.auroravision.net/ums/v1/login?setCookie=true"
+        with self._session_lock:
+            if not self._session:
+                self._login()
+            return self._session
 
-        if not self._session:
-            reqsession = requests.Session()
 
-            req = reqsession.get(loginorigin)
-            req = reqsession.get(loginurl, auth=HTTPBasicAuth(self._username, self._password))
-            self._session = reqsession
+    def login(self):
+        with self._session_lock:
+            return self._login()
 
+
+    def _login(self):
+        #nuova sessione con pool di connessioni keep-alive riusato da tutte le richieste
+        reqsession = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=self._pool_size, pool_maxsize=self._pool_size)
+        reqsession.mount("https://", adapter)
+
+        req = reqsession.get(self.LOGIN_ORIGIN, timeout=self._timeout)
+        req = reqsession.get(self.LOGIN_URL, auth=HTTPBasicAuth(self._username, self._password), timeout=self._timeout)
+        req.raise_for_status()
+        self._session = reqsession
         return self._session
 
 
+    def invalidate_session(self, expired=None):
+        #expired: sessione scaduta vista dal chiamante, non chiude quella già rinnovata da un altro thread
+        with self._session_lock:
+            if self._session and (expired is None or self._session is expired):
+                self._session.close()
+                self._session = None
+
+
+    def _get_json(self, url, params=None):
+        #una sola nuova autenticazione se la sessione è scaduta (401)
+        reqsession = self._get_session()
+        req = reqsession.get(url, params=params, timeout=self._timeout)
+        if req.status_code == 401:
+            self.invalidate_session(reqsession)
+            req = self._get_session().get(url, params=params, timeout=self._timeout)
+        req.raise_for_status()
+        return req.json()
+
+
+    def get_generation(self, eid, startdate, enddate, bin_size="Hour", tz=None):
+        #energia generata da un impianto (eid) tra due date YYYYMMDD, fasce nel fuso tz (default: locale)
+        params = {
+            "type": "GenerationEnergy",
+            "eids": eid,
+            "tz": tz or local_timezone(),
+            "start": startdate,
+            "end": enddate,
+            "binSize": bin_size,
+            "bins": "true"
+        }
+        return self._get_json(self.GENERATION_URL, params)
+
+
     def get_report(self,startdate,enddate):
         #get the daily report for a date range
-        reporturl = "https://easyview.auroravision.net/easyview/services/gmi/summary/GenerationEnergy.json?type=GenerationEnergy&eids=14349631&tz=US%2FPacific&start={}&end={}&range=7D&hasUsage=false&label=7D&dataProperty=chartData&binSize=Hour&bins=true&plantPowerNow=false&v=2.1.51"
-        reqsession = self._get_session()
-        req = reqsession.get(reporturl.format(startdate,enddate))
+        reporturl = self.GENERATION_URL + "?type=GenerationEnergy&eids=14349631&tz=US%2FPacific&start={}&end={}&range=7D&hasUsage=false&label=7D&dataProperty=chartData&binSize=Hour&bins=true&plantPowerNow=false&v=2.1.51"
         #pprint.pprint(req.text)
-        return req.json()
+        return self._get_json(reporturl.format(startdate,enddate))
+
+    def get_daily_yields(self, startdate, enddate, eid="14349631"):
+        #produzione giornaliera (kWh) per ogni giorno tra startdate e enddate inclusi, {data: kWh}
+        #le fasce orarie di ogni finestra vengono sommate per giorno in un solo passaggio;
+        #i giorni conclusi sono memorizzati e non vengono più richiesti
+        today = datetime.date.today()
+        days = [startdate + datetime.timedelta(days=offset) for offset in range((enddate - startdate).days + 1)]
+        missing = [day for day in days if (eid, day) not in self._daily_yields]
+
+        yields = {}
+        if missing:
+            for window_start, window_end in split_range(missing[0], missing[-1], today=today):
+                if not any(window_start <= day < window_end for day in missing):
+                    continue
+                report = self.get_generation(eid, window_start.strftime("%Y%m%d"), window_end.strftime("%Y%m%d"))
+                window_yields = {window_start + datetime.timedelta(days=offset): 0.0
+                                 for offset in range((window_end - window_start).days)}
+                for bin_start, value in parse_bins(report):
+                    day = bin_start.date()
+                    if day in window_yields:
+                        window_yields[day] += value
+                for day, value in window_yields.items():
+                    if day < today:
+                        self._daily_yields[(eid, day)] = value
+                    yields[day] = value
+
+        return {day: self._daily_yields.get((eid, day), yields.get(day, 0.0)) for day in days}
 
     def get_usage_date(self,usagedate):
-        datestring = usagedate.strftime("%Y%m%d")
-        startdate = (usagedate - datetime.timedelta(days=6)).strftime("%Y%m%d")
-        enddate = (usagedate + datetime.timedelta(days=1)).strftime("%Y%m%d")
-        result = self.get_report(startdate,enddate)
+        #produzione di un giorno, dalla somma delle sue fasce orarie
+        return self.get_daily_yields(usagedate, usagedate)[usagedate]
+
 
 
-        #pprint.pprint(result)
+#ampiezza massima di una richiesta a fasce orarie accettata dal portale (range=7D)
+WINDOW_DAYS = 7
 
-        for field in result['fields']:
-            if field['type'] == "bins":
-                for value in field['values']:
-                    if value['startLabel'].startswith(usagedate.strftime("%Y%m%d")):
-                        usage = float(value['value'])
-        return usage
 
+def split_range(startdate, enddate, window_days=WINDOW_DAYS, today=None):
+    #finestre (inizio, fine esclusa) allineate a una griglia fissa di window_days giorni, così esecuzioni
+    #con intervalli diversi ma sovrapposti chiedono le stesse finestre; la finestra che contiene oggi
+    #viene divisa tra i giorni conclusi (definitivi) e quelli ancora in corso
+    today = today or datetime.date.today()
+    windows = []
+    current = startdate - datetime.timedelta(days=startdate.toordinal() % window_days)
+    while current <= enddate:
+        window_end = current + datetime.timedelta(days=window_days)
+        if window_end <= today:
+            windows.append((current, window_end))
+        else:
+            if current < today:
+                windows.append((current, today))
+            windows.append((max(current, today), min(window_end, enddate + datetime.timedelta(days=1))))
+        current = window_end
+    #una finestra vuota (es. enddate = ieri: da oggi a oggi) sarebbe solo una richiesta inutile
+    return [(window_start, window_end) for window_start, window_end in windows if window_start < window_end]
+
+
+def parse_bins(report):
+    #[(datetime inizio fascia, kWh)] dalle fasce di un report GenerationEnergy
+    #solo i campi di tipo "bins": gli altri (riepiloghi) verrebbero contati due volte
+    values = []
+    for field in report.get('fields', []):
+        if field.get('type') != "bins":
+            continue
+        for entry in field.get('values', []):
+            if entry.get('value') is None:
+                continue
+            values.append((datetime.datetime.strptime(entry['startLabel'][:10], "%Y%m%d%H"), float(entry['value'])))
+    return values
+
+
+class ResponseCache():
+    #risposte grezze salvate su disco con nome = hash della richiesta:
+    #le finestre di giorni già conclusi non vengono mai riscaricate
+    def __init__(self, folder):
+        self._folder = folder
+
+    def _path(self, key):
+        digest = hashlib.sha256(json.dumps(key, sort_keys=True).encode('utf-8')).hexdigest()
+        return os.path.join(self._folder, digest[:2], digest + ".json")
+
+    def get(self, key):
+        try:
+            with open(self._path(key), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key, data):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(temp_path, path)
+
+
+def backfill(access, eids, startdate, enddate, cache, workers=4, tz=None):
+    #scarica in parallelo tutte le finestre di tutti gli impianti, {eid: [(datetime, kWh)]}
+    today = datetime.date.today()
+    tz = tz or local_timezone()
+
+    def fetch(eid, window_start, window_end):
+        key = {"eid": eid, "start": window_start.strftime("%Y%m%d"), "end": window_end.strftime("%Y%m%d"),
+               "binSize": "Hour", "tz": tz}
+        #solo le finestre concluse prima di oggi sono definitive e quindi riusabili
+        final = window_end <= today
+        report = cache.get(key) if final else None
+        if report is None:
+            report = access.get_generation(eid, key["start"], key["end"], "Hour", tz)
+            if final:
+                cache.put(key, report)
+        return eid, parse_bins(report)
+
+    series = {eid: [] for eid in eids}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(fetch, eid, window_start, window_end)
+                   for eid in eids for window_start, window_end in split_range(startdate, enddate)]
+        for future in futures:
+            eid, values = future.result()
+            #le finestre della griglia possono uscire dall'intervallo richiesto
+            series[eid].extend(value for value in values if startdate <= value[0].date() <= enddate)
+    return series
+
+
+def collector_running(status_path):
+    #vero se il collector aggiorna il suo file di stato: stesso criterio dell'interfaccia (nessun heartbeat da tre cicli = fermo)
+    try:
+        with open(status_path, encoding="utf-8") as f:
+            status = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return time.time() - status.get("heartbeat", 0) <= 3 * status.get("interval", 5)
+
+
+def file_version(path):
+    #dimensione e data di modifica del file, None se non esiste
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def merge_samples(root, samples):
+    #inserisce i campioni orari nell'albero e restituisce quanti ne sono stati scritti
+    days = {day_elem.get('date'): day_elem for day_elem in root.findall("./day")}
+
+    added = 0
+    replaced = set()
+    for bin_start in sorted(samples):
+        date_str = bin_start.strftime("%Y-%m-%d")
+        time_str = bin_start.strftime("%H:%M:%S")
+        day_elem = days.get(date_str)
+        if day_elem is None:
+            day_elem = ET.SubElement(root, "day")
+            day_elem.set("date", date_str)
+            day_elem.set("source", "auroravision")
+            days[date_str] = day_elem
+            replaced.add(date_str)
+        elif day_elem.get("source") != "auroravision":
+            #giorno con campioni dal vivo: non viene toccato
+            continue
+        elif date_str not in replaced:
+            for power_elem in day_elem.findall("./power"):
+                day_elem.remove(power_elem)
+            replaced.add(date_str)
+        power_elem = ET.SubElement(day_elem, "power")
+        power_elem.set("time", time_str)
+        power_elem.set("value", str(round(sum(samples[bin_start].values()), 3)))
+        for eid, value in samples[bin_start].items():
+            plant_elem = ET.SubElement(power_elem, "plant")
+            plant_elem.set("id", eid)
+            plant_elem.set("value", str(value))
+        added += 1
+    return added
+
+
+def write_energy_xml(path, series, attempts=WRITE_ATTEMPTS):
+    #unisce le fasce nel file dati di EnergyMonitor: un campione per ora con il totale e il dettaglio per impianto
+    #(l'energia di un'ora in kWh è la potenza media in kW)
+    #le medie orarie non si mescolano ai campioni dal vivo: si scrivono solo giorni conclusi e assenti dal file,
+    #oppure scritti da un backfill precedente (segnati con source="auroravision"), che vengono sostituiti per intero;
+    #il giorno in corso resta al monitoraggio dal vivo
+    #se un altro processo salva un campione durante l'unione, il file viene riletto e l'unione ripetuta
+    #(altrimenti la sostituzione cancellerebbe il campione)
+    today = datetime.date.today()
+    samples = {}
+    for eid, values in series.items():
+        for bin_start, value in values:
+            if bin_start.date() < today:
+                samples.setdefault(bin_start, {})[eid] = value
+
+    temp_path = path + ".tmp"
+    for _ in range(attempts):
+        version = file_version(path)
+        if version is not None:
+            tree = ET.parse(path)
+        else:
+            tree = ET.ElementTree(ET.Element("energy_data"))
+        added = merge_samples(tree.getroot(), samples)
+        tree.write(temp_path)
+        if file_version(path) == version:
+            os.replace(temp_path, path)
+            return added
+        time.sleep(WRITE_RETRY_DELAY)
+    os.remove(temp_path)
+    raise RuntimeError("{} modificato da un altro processo durante la scrittura".format(path))
 
 
 if __name__ == '__main__':
@@ -75,8 +348,21 @@ if __name__ == '__main__':
                         dest="yesterday",
                         default=False,
                         help="output yesterday's generation")
+    parser.add_argument("--start", help="backfill: primo giorno (YYYYMMDD)")
+    parser.add_argument("--end", help="backfill: ultimo giorno incluso (YYYYMMDD, default oggi)")
+    parser.add_argument("--eids", default="14349631", help="backfill: id degli impianti separati da virgola")
+    parser.add_argument("--output", default="energy_data.xml", help="backfill: file dati di EnergyMonitor")
+    parser.add_argument("--cache-dir", default=".auroravision_cache", help="backfill: cartella della cache delle risposte")
+    parser.add_argument("--workers", type=int, default=4, help="backfill: richieste contemporanee")
+    parser.add_argument("--tz", default=None, help="backfill: fuso orario delle fasce (default: quello locale)")
+    parser.add_argument("--status", default="collector_status.json", help="backfill: file di stato del collector")
+    parser.add_argument("--force", action="store_true", default=False, help="backfill: scrive anche con il collector attivo")
 
     args = parser.parse_args()
+
+    #il collector riscrive il file dati a ogni ciclo: il backfill va eseguito con il collector fermo
+    if args.start and not args.force and collector_running(args.status):
+        sys.exit("Collector attivo ({}): arrestarlo prima del backfill o usare --force".format(args.status))
     
     if args.username:
         username = args.username
@@ -87,9 +373,16 @@ if __name__ == '__main__':
     else:
         password = input("Password:\n")
 
-    access = AbbAccess(username, password)
+    access = AbbAccess(username, password, pool_size=args.workers)
 
-    if args.yesterday:
+    if args.start:
+        startdate = datetime.datetime.strptime(args.start, "%Y%m%d").date()
+        enddate = datetime.datetime.strptime(args.end, "%Y%m%d").date() if args.end else datetime.date.today()
+        eids = [eid.strip() for eid in args.eids.split(",") if eid.strip()]
+        series = backfill(access, eids, startdate, enddate, ResponseCache(args.cache_dir), args.workers, args.tz)
+        added = write_energy_xml(args.output, series)
+        print("{} campioni aggiunti a {}".format(added, args.output))
+    elif args.yesterday:
         yesterday_date = datetime.date.today() - datetime.timedelta(days=1)
         result = access.get_usage_date(yesterday_date)
         pprint.pprint(result)
@@ -0,0 +1,353 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import metrics
+from config_manager import ConfigManager
+from data_storage import DataStorage
+from energy_statistics import StatisticsCalculator
+
+logger = logging.getLogger(__name__)
+
+# Risoluzioni accettate da /series, in secondi (0 = campioni originali)
+RESOLUTIONS = {
+    'raw': 0,
+    '1min': 60,
+    '5min': 300,
+    '15min': 900,
+    '1h': 3600,
+    '1d': 86400
+}
+
+class QueryError(ValueError):
+    """Parametri della richiesta non validi"""
+
+class QueryService:
+    """
+    Servizio di interrogazione in sola lettura dei dati memorizzati.
+    
+    I risultati vengono conservati in una piccola cache LRU associata alla versione
+    dei dati (data di modifica e dimensione del file XML): un nuovo campione cambia
+    la versione e rende obsolete tutte le risposte. Il collector, quando ospita il
+    server, svuota la cache direttamente con invalidate() ad ogni campione.
+    """
+    def __init__(self, data_storage, statistics_calculator, status_path='collector_status.json', cache_size=64):
+        """
+        Inizializza il servizio
+        
+        Args:
+            data_storage: Gestore dei dati
+            statistics_calculator: Calcolatore delle statistiche
+            status_path: File di stato del collector servito da /status
+            cache_size: Numero massimo di risposte in cache
+        """
+        self.data_storage = data_storage
+        self.statistics = statistics_calculator
+        self.status_path = status_path
+        self.status_provider = None
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.generation = 0
+        self.lock = threading.Lock()
+    
+    def invalidate(self):
+        """Svuota la cache, da chiamare ad ogni nuovo campione"""
+        with self.lock:
+            self.generation += 1
+            self.cache.clear()
+    
+    def data_version(self):
+        """
+        Identifica la versione corrente dei dati
+        
+        Returns:
+            tuple: (generazione, mtime, dimensione) del file XML
+        """
+        try:
+            stat = os.stat(self.data_storage.xml_file_path)
+            return (self.generation, stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            return (self.generation, 0, 0)
+    
+    @metrics.timed('api_query')
+    def query(self, path, params):
+        """
+        Esegue una richiesta usando la cache
+        
+        Args:
+            path: Percorso dell'endpoint (es. '/series')
+            params: Dizionario dei parametri della query
+        
+        Returns:
+            tuple: (etag, body) - ETag e corpo JSON della risposta
+        """
+        if path == '/status':
+            # Lo stato cambia ad ogni ciclo ed è economico da leggere, non viene messo in cache
+            return self._encode(self.get_status())
+        
+        handlers = {
+            '/series': self.get_series,
+            '/daily': self.get_daily,
+            '/monthly': self.get_monthly,
+            '/plants': self.get_plants,
+            '/plant_series': self.get_plant_series
+        }
+        if path not in handlers:
+            raise KeyError(path)
+        
+        key = (path, tuple(sorted(params.items())))
+        version = self.data_version()
+        with self.lock:
+            entry = self.cache.get(key)
+            if entry is not None and entry[0] == version:
+                self.cache.move_to_end(key)
+                return entry[1], entry[2]
+        
+        etag, body = self._encode(handlers[path](params))
+        with self.lock:
+            self.cache[key] = (version, etag, body)
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return etag, body
+    
+    def _encode(self, data):
+        """Serializza la risposta e ne calcola l'ETag"""
+        body = json.dumps(data, separators=(',', ':')).encode('utf-8')
+        return f'"{hashlib.sha1(body).hexdigest()}"', body
+    
+    def _parse_range(self, params, default_days):
+        """Legge i parametri start/end (date o date e ora ISO), per default gli ultimi giorni"""
+        try:
+            if 'end' in params:
+                end = datetime.fromisoformat(params['end'])
+                # Una data senza ora include tutto il giorno indicato
+                if len(params['end']) == 10:
+                    end += timedelta(days=1)
+            else:
+                end = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+            if 'start' in params:
+                start = datetime.fromisoformat(params['start'])
+            else:
+                start = end - timedelta(days=default_days)
+        except ValueError as e:
+            raise QueryError(f"Data non valida: {e}")
+        if start >= end:
+            raise QueryError("L'inizio dell'intervallo deve precedere la fine")
+        return start, end
+    
+    def get_series(self, params):
+        """
+        Serie di potenza in un intervallo, eventualmente ricampionata (media per intervallo)
+        
+        Args:
+            params: start, end (ISO, default oggi), resolution (raw, 1min, 5min, 15min, 1h, 1d o secondi)
+        """
+        start, end = self._parse_range(params, default_days=1)
+        resolution = params.get('resolution', 'raw')
+        if resolution in RESOLUTIONS:
+            bucket_seconds = RESOLUTIONS[resolution]
+        elif resolution.isdigit():
+            bucket_seconds = int(resolution)
+        else:
+            raise QueryError(f"Risoluzione non valida: {resolution}")
+        
+        timestamps, power_values = self.data_storage.load_range(start, end)
+        
+        if bucket_seconds <= 0:
+            points = [[dt.strftime('%Y-%m-%dT%H:%M:%S'), power] for dt, power in zip(timestamps, power_values)]
+        else:
+            # Media della potenza per ogni intervallo a partire dall'inizio della serie
+            buckets = OrderedDict()
+            for dt, power in zip(timestamps, power_values):
+                index = int((dt - start).total_seconds() // bucket_seconds)
+                total, count = buckets.get(index, (0.0, 0))
+                buckets[index] = (total + power, count + 1)
+            points = [
+                [(start + timedelta(seconds=index * bucket_seconds)).strftime('%Y-%m-%dT%H:%M:%S'), total / count]
+                for index, (total, count) in buckets.items()
+            ]
+        
+        return {
+            "start": start.strftime('%Y-%m-%dT%H:%M:%S'),
+            "end": end.strftime('%Y-%m-%dT%H:%M:%S'),
+            "resolution": resolution,
+            "unit": "kW",
+            "points": points
+        }
+    
+    def get_daily(self, params):
+        """
+        Energia giornaliera in un intervallo, dai contatori giornalieri dell'inverter
+        (i giorni senza contatori vengono integrati dallo storage)
+        
+        Args:
+            params: start, end (ISO, default ultimi 30 giorni)
+        """
+        start, end = self._parse_range(params, default_days=30)
+        # Un giorno è incluso se inizia prima della fine dell'intervallo
+        start_date = start.strftime('%Y-%m-%d')
+        daily_energy = {day: kwh for day, kwh in self.data_storage.load_daily_energy().items()
+                        if start_date <= day and datetime.strptime(day, '%Y-%m-%d') < end}
+        return {"unit": "kWh", "days": daily_energy}
+    
+    def get_monthly(self, params):
+        """Energia mensile su tutti i dati memorizzati"""
+        return {"unit": "kWh", "months": self.statistics.calculate_monthly_data()}
+    
+    def get_plants(self, params):
+        """Impianti presenti nei dati memorizzati"""
+        return {"plants": self.data_storage.get_plant_ids()}
+    
+    def get_plant_series(self, params):
+        """
+        Serie di potenza di un singolo impianto
+        
+        Args:
+            params: id (impianto, obbligatorio), days (giorni fino a oggi, default 1)
+        """
+        plant_id = params.get('id')
+        if not plant_id:
+            raise QueryError("Parametro id dell'impianto mancante")
+        try:
+            days = int(params.get('days', 1))
+        except ValueError:
+            raise QueryError(f"Numero di giorni non valido: {params['days']}")
+        if days < 1:
+            raise QueryError("Il numero di giorni deve essere almeno 1")
+        
+        timestamps, power_values = self.data_storage.load_plant_data(plant_id, days)
+        return {
+            "plant": plant_id,
+            "unit": "kW",
+            "points": [[dt.strftime('%Y-%m-%dT%H:%M:%S'), power] for dt, power in zip(timestamps, power_values)]
+        }
+    
+    def get_status(self):
+        """Stato del collector (ultimo campione, allarme, heartbeat)"""
+        if self.status_provider is not None:
+            return self.status_provider()
+        try:
+            with open(self.status_path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"error": "Stato del collector non disponibile"}
+
+class QueryRequestHandler(BaseHTTPRequestHandler):
+    """Gestore HTTP delle richieste GET verso il QueryService"""
+    service = None
+    
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        
+        if url.path == '/metrics':
+            body = metrics.registry.to_prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        
+        metrics.inc('http_requests')
+        
+        try:
+            etag, body = self.service.query(url.path, params)
+        except KeyError:
+            self._send_json(404, {"error": f"Endpoint non trovato: {url.path}"})
+            return
+        except QueryError as e:
+            self._send_json(400, {"error": str(e)})
+            return
+        except Exception as e:
+            logger.error(f"Errore nella richiesta {self.path}: {e}")
+            self._send_json(500, {"error": "Errore interno"})
+            return
+        
+        # Il client ha già la versione corrente: nessun corpo da inviare
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def _send_json(self, code, data):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+def start_api_server(service, host='127.0.0.1', port=8765):
+    """
+    Avvia il server HTTP in un thread in background
+    
+    Args:
+        service: QueryService da esporre
+        host: Indirizzo di ascolto (default solo locale)
+        port: Porta di ascolto
+    
+    Returns:
+        ThreadingHTTPServer: Server avviato, da fermare con shutdown()
+    """
+    handler = type('BoundQueryRequestHandler', (QueryRequestHandler,), {'service': service})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="ApiServer", daemon=True).start()
+    logger.info(f"API HTTP in ascolto su http://{host}:{port}")
+    return server
+
+def create_query_service(config_manager, data_storage=None):
+    """
+    Crea il QueryService a partire dalla configurazione
+    
+    Args:
+        config_manager: Gestore della configurazione
+        data_storage: Gestore dei dati già esistente (opzionale)
+    """
+    data_storage = data_storage or DataStorage(config_manager)
+    return QueryService(
+        data_storage,
+        StatisticsCalculator(data_storage),
+        status_path=config_manager.get_setting('COLLECTOR_STATUS_PATH', 'collector_status.json')
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="API HTTP in sola lettura sui dati di Energy Monitor")
+    parser.add_argument("-c", "--config", default="config.ini", help="File di configurazione")
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [%(name)s] %(message)s")
+    config_manager = ConfigManager(args.config)
+    server = start_api_server(
+        create_query_service(config_manager),
+        host=config_manager.get('API', 'HOST', '127.0.0.1'),
+        port=config_manager.getint('API', 'PORT', 8765)
+    )
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == '__main__':
+    main()
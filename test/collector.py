@@ -0,0 +1,317 @@
+import argparse
+import asyncio
+import json
+import logging
+import logging.handlers
+import os
+import signal
+import threading
+import time
+from datetime import datetime
+
+import metrics
+import network
+from api_server import create_query_service, start_api_server
+from config_manager import ConfigManager
+from data_sources import SourceScheduler, build_sources
+from data_storage import DataStorage
+from fusion_solar_interface import FusionSolarInterface
+from metric_scheduler import MetricScheduler
+from plant_poller import PlantPoller
+
+logger = logging.getLogger(__name__)
+
+class Collector:
+    """
+    Processo di raccolta dati senza interfaccia grafica.
+    
+    Interroga l'impianto, salva i campioni nel file XML e valuta le condizioni di
+    allarme; l'esito di ogni ciclo viene scritto in un file di stato che l'interfaccia
+    legge insieme al file XML, senza mai interrogare l'impianto direttamente.
+    Non importa tkinter né matplotlib.
+    """
+    def __init__(self, config_manager):
+        """
+        Inizializza il collector
+        
+        Args:
+            config_manager: Gestore della configurazione
+        """
+        self.config = config_manager
+        self.interval = self.config.get_int_setting('TIME_INTERVAL', 5)
+        self.alarm_enabled = self.config.get_bool_setting('ALARM_ENABLED', True)
+        self.status_path = self.config.get_setting('COLLECTOR_STATUS_PATH', 'collector_status.json')
+        
+        self.storage = DataStorage(config_manager)
+        self.interface = FusionSolarInterface(config_manager)
+        
+        # Con più impianti le letture avvengono in parallelo e si salva anche il dettaglio per impianto
+        self.poller = None
+        if self.config.get_bool_setting('MULTI_PLANT_ENABLED', False):
+            plant_ids = [plant_id.strip() for plant_id in self.config.get_setting('PLANT_IDS', '').split(',')]
+            self.poller = PlantPoller(self.interface, plant_ids, self.config.get_int_setting('PLANT_POLL_WORKERS', 8))
+        
+        # Tutte le sorgenti abilitate (FusionSolar ed eventualmente AuroraVision) lette da un solo scheduler
+        self.scheduler = SourceScheduler(build_sources(config_manager, self.interface, self.poller, self.storage), self.storage)
+        # Dati FusionSolar aggiuntivi letti con intervalli propri (flusso, statistiche, informazioni impianto)
+        self.metric_scheduler = MetricScheduler.from_config(config_manager, self.interface)
+        self.loop = asyncio.new_event_loop()
+        
+        self.stop_event = threading.Event()
+        self.sample_count = 0
+        self.last_sample = None
+        self.alarm_active = False
+        self.alarm_reason = None
+        self.last_cleanup_date = datetime.now().date()
+        self.last_export_time = time.time()
+        
+        # Le chiamate di rete hanno una scadenza; il watchdog riavvia comunque un ciclo bloccato
+        self.watchdog = network.Watchdog("collector", network.watchdog_timeout(config_manager, self.interval),
+                                        self.restart_poll_loop)
+        self.poll_generation = 0
+        self.poll_thread = None
+        
+        # API HTTP locale opzionale, servita dallo stesso storage del collector
+        self.query_service = None
+        self.api_server = None
+        if self.config.getboolean('API', 'ENABLED', False):
+            self.query_service = create_query_service(self.config, self.storage)
+            self.query_service.status_provider = self.build_status
+            self.api_server = start_api_server(
+                self.query_service,
+                host=self.config.get('API', 'HOST', '127.0.0.1'),
+                port=self.config.getint('API', 'PORT', 8765)
+            )
+    
+    def set_alarm(self, reason):
+        """
+        Attiva l'allarme (se non già attivo)
+        
+        Args:
+            reason: Motivo dell'allarme
+        """
+        if not self.alarm_active:
+            logger.warning(f"Attivazione allarme: {reason}")
+        self.alarm_active = True
+        self.alarm_reason = reason
+    
+    def reset_alarm(self):
+        """Disattiva l'allarme"""
+        if self.alarm_active:
+            logger.info("Reset allarme")
+        self.alarm_active = False
+        self.alarm_reason = None
+    
+    def poll_once(self):
+        """
+        Esegue un ciclo di raccolta: lettura potenza, salvataggio e controllo allarme
+        
+        Returns:
+            Reading: Totale delle sorgenti o None in caso di errore di comunicazione
+        """
+        power_status = self.loop.run_until_complete(self.scheduler.poll_once())
+        
+        if power_status is None:
+            # Errore di comunicazione o sessione non rinnovabile: allarme sempre attivo
+            self.set_alarm("Errore di comunicazione con l'impianto")
+            return None
+        
+        current_power = power_status.current_power_kw
+        plant_values = power_status.plants
+        self.sample_count += 1
+        if self.query_service is not None:
+            self.query_service.invalidate()
+        self.last_sample = {
+            "timestamp": datetime.now().strftime('%Y-%m-%d ') + power_status.timestamp,
+            "power": current_power,
+            "status": power_status.status
+        }
+        if plant_values:
+            self.last_sample["plants"] = plant_values
+        if power_status.energy_today_kwh is not None:
+            self.last_sample["energy_today"] = power_status.energy_today_kwh
+        logger.info(f"Potenza: {current_power:.2f} kW - Stato: {power_status.status}")
+        
+        if self.alarm_enabled and current_power == 0:
+            self.set_alarm("Produzione zero")
+        else:
+            self.reset_alarm()
+        
+        return power_status
+    
+    def clean_old_data_daily(self):
+        """Applica il periodo di conservazione una volta al giorno"""
+        today = datetime.now().date()
+        if today != self.last_cleanup_date:
+            self.storage.initialize_xml_file()
+            self.last_cleanup_date = today
+    
+    def export_if_due(self):
+        """Esegue l'esportazione automatica se abilitata e se è trascorso l'intervallo configurato"""
+        if not self.config.getboolean('EXPORT', 'AUTO_EXPORT_ENABLED', False):
+            return
+        interval_hours = self.config.getint('EXPORT', 'AUTO_EXPORT_INTERVAL_HOURS', 24)
+        if time.time() - self.last_export_time < interval_hours * 3600:
+            return
+        
+        self.last_export_time = time.time()
+        export_folder = self.config.get('EXPORT', 'AUTO_EXPORT_FOLDER', os.getcwd())
+        export_format = self.config.get('EXPORT', 'AUTO_EXPORT_FORMAT', 'csv')
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        if export_format == 'csv':
+            self.storage.export_to_csv(os.path.join(export_folder, f"auto_export_{timestamp}.csv"))
+        else:
+            self.storage.export_to_xml(os.path.join(export_folder, f"auto_export_{timestamp}.xml"))
+    
+    def build_status(self):
+        """
+        Stato corrente del collector
+        
+        Returns:
+            dict: Heartbeat, ultimo campione e stato dell'allarme
+        """
+        return {
+            "pid": os.getpid(),
+            "heartbeat": time.time(),
+            "interval": self.interval,
+            "sample_count": self.sample_count,
+            "sample": self.last_sample,
+            "alarm": {"active": self.alarm_active, "reason": self.alarm_reason},
+            "sources": self.scheduler.last_health,
+            "hourly_energy": self.scheduler.last_hourly_energy,
+            "metric_families": self.metric_scheduler.next_due_in(),
+            "metric_data": self.metric_scheduler.latest
+        }
+    
+    def write_status(self):
+        """Scrive in modo atomico il file di stato letto dall'interfaccia"""
+        status = self.build_status()
+        temp_path = f"{self.status_path}.tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                # I valori letti dal portale possono contenere tipi non JSON (es. date): salvati come testo
+                json.dump(status, f, default=str)
+            for _ in range(10):
+                try:
+                    os.replace(temp_path, self.status_path)
+                    return
+                except PermissionError:
+                    # Su Windows la sostituzione fallisce se il file è aperto in lettura
+                    time.sleep(0.05)
+            os.replace(temp_path, self.status_path)
+        except OSError as e:
+            logger.error(f"Errore nella scrittura del file di stato: {e}")
+    
+    def run(self):
+        """Ciclo principale di raccolta, termina alla chiamata di stop()"""
+        logger.info(f"Collector avviato (intervallo {self.interval} s)")
+        self.start_poll_loop()
+        self.watchdog.start()
+        self.stop_event.wait()
+        self.watchdog.stop()
+        self.poll_thread.join(timeout=self.interval)
+        
+        if self.api_server is not None:
+            self.api_server.shutdown()
+        if self.poller is not None:
+            self.poller.shutdown()
+        self.metric_scheduler.shutdown()
+        if not self.loop.is_running():
+            self.loop.close()
+        logger.info("Collector arrestato")
+    
+    def start_poll_loop(self):
+        """Avvia il thread del ciclo di raccolta (una nuova generazione sostituisce la precedente)"""
+        self.poll_generation += 1
+        self.poll_thread = threading.Thread(target=self.poll_loop, args=(self.poll_generation,),
+                                            name=f"CollectorPoll-{self.poll_generation}", daemon=True)
+        self.poll_thread.start()
+    
+    def poll_loop(self, generation):
+        """
+        Ciclo di raccolta; termina con stop() o quando il watchdog avvia una nuova generazione
+        
+        Args:
+            generation: Generazione del ciclo, confrontata con quella corrente
+        """
+        while not self.stop_event.is_set() and generation == self.poll_generation:
+            cycle_start = time.monotonic()
+            self.watchdog.beat()
+            self.run_cycle()
+            # Segnale anche prima dell'attesa: l'intervallo non conta come tempo di blocco
+            self.watchdog.beat()
+            
+            # Attende l'intervallo al netto della durata del ciclo
+            elapsed = time.monotonic() - cycle_start
+            self.stop_event.wait(max(0.0, self.interval - elapsed))
+    
+    def restart_poll_loop(self):
+        """Chiamata dal watchdog: abbandona il ciclo bloccato e ne avvia uno nuovo"""
+        self.set_alarm("Ciclo di raccolta bloccato")
+        self.write_status()
+        # Il ciclo abbandonato può essere fermo dentro l'event loop: il nuovo ne usa uno proprio
+        stalled_loop = self.loop
+        self.loop = asyncio.new_event_loop()
+        if not stalled_loop.is_running():
+            stalled_loop.close()
+        self.start_poll_loop()
+    
+    def run_cycle(self):
+        """Esegue un ciclo completo: raccolta, conservazione, esportazione e file di stato"""
+        try:
+            power_status = self.poll_once()
+            # Una lettura FusionSolar riuscita in questo ciclo vale come verifica della sessione
+            fusionsolar_ok = power_status is not None and 'fusionsolar' in power_status.source.split('+')
+            self.metric_scheduler.run_due(session_ok=fusionsolar_ok)
+            self.clean_old_data_daily()
+            self.export_if_due()
+        except Exception as e:
+            logger.error(f"Errore nel ciclo di raccolta: {e}")
+            self.set_alarm(f"Errore nel ciclo di raccolta: {e}")
+        self.write_status()
+    
+    def stop(self):
+        """Richiede l'arresto del ciclo di raccolta"""
+        self.stop_event.set()
+
+def setup_logging(log_file):
+    """
+    Configura il log su file a rotazione e su console
+    
+    Args:
+        log_file: Percorso del file di log
+    """
+    formatter = logging.Formatter("%(asctime)s %(levelname)s [%(name)s] %(message)s")
+    file_handler = logging.handlers.RotatingFileHandler(log_file, maxBytes=5 * 1024 * 1024, backupCount=10, encoding='utf-8')
+    file_handler.setFormatter(formatter)
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(formatter)
+    
+    root_logger = logging.getLogger()
+    root_logger.setLevel(logging.INFO)
+    root_logger.addHandler(file_handler)
+    root_logger.addHandler(console_handler)
+
+def main():
+    parser = argparse.ArgumentParser(description="Raccolta dati Energy Monitor senza interfaccia grafica")
+    parser.add_argument("-c", "--config", default="config.ini", help="File di configurazione")
+    parser.add_argument("-l", "--log-file", default="collector.log", help="File di log")
+    args = parser.parse_args()
+    
+    setup_logging(args.log_file)
+    config_manager = ConfigManager(args.config)
+    metrics.start_from_config(config_manager)
+    network.configure_from_config(config_manager)
+    collector = Collector(config_manager)
+    
+    # Arresto pulito con Ctrl+C o alla chiusura del servizio
+    def handle_signal(signum, frame):
+        collector.stop()
+    signal.signal(signal.SIGINT, handle_signal)
+    if hasattr(signal, 'SIGTERM'):
+        signal.signal(signal.SIGTERM, handle_signal)
+    
+    collector.run()
+
+if __name__ == '__main__':
+    main()
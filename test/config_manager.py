@@ -37,7 +37,10 @@ class ConfigManager:
             'TIME_INTERVAL': '5',
             'ALARM_ENABLED': 'True',
             'DATA_RETENTION_DAYS': '30',
-            'XML_FILE_PATH': os.path.join(os.getcwd(), 'energy_data.xml')
+            'XML_FILE_PATH': os.path.join(os.getcwd(), 'energy_data.xml'),
+            'MULTI_PLANT_ENABLED': 'False',
+            'PLANT_IDS': '',
+            'PLANT_POLL_WORKERS': '8'
         }
         
         # Impostazioni esportazione
@@ -48,6 +51,53 @@ class ConfigManager:
             'AUTO_EXPORT_FORMAT': 'csv'
         }
         
+        # Impostazioni API HTTP locale (servita dal collector)
+        self.config['API'] = {
+            'ENABLED': 'False',
+            'HOST': '127.0.0.1',
+            'PORT': '8765'
+        }
+        
+        # Metriche dei percorsi critici (endpoint Prometheus e snapshot JSON)
+        self.config['METRICS'] = {
+            'SERVER_ENABLED': 'False',
+            'HOST': '127.0.0.1',
+            'PORT': '9108',
+            'SNAPSHOT_PATH': '',
+            'SNAPSHOT_INTERVAL': '60'
+        }
+        
+        # Timeout, tentativi e pool di connessioni comuni a tutte le sorgenti dati
+        self.config['SOURCES'] = {
+            'TIMEOUT': '20',
+            'ATTEMPTS': '3',
+            'BACKOFF': '1',
+            'POOL_SIZE': '8'
+        }
+        
+        # Portale AuroraVision (ABB/FIMER) come sorgente aggiuntiva
+        self.config['AURORAVISION'] = {
+            'ENABLED': 'False',
+            'USERNAME': '',
+            'PASSWORD': '',
+            'ENTITY_IDS': ''
+        }
+        
+        # Intervalli in secondi dei dati FusionSolar aggiuntivi (0 = non letti)
+        self.config['METRIC_INTERVALS'] = {
+            'PLANT_FLOW': '60',
+            'PLANT_STATS': '300',
+            'PLANT_INFO': '86400'
+        }
+        
+        # Scadenze delle chiamate di rete e watchdog del ciclo di raccolta (secondi)
+        self.config['NETWORK'] = {
+            'REQUEST_TIMEOUT': '30',
+            'LOGIN_TIMEOUT': '90',
+            'WORKERS': '8',
+            'WATCHDOG_TIMEOUT': '300'
+        }
+        
         # Salva la configurazione predefinita
         self.save()
     
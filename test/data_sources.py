@@ -0,0 +1,398 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Optional, Protocol
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class Reading:
+    """Lettura di potenza di una sorgente dati"""
+    source: str
+    # None per le sorgenti che forniscono solo energia per fascia oraria
+    current_power_kw: Optional[float]
+    status: str
+    timestamp: str
+    plants: dict = field(default_factory=dict)
+    failed: list = field(default_factory=list)
+    energy_today_kwh: Optional[float] = None
+    energy_total_kwh: Optional[float] = None
+    # Energia dell'ultima fascia oraria conclusa {id impianto: kWh}
+    hourly_energy: dict = field(default_factory=dict)
+
+@dataclass
+class RetryPolicy:
+    """Timeout e ripetizioni applicati a ogni chiamata verso una sorgente"""
+    timeout: float = 20.0
+    attempts: int = 3
+    backoff: float = 1.0
+    max_backoff: float = 30.0
+
+    @classmethod
+    def from_config(cls, config_manager):
+        """Legge la politica dalla sezione [SOURCES] della configurazione"""
+        return cls(
+            timeout=config_manager.getfloat('SOURCES', 'TIMEOUT', 20.0),
+            attempts=max(config_manager.getint('SOURCES', 'ATTEMPTS', 3), 1),
+            backoff=config_manager.getfloat('SOURCES', 'BACKOFF', 1.0)
+        )
+
+    async def call(self, name, func, *args):
+        """
+        Esegue una funzione bloccante in un thread con timeout, ripetendola in caso di errore
+
+        Args:
+            name: Nome dell'operazione (metriche e log)
+            func: Funzione bloccante da eseguire
+
+        Returns:
+            Il risultato di func
+
+        Raises:
+            Exception: L'ultimo errore dopo aver esaurito i tentativi
+        """
+        delay = self.backoff
+        for attempt in range(1, self.attempts + 1):
+            try:
+                return await asyncio.wait_for(asyncio.to_thread(func, *args), self.timeout)
+            except Exception as e:
+                metrics.record_error(name)
+                if attempt == self.attempts:
+                    raise
+                logger.warning(f"{name}: tentativo {attempt} di {self.attempts} non riuscito ({e!r}), nuovo tentativo tra {delay:.0f} s")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_backoff)
+
+class DataSource(Protocol):
+    """
+    Sorgente dati di produzione (un portale di monitoraggio con uno o più impianti).
+
+    Tutte le sorgenti espongono gli stessi metodi asincroni, così un unico
+    SourceScheduler può interrogarle insieme e scrivere nello stesso storage.
+    Solo le sorgenti con potenza istantanea (instantaneous) entrano nel totale salvato.
+    """
+    name: str
+    instantaneous: bool
+
+    async def login(self) -> bool:
+        """Apre (o rinnova) la sessione, True se riuscito"""
+
+    async def poll_current(self) -> Reading:
+        """Potenza attuale, solleva un'eccezione se la lettura non è possibile"""
+
+    async def fetch_range(self, start: datetime, end: datetime) -> list:
+        """Storico [(datetime, valore)] tra start e end"""
+
+    async def health(self) -> dict:
+        """Stato della sorgente: ultima lettura riuscita, errori consecutivi, ultimo errore"""
+
+class SourceHealth:
+    """Stato di salute condiviso dagli adattatori"""
+    def __init__(self):
+        self.last_success = None
+        self.consecutive_failures = 0
+        self.last_error = None
+
+    def success(self):
+        self.last_success = time.time()
+        self.consecutive_failures = 0
+        self.last_error = None
+
+    def failure(self, error):
+        self.consecutive_failures += 1
+        self.last_error = str(error)
+
+    def as_dict(self, name):
+        return {
+            "source": name,
+            "healthy": self.consecutive_failures == 0 and self.last_success is not None,
+            "last_success": self.last_success,
+            "consecutive_failures": self.consecutive_failures,
+            "last_error": self.last_error
+        }
+
+class FusionSolarSource:
+    """Adattatore DataSource per FusionSolarInterface (ed eventualmente PlantPoller)"""
+    instantaneous = True
+    
+    def __init__(self, interface, poller=None, policy=None, storage=None):
+        """
+        Args:
+            interface: FusionSolarInterface con la sessione dell'account
+            poller: PlantPoller per la lettura multi-impianto (None = impianto singolo)
+            policy: RetryPolicy delle chiamate
+            storage: DataStorage con lo storico dei campioni salvati
+        """
+        self.name = "fusionsolar"
+        self.interface = interface
+        self.poller = poller
+        self.storage = storage
+        # FusionSolarInterface rinnova già la sessione a ogni lettura: un solo tentativo
+        self.policy = policy or RetryPolicy(attempts=1)
+        self.state = SourceHealth()
+
+    async def login(self):
+        return await self.policy.call('fusionsolar_login', self.interface.renew_session)
+
+    async def poll_current(self):
+        read = self.poller.poll if self.poller is not None else self.interface.get_power_status
+        try:
+            status = await self.policy.call('fusionsolar_poll', read)
+            if status is None:
+                raise RuntimeError("Errore di comunicazione con l'impianto")
+        except Exception as e:
+            self.state.failure(e)
+            raise
+        self.state.success()
+        return Reading(
+            source=self.name,
+            current_power_kw=status.current_power_kw,
+            status=status.status,
+            timestamp=status.timestamp,
+            plants=dict(getattr(status, 'plants', None) or {}),
+            failed=list(getattr(status, 'failed', None) or []),
+            energy_today_kwh=getattr(status, 'energy_today_kwh', None),
+            energy_total_kwh=getattr(status, 'energy_total_kwh', None)
+        )
+
+    async def fetch_range(self, start, end):
+        # fusion_solar_py non espone uno storico per intervallo: si usano i campioni dello storage locale
+        # (con più sorgenti abilitate sono il totale salvato da SourceScheduler)
+        if self.storage is None:
+            return []
+        timestamps, powers = await asyncio.to_thread(self.storage.load_range, start, end)
+        return list(zip(timestamps, powers))
+
+    async def health(self):
+        return self.state.as_dict(self.name)
+
+class AuroraVisionSource:
+    """
+    Adattatore DataSource per il portale AuroraVision (ABB/FIMER), basato su AbbAccess.
+
+    Il portale fornisce solo l'energia per fascia oraria: la sorgente riporta i kWh
+    dell'ultima fascia conclusa di ogni impianto (hourly_energy), che non sono una potenza
+    istantanea e restano fuori dal totale. La fascia in corso contiene solo l'energia
+    parziale dell'ora e non viene usata. Il report viene riletto ogni REFRESH_INTERVAL
+    secondi e subito dopo la chiusura di ogni fascia, non a ogni ciclo del collector.
+    """
+    instantaneous = False
+    # Secondi massimi tra due letture del report (come il TTL delle fasce orarie di auroravision.py)
+    REFRESH_INTERVAL = 600
+    # Attesa dopo l'inizio di una fascia, perché il portale la riporti conclusa
+    BIN_CLOSE_DELAY = 60
+    # Nuovo tentativo dopo una lettura non riuscita
+    RETRY_DELAY = 60
+    
+    def __init__(self, access, entity_ids, policy=None):
+        """
+        Args:
+            access: AbbAccess con la sessione e il pool di connessioni
+            entity_ids: Identificativi (eid) degli impianti
+            policy: RetryPolicy delle chiamate
+        """
+        self.name = "auroravision"
+        self.access = access
+        self.entity_ids = list(entity_ids)
+        self.policy = policy or RetryPolicy()
+        self.state = SourceHealth()
+        # Ultima lettura e istante (time.monotonic) della prossima
+        self.last_reading = None
+        self.next_refresh = 0.0
+
+    @classmethod
+    def from_config(cls, config_manager, policy=None):
+        """Crea la sorgente dalla sezione [AURORAVISION] della configurazione"""
+        # pull_generation è un modulo condiviso del progetto (pip install -e .), importato solo se la sorgente è abilitata
+        from pull_generation import AbbAccess
+        timeout = config_manager.getfloat('SOURCES', 'TIMEOUT', 20.0)
+        access = AbbAccess(
+            config_manager.get('AURORAVISION', 'USERNAME', ''),
+            config_manager.get('AURORAVISION', 'PASSWORD', ''),
+            timeout=(min(timeout, 5.0), timeout),
+            pool_size=config_manager.getint('SOURCES', 'POOL_SIZE', 8)
+        )
+        entity_ids = [eid.strip() for eid in config_manager.get('AURORAVISION', 'ENTITY_IDS', '').split(',') if eid.strip()]
+        return cls(access, entity_ids, policy)
+
+    async def login(self):
+        await self.policy.call('auroravision_login', self.access.login)
+        return True
+
+    @staticmethod
+    def parse_bins(report):
+        """Estrae [(datetime, kWh)] dalle fasce di un report GenerationEnergy"""
+        values = []
+        for report_field in report.get('fields', []):
+            # Solo le fasce: i campi di riepilogo verrebbero sommati due volte
+            if report_field.get('type') != 'bins':
+                continue
+            for entry in report_field.get('values', []):
+                if entry.get('value') is None:
+                    continue
+                values.append((datetime.strptime(entry['startLabel'][:10], '%Y%m%d%H'), float(entry['value'])))
+        return sorted(values)
+
+    async def _fetch_entity(self, eid, start, end):
+        report = await self.policy.call('auroravision_fetch', self.access.get_generation,
+                                        eid, start.strftime('%Y%m%d'), end.strftime('%Y%m%d'))
+        return self.parse_bins(report)
+
+    @staticmethod
+    def last_closed_bin(values, now):
+        """kWh dell'ultima fascia oraria conclusa prima di now (0 se nessuna)"""
+        closed = [value for bin_start, value in values if bin_start + timedelta(hours=1) <= now]
+        return closed[-1] if closed else 0.0
+
+    @classmethod
+    def refresh_delay(cls, now):
+        """Secondi fino alla prossima lettura: ogni REFRESH_INTERVAL e subito dopo la chiusura di una fascia"""
+        next_bin = now.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1, seconds=cls.BIN_CLOSE_DELAY)
+        return min(cls.REFRESH_INTERVAL, (next_bin - now).total_seconds())
+
+    async def poll_current(self):
+        # Fino alla prossima chiusura di fascia il report non cambia: si riusa l'ultima lettura
+        if self.last_reading is not None and time.monotonic() < self.next_refresh:
+            return self.last_reading
+        today = datetime.now()
+        tomorrow = today + timedelta(days=1)
+        results = await asyncio.gather(*(self._fetch_entity(eid, today, tomorrow) for eid in self.entity_ids),
+                                       return_exceptions=True)
+        plants = {}
+        failed = []
+        for eid, result in zip(self.entity_ids, results):
+            if isinstance(result, Exception):
+                failed.append(eid)
+                logger.warning(f"Lettura dell'impianto AuroraVision {eid} non riuscita: {result}")
+            else:
+                plants[eid] = self.last_closed_bin(result, today)
+
+        if not plants:
+            error = RuntimeError("Nessun impianto AuroraVision ha risposto")
+            self.state.failure(error)
+            self.next_refresh = time.monotonic() + self.RETRY_DELAY
+            raise error
+        self.state.success()
+        self.last_reading = Reading(
+            source=self.name,
+            current_power_kw=None,
+            status="Energia oraria",
+            timestamp=time.strftime('%H:%M:%S'),
+            failed=failed,
+            hourly_energy=plants
+        )
+        self.next_refresh = time.monotonic() + self.refresh_delay(datetime.now())
+        return self.last_reading
+
+    async def fetch_range(self, start, end):
+        results = await asyncio.gather(*(self._fetch_entity(eid, start, end) for eid in self.entity_ids))
+        totals = {}
+        for series in results:
+            for bin_start, value in series:
+                totals[bin_start] = totals.get(bin_start, 0.0) + value
+        return sorted(totals.items())
+
+    async def health(self):
+        return self.state.as_dict(self.name)
+
+def build_sources(config_manager, interface, poller=None, storage=None):
+    """
+    Crea le sorgenti dati abilitate nella configurazione
+
+    Args:
+        config_manager: Gestore della configurazione
+        interface: FusionSolarInterface già inizializzata
+        poller: PlantPoller per la lettura multi-impianto FusionSolar
+        storage: DataStorage da cui FusionSolarSource legge lo storico
+
+    Returns:
+        list: Sorgenti dati
+    """
+    policy = RetryPolicy.from_config(config_manager)
+    sources = [FusionSolarSource(interface, poller, RetryPolicy(timeout=policy.timeout, attempts=1), storage)]
+    if config_manager.getboolean('AURORAVISION', 'ENABLED', False):
+        sources.append(AuroraVisionSource.from_config(config_manager, policy))
+    return sources
+
+class SourceScheduler:
+    """
+    Interroga insieme tutte le sorgenti dati e salva il totale nello stesso storage.
+
+    Le sorgenti sono lette in parallelo, ognuna con il proprio timeout: la durata di un
+    ciclo è quella della sorgente più lenta e una sorgente che non risponde non blocca
+    le altre. Il totale e il dettaglio per impianto salvati con il campione comprendono
+    solo le sorgenti con potenza istantanea; l'energia oraria delle altre resta in
+    last_hourly_energy.
+    """
+    def __init__(self, sources, storage):
+        """
+        Args:
+            sources: Sorgenti dati (DataSource)
+            storage: DataStorage in cui salvare i campioni
+        """
+        self.sources = list(sources)
+        self.storage = storage
+        # Stato delle sorgenti all'ultimo ciclo, leggibile da altri thread senza l'event loop
+        self.last_health = []
+        # Energia dell'ultima fascia oraria conclusa delle sorgenti senza potenza istantanea {id impianto: kWh}
+        self.last_hourly_energy = {}
+
+    async def poll_once(self):
+        """
+        Legge tutte le sorgenti e salva il campione aggregato
+
+        Returns:
+            Reading: Totale di tutte le sorgenti, None se nessuna ha risposto
+        """
+        results = await asyncio.gather(*(source.poll_current() for source in self.sources), return_exceptions=True)
+        self.last_health = await self.health()
+        readings = []
+        failed = []
+        for source, result in zip(self.sources, results):
+            if isinstance(result, Exception):
+                logger.warning(f"Sorgente {source.name} non disponibile: {result}")
+                # Solo una sorgente istantanea mancante rende parziale il totale
+                if source.instantaneous:
+                    failed.append(source.name)
+            elif source.instantaneous:
+                readings.append(result)
+                failed.extend(result.failed)
+            else:
+                self.last_hourly_energy.update(result.hourly_energy)
+
+        if not readings:
+            return None
+
+        total_power = sum(reading.current_power_kw for reading in readings)
+        plants = {}
+        for reading in readings:
+            plants.update(reading.plants)
+        timestamp = readings[0].timestamp if len(readings) == 1 else time.strftime('%H:%M:%S')
+        # I contatori di energia si sommano solo se tutte le sorgenti lette li forniscono
+        energy_today = energy_total = None
+        if all(reading.energy_today_kwh is not None for reading in readings):
+            energy_today = sum(reading.energy_today_kwh for reading in readings)
+        if all(reading.energy_total_kwh is not None for reading in readings):
+            energy_total = sum(reading.energy_total_kwh for reading in readings)
+        reading = Reading(
+            source="+".join(reading.source for reading in readings),
+            current_power_kw=total_power,
+            status=readings[0].status if len(readings) == 1 else ("Operativo" if total_power > 0 else "Nessuna Produzione"),
+            timestamp=timestamp,
+            plants=plants,
+            failed=failed,
+            energy_today_kwh=energy_today,
+            energy_total_kwh=energy_total
+        )
+        self.storage.save_power_data(reading.timestamp, reading.current_power_kw, reading.plants or None,
+                                     reading.energy_today_kwh, reading.energy_total_kwh, reading.failed)
+        return reading
+
+    async def health(self):
+        """Stato di salute di tutte le sorgenti"""
+        return list(await asyncio.gather(*(source.health() for source in self.sources)))
+
@@ -1,8 +1,12 @@
 import os
+import time
 import xml.etree.ElementTree as ET
 from datetime import datetime, timedelta
 import logging
 
+import energy
+import metrics
+
 logger = logging.getLogger(__name__)
 
 class DataStorage:
@@ -30,7 +34,7 @@ class DataStorage:
         if not os.path.exists(self.xml_file_path):
             root = ET.Element("energy_data")
             tree = ET.ElementTree(root)
-            tree.write(self.xml_file_path)
+            self._write_tree(tree)
             logger.info(f"Creato nuovo file XML: {self.xml_file_path}")
             return tree
         else:
@@ -45,7 +49,7 @@ class DataStorage:
                 logger.error(f"File XML corrotto: {self.xml_file_path}, creazione nuovo file")
                 root = ET.Element("energy_data")
                 tree = ET.ElementTree(root)
-                tree.write(self.xml_file_path)
+                self._write_tree(tree)
                 return tree
     
     def clean_old_data(self, tree):
@@ -67,15 +71,40 @@ class DataStorage:
                 root.remove(day_elem)
                 logger.debug(f"Rimossi dati per il giorno: {day_date}")
         
-        tree.write(self.xml_file_path)
+        self._write_tree(tree)
     
-    def save_power_data(self, timestamp, power_value):
+    def _write_tree(self, tree):
+        """
+        Scrive l'albero XML in modo atomico (file temporaneo + rinomina), così un altro
+        processo che legge il file (es. l'interfaccia mentre il collector scrive)
+        non vede mai un file scritto a metà
+        
+        Args:
+            tree: Albero XML da salvare
+        """
+        temp_path = f"{self.xml_file_path}.tmp"
+        tree.write(temp_path)
+        for _ in range(10):
+            try:
+                os.replace(temp_path, self.xml_file_path)
+                return
+            except PermissionError:
+                # Su Windows la sostituzione fallisce se il file è aperto in lettura
+                time.sleep(0.05)
+        os.replace(temp_path, self.xml_file_path)
+    
+    @metrics.timed('save_power_data')
+    def save_power_data(self, timestamp, power_value, plant_values=None, energy_today=None, energy_total=None, failed=None):
         """
         Salva i dati di potenza nel file XML
         
         Args:
             timestamp: Timestamp della lettura (stringa in formato %H:%M:%S)
-            power_value: Valore della potenza in kW
+            power_value: Valore della potenza in kW (totale di tutti gli impianti)
+            plant_values: Potenza dei singoli impianti {id impianto: kW} (opzionale)
+            energy_today: Contatore dell'inverter dell'energia prodotta oggi in kWh (opzionale)
+            energy_total: Contatore dell'inverter dell'energia totale prodotta in kWh (opzionale)
+            failed: Impianti (o sorgenti) che non hanno risposto: il totale è parziale (opzionale)
         """
         try:
             tree = ET.parse(self.xml_file_path)
@@ -103,22 +132,45 @@ class DataStorage:
             power_elem.set("time", time_str)
             power_elem.set("value", str(power_value))
             
+            # I contatori dell'inverter permettono di calcolare l'energia per differenza, senza integrare la potenza.
+            # L'ultimo valore resta anche sul giorno, così le statistiche non devono scorrerne i campioni
+            if energy_today is not None:
+                power_elem.set("today", str(energy_today))
+                day_elem.set("today", str(energy_today))
+            if energy_total is not None:
+                power_elem.set("total", str(energy_total))
+                day_elem.set("total", str(energy_total))
+            # Un totale parziale resta nel file per il dettaglio per impianto ma è escluso dalle serie del totale
+            if failed:
+                power_elem.set("failed", ",".join(str(plant_id) for plant_id in failed))
+            
+            # Il dettaglio per impianto è annidato nel campione, che resta il totale per i lettori esistenti
+            for plant_id, plant_power in (plant_values or {}).items():
+                plant_elem = ET.SubElement(power_elem, "plant")
+                plant_elem.set("id", str(plant_id))
+                plant_elem.set("value", str(plant_power))
+            
             # Salva il file XML
-            tree.write(self.xml_file_path)
+            self._write_tree(tree)
+            metrics.inc('samples_ingested')
             logger.debug(f"Salvato dato: {date_str} {time_str} - {power_value} kW")
             
         except Exception as e:
+            metrics.record_error('save_power_data')
             logger.error(f"Errore nel salvataggio dati XML: {e}")
     
-    def load_recent_data(self, days=1):
+    @metrics.timed('load_recent_data')
+    def load_recent_data(self, days=1, with_counters=False):
         """
         Carica i dati più recenti dal file XML
         
         Args:
             days: Numero di giorni da caricare (default: 1 - solo oggi)
+            with_counters: Restituisce anche i contatori di energia dei giorni, letti nella stessa lettura del file
             
         Returns:
-            tuple: (timestamps, power_values) - Liste di timestamp e valori di potenza
+            tuple: (timestamps, power_values) - Liste di timestamp e valori di potenza,
+                   con with_counters anche {data: {"today": kWh, "total": kWh}} dei giorni con contatori
         """
         try:
             tree = ET.parse(self.xml_file_path)
@@ -126,6 +178,7 @@ class DataStorage:
             
             timestamps = []
             powers = []
+            counters = {}
             
             # Calcola le date per il periodo richiesto
             today = datetime.now()
@@ -136,7 +189,13 @@ class DataStorage:
             for day_elem in root.findall("./day"):
                 day_date = day_elem.get('date')
                 if day_date >= start_date_str:
+                    if with_counters:
+                        day_counters = energy.day_counters(day_elem)
+                        if day_counters is not None:
+                            counters[day_date] = day_counters
                     for power_elem in day_elem.findall("./power"):
+                        if power_elem.get('failed') is not None:
+                            continue  # Totale parziale: alcuni impianti non hanno risposto
                         time_str = power_elem.get('time')
                         power_value = float(power_elem.get('value'))
                         
@@ -153,12 +212,145 @@ class DataStorage:
                 timestamps, powers = [], []
                 
             logger.debug(f"Caricati {len(timestamps)} punti dati degli ultimi {days} giorni")
+            if with_counters:
+                return timestamps, powers, counters
             return timestamps, powers
             
         except Exception as e:
+            metrics.record_error('load_recent_data')
+            logger.error(f"Errore nel caricamento dati XML: {e}")
+            return ([], [], {}) if with_counters else ([], [])
+    
+    @metrics.timed('load_range')
+    def load_range(self, start, end):
+        """
+        Carica i dati compresi in un intervallo di date e ore
+        
+        Args:
+            start: Inizio dell'intervallo (datetime, incluso)
+            end: Fine dell'intervallo (datetime, escluso)
+            
+        Returns:
+            tuple: (timestamps, power_values) - Liste di timestamp e valori di potenza
+        """
+        try:
+            tree = ET.parse(self.xml_file_path)
+            root = tree.getroot()
+            
+            start_date_str = start.strftime('%Y-%m-%d')
+            end_date_str = end.strftime('%Y-%m-%d')
+            
+            data = []
+            for day_elem in root.findall("./day"):
+                day_date = day_elem.get('date')
+                # I giorni fuori intervallo vengono scartati senza leggere i campioni
+                if day_date < start_date_str or day_date > end_date_str:
+                    continue
+                for power_elem in day_elem.findall("./power"):
+                    if power_elem.get('failed') is not None:
+                        continue  # Totale parziale: alcuni impianti non hanno risposto
+                    dt = datetime.strptime(f"{day_date} {power_elem.get('time')}", '%Y-%m-%d %H:%M:%S')
+                    if start <= dt < end:
+                        data.append((dt, float(power_elem.get('value'))))
+            
+            data.sort(key=lambda x: x[0])
+            timestamps = [dt for dt, _ in data]
+            powers = [power for _, power in data]
+            
+            logger.debug(f"Caricati {len(timestamps)} punti dati tra {start} e {end}")
+            return timestamps, powers
+            
+        except Exception as e:
+            metrics.record_error('load_range')
             logger.error(f"Errore nel caricamento dati XML: {e}")
             return [], []
     
+    @metrics.timed('load_plant_data')
+    def load_plant_data(self, plant_id, days=1):
+        """
+        Carica i dati recenti di un singolo impianto
+        
+        Args:
+            plant_id: Identificativo dell'impianto
+            days: Numero di giorni da caricare (default: 1 - solo oggi)
+            
+        Returns:
+            tuple: (timestamps, power_values) - Liste di timestamp e valori di potenza
+        """
+        try:
+            tree = ET.parse(self.xml_file_path)
+            start_date_str = (datetime.now() - timedelta(days=days-1)).strftime('%Y-%m-%d')
+            
+            data = []
+            for day_elem in tree.getroot().findall("./day"):
+                day_date = day_elem.get('date')
+                if day_date < start_date_str:
+                    continue
+                for power_elem in day_elem.findall("./power"):
+                    plant_elem = power_elem.find(f"./plant[@id='{plant_id}']")
+                    if plant_elem is not None:
+                        dt = datetime.strptime(f"{day_date} {power_elem.get('time')}", '%Y-%m-%d %H:%M:%S')
+                        data.append((dt, float(plant_elem.get('value'))))
+            
+            data.sort(key=lambda x: x[0])
+            return [dt for dt, _ in data], [power for _, power in data]
+            
+        except Exception as e:
+            metrics.record_error('load_plant_data')
+            logger.error(f"Errore nel caricamento dati dell'impianto {plant_id}: {e}")
+            return [], []
+    
+    @metrics.timed('load_daily_energy')
+    def load_daily_energy(self, days=None):
+        """
+        Energia prodotta in ogni giorno memorizzato.
+        Per i giorni con i contatori dell'inverter si usa il contatore giornaliero,
+        senza leggere i campioni; solo gli altri giorni vengono integrati.
+        
+        Args:
+            days: Numero di giorni da considerare (None = tutti)
+            
+        Returns:
+            dict: {data: kWh prodotti nel giorno}
+        """
+        try:
+            tree = ET.parse(self.xml_file_path)
+            start_date_str = (datetime.now() - timedelta(days=days-1)).strftime('%Y-%m-%d') if days else ""
+            
+            daily_energy = {}
+            for day_elem in tree.getroot().findall("./day"):
+                day_date = day_elem.get('date')
+                if day_date < start_date_str:
+                    continue
+                kwh = energy.day_energy(day_elem)
+                if kwh is not None:
+                    daily_energy[day_date] = kwh
+            return daily_energy
+            
+        except Exception as e:
+            metrics.record_error('load_daily_energy')
+            logger.error(f"Errore nel calcolo dell'energia giornaliera: {e}")
+            return {}
+    
+    def get_plant_ids(self):
+        """
+        Elenca gli impianti presenti nei dati memorizzati
+        
+        Returns:
+            list: Identificativi degli impianti in ordine di comparsa
+        """
+        try:
+            tree = ET.parse(self.xml_file_path)
+            plant_ids = []
+            for plant_elem in tree.getroot().iter("plant"):
+                if plant_elem.get('id') not in plant_ids:
+                    plant_ids.append(plant_elem.get('id'))
+            return plant_ids
+        except Exception as e:
+            logger.error(f"Errore nella lettura degli impianti: {e}")
+            return []
+    
+    @metrics.timed('export_csv')
     def export_to_csv(self, export_path, days=None):
         """
         Esporta i dati in formato CSV
@@ -183,9 +375,11 @@ class DataStorage:
             return True
             
         except Exception as e:
+            metrics.record_error('export_csv')
             logger.error(f"Errore nell'esportazione CSV: {e}")
             return False
     
+    @metrics.timed('export_xml')
     def export_to_xml(self, export_path):
         """
         Esporta i dati in formato XML (copia del file dati originale)
@@ -203,6 +397,7 @@ class DataStorage:
             return True
             
         except Exception as e:
+            metrics.record_error('export_xml')
             logger.error(f"Errore nell'esportazione XML: {e}")
             return False
     
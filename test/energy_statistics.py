@@ -2,6 +2,8 @@ import logging
 from datetime import datetime, timedelta
 from collections import defaultdict
 
+import metrics
+
 logger = logging.getLogger(__name__)
 
 class StatisticsCalculator:
@@ -17,6 +19,7 @@ class StatisticsCalculator:
         """
         self.data_storage = data_storage
     
+    @metrics.timed('calculate_statistics')
     def calculate_statistics(self, days=30):
         """
         Calcola statistiche dettagliate dai dati memorizzati
@@ -28,7 +31,7 @@ class StatisticsCalculator:
             dict: Dizionario con le statistiche calcolate
         """
         try:
-            timestamps, power_values = self.data_storage.load_recent_data(days=days)
+            timestamps, power_values, counters = self.data_storage.load_recent_data(days=days, with_counters=True)
             
             # Se non ci sono dati, restituisci statistiche vuote
             if not timestamps or not power_values:
@@ -61,10 +64,12 @@ class StatisticsCalculator:
                 daily_data[day_str]["powers"].append(power_values[i])
                 daily_data[day_str]["times"].append(dt)
             
-            # Calcola energia giornaliera per ogni giorno
-            daily_energy = {}
+            # Energia dei giorni con i contatori dell'inverter: ultimo valore del contatore giornaliero
+            daily_energy = {day: counter["today"] for day, counter in counters.items() if day in daily_data}
+            
+            # Per i giorni senza contatori (dati precedenti) l'energia viene integrata dai campioni
             for day, data in daily_data.items():
-                if len(data["times"]) < 2:
+                if day in daily_energy or len(data["times"]) < 2:
                     continue
                     
                 # Ordina i dati per orario
@@ -103,6 +108,9 @@ class StatisticsCalculator:
             current_month = datetime.now().strftime('%Y-%m')
             monthly_energy = sum(energy for day, energy in daily_energy.items() if day.startswith(current_month))
             
+            # Energia totale prodotta dall'inverter dall'installazione (contatore più recente)
+            lifetime_totals = [counters[day]["total"] for day in sorted(counters) if counters[day]["total"] is not None]
+            
             return {
                 "max_power": max_power,
                 "max_time": max_time.strftime('%Y-%m-%d %H:%M'),
@@ -112,12 +120,15 @@ class StatisticsCalculator:
                 "days_with_data": len(daily_energy),
                 "best_day": best_day,
                 "monthly_energy": monthly_energy,
-                "daily_energy": daily_energy
+                "daily_energy": daily_energy,
+                "lifetime_energy": lifetime_totals[-1] if lifetime_totals else None
             }
         except Exception as e:
+            metrics.record_error('calculate_statistics')
             logger.error(f"Errore nel calcolo delle statistiche: {e}")
             return None
     
+    @metrics.timed('calculate_monthly_data')
     def calculate_monthly_data(self):
         """
         Calcola le statistiche mensili
@@ -126,43 +137,16 @@ class StatisticsCalculator:
             dict: Dizionario con i dati mensili
         """
         try:
-            # Carica tutti i dati disponibili
-            timestamps, power_values = self.data_storage.load_recent_data(days=9999)
+            # Energia di ogni giorno: contatori dell'inverter dove presenti, integrazione dei campioni per gli altri
+            daily_energy = self.data_storage.load_daily_energy()
             
-            if not timestamps or not power_values:
-                return {}
-            
-            # Raggruppa i dati per mese
-            monthly_data = {}
-            for i, dt in enumerate(timestamps):
-                month_key = dt.strftime('%Y-%m')
-                if month_key not in monthly_data:
-                    monthly_data[month_key] = {"powers": [], "times": []}
-                monthly_data[month_key]["powers"].append(power_values[i])
-                monthly_data[month_key]["times"].append(dt)
-            
-            # Calcola l'energia mensile
-            monthly_energy = {}
-            for month, data in monthly_data.items():
-                if len(data["times"]) < 2:
-                    continue
-                    
-                # Ordina i dati per orario
-                sorted_data = sorted(zip(data["times"], data["powers"]), key=lambda x: x[0])
-                times, powers = zip(*sorted_data)
-                
-                # Calcola l'energia del mese (integrale della potenza nel tempo)
-                month_energy = 0
-                for i in range(1, len(times)):
-                    delta_hours = (times[i] - times[i-1]).total_seconds() / 3600
-                    avg_power_segment = (powers[i] + powers[i-1]) / 2
-                    segment_energy = avg_power_segment * delta_hours
-                    month_energy += segment_energy
-                
-                monthly_energy[month] = month_energy
+            monthly_energy = defaultdict(float)
+            for day, energy in daily_energy.items():
+                monthly_energy[day[:7]] += energy
             
-            return monthly_energy
+            return dict(monthly_energy)
         except Exception as e:
+            metrics.record_error('calculate_monthly_data')
             logger.error(f"Errore nel calcolo dei dati mensili: {e}")
             return {}
     
@@ -182,7 +166,11 @@ class StatisticsCalculator:
                 date_str = datetime.now().strftime('%Y-%m-%d')
             
             # Carica i dati per quel giorno
-            timestamps, power_values = self.data_storage.load_recent_data(days=1)
+            timestamps, power_values, counters = self.data_storage.load_recent_data(days=1, with_counters=True)
+            
+            # Con i contatori dell'inverter l'energia del giorno è l'ultimo valore del contatore
+            if date_str in counters:
+                return counters[date_str]["today"]
             
             if not timestamps or not power_values:
                 return 0.0
@@ -209,6 +197,33 @@ class StatisticsCalculator:
             logger.error(f"Errore nel calcolo dell'energia giornaliera: {e}")
             return 0.0
     
+    def calculate_energy_by_period(self, timestamps, power_values, period_format='%Y-%m-%d'):
+        """
+        Calcola l'energia prodotta raggruppando i campioni per periodo
+        
+        Args:
+            timestamps: Lista ordinata di timestamp
+            power_values: Lista dei valori di potenza in kW
+            period_format: Formato strftime che identifica il periodo (default: giorno)
+            
+        Returns:
+            dict: Dizionario periodo -> energia in kWh
+        """
+        energy_by_period = {}
+        previous_dt = None
+        previous_power = None
+        previous_period = None
+        for dt, power in zip(timestamps, power_values):
+            period = dt.strftime(period_format)
+            if period == previous_period:
+                # Usa la regola del trapezio per l'integrazione
+                delta_hours = (dt - previous_dt).total_seconds() / 3600
+                energy_by_period[period] += (power + previous_power) / 2 * delta_hours
+            elif period not in energy_by_period:
+                energy_by_period[period] = 0.0
+            previous_dt, previous_power, previous_period = dt, power, period
+        return energy_by_period
+    
     def calculate_energy_summary(self, days=30):
         """
         Calcola un riepilogo energetico per un periodo
@@ -1,17 +1,27 @@
 import logging
-import socket
+import threading
 import time
 from dataclasses import dataclass
+from typing import Optional
 from fusion_solar_py.client import FusionSolarClient
 
+import metrics
+import network
+from energy import energy_counters, plant_counters
+
 logger = logging.getLogger(__name__)
 
+# Le informazioni sull'impianto cambiano raramente: al massimo una lettura al giorno
+PLANT_INFO_TTL = 24 * 3600
+
 @dataclass
 class PowerStatus:
     """Classe per i dati sullo stato di potenza"""
     current_power_kw: float
     status: str
     timestamp: str
+    energy_today_kwh: Optional[float] = None
+    energy_total_kwh: Optional[float] = None
 
 class FusionSolarInterface:
     """
@@ -31,6 +41,10 @@ class FusionSolarInterface:
         self.captcha_model_path = self.config.get_credential('CAPTCHA_MODEL_PATH')
         
         self.client = None
+        # Risultati delle chiamate meno frequenti {nome: (scadenza, valore)}
+        self._cache = {}
+        self._cache_lock = threading.Lock()
+        network.connectivity.set_host(network.fusionsolar_host(self.subdomain))
         self.initialize_client()
     
     def initialize_client(self):
@@ -40,17 +54,22 @@ class FusionSolarInterface:
             return
         
         try:
-            self.client = FusionSolarClient(
-                self.username, 
-                self.password,
-                captcha_model_path=self.captcha_model_path,
-                huawei_subdomain=self.subdomain
-            )
+            self.client = self._create_client()
             logger.info("Client FusionSolar inizializzato con successo")
         except Exception as e:
             logger.error(f"Errore nell'inizializzazione del client FusionSolar: {e}")
             self.client = None
     
+    def _create_client(self):
+        """Crea il client FusionSolar effettuando il login, entro la scadenza dei login"""
+        return network.create_client(
+            FusionSolarClient,
+            self.username,
+            self.password,
+            captcha_model_path=self.captcha_model_path,
+            huawei_subdomain=self.subdomain
+        )
+    
     def update_credentials(self, username, password, subdomain, captcha_model_path):
         """
         Aggiorna le credenziali e reinizializza il client
@@ -76,15 +95,11 @@ class FusionSolarInterface:
         self.config.set_credential('SUBDOMAIN', subdomain)
         self.config.set_credential('CAPTCHA_MODEL_PATH', captcha_model_path)
         self.config.save()
+        network.connectivity.set_host(network.fusionsolar_host(subdomain))
         
         # Reinizializza il client
         try:
-            self.client = FusionSolarClient(
-                self.username, 
-                self.password,
-                captcha_model_path=self.captcha_model_path,
-                huawei_subdomain=self.subdomain
-            )
+            self.client = self._create_client()
             logger.info("Credenziali aggiornate e client reinizializzato con successo")
             return True
         except Exception as e:
@@ -93,28 +108,65 @@ class FusionSolarInterface:
     
     def is_session_valid(self):
         """
-        Verifica se la sessione è ancora valida
+        Verifica se la sessione è utilizzabile, senza chiamate al portale.
+        La sessione vera e propria è verificata dalle letture, che se non riescono
+        portano al rinnovo del login (get_power_status).
         
         Returns:
             bool: True se la sessione è valida, False altrimenti
         """
         if not self.client:
             return False
-            
-        try:
-            # Prima verifichiamo se c'è connessione internet
-            socket.create_connection(("www.google.com", 80), timeout=2)
-            
-            # Poi verifichiamo se la sessione è valida
-            test_status = self.client.get_power_status()
-            return True  # Se la richiesta va a buon fine, la sessione è valida
-        except socket.error:
-            logger.warning("Nessuna connessione internet disponibile")
-            return False
-        except Exception as e:
-            logger.warning(f"Sessione scaduta o errore API: {e}")
+        
+        # Nessun traffico aggiuntivo se l'ultima richiesta al portale è riuscita
+        if not network.connectivity.is_online():
+            logger.warning("Portale FusionSolar non raggiungibile")
             return False
+        return True
+    
+    def ensure_session(self):
+        """
+        Verifica la sessione e la rinnova se necessario
+        
+        Returns:
+            bool: True se la sessione è utilizzabile, False altrimenti
+        """
+        if self.client and self.is_session_valid():
+            return True
+        if self.renew_session():
+            return True
+        logger.error("Impossibile rinnovare la sessione")
+        return False
+    
+    def get_cached(self, name):
+        """
+        Restituisce un risultato in cache non ancora scaduto
+        
+        Args:
+            name: Nome del risultato
+            
+        Returns:
+            Il valore in cache o None se assente o scaduto
+        """
+        with self._cache_lock:
+            entry = self._cache.get(name)
+        if entry and entry[0] > time.monotonic():
+            return entry[1]
+        return None
+    
+    def store_cached(self, name, value, ttl):
+        """
+        Memorizza un risultato per ttl secondi
+        
+        Args:
+            name: Nome del risultato
+            value: Valore da memorizzare
+            ttl: Durata di validità in secondi
+        """
+        with self._cache_lock:
+            self._cache[name] = (time.monotonic() + ttl, value)
     
+    @metrics.timed('renew_session')
     def renew_session(self):
         """
         Rinnova la sessione FusionSolar
@@ -128,18 +180,16 @@ class FusionSolarInterface:
             
         try:
             logger.info("Rinnovo della sessione FusionSolar in corso...")
-            self.client = FusionSolarClient(
-                self.username, 
-                self.password,
-                captcha_model_path=self.captcha_model_path,
-                huawei_subdomain=self.subdomain
-            )
+            metrics.inc('api_calls')
+            self.client = self._create_client()
             logger.info("Sessione rinnovata con successo")
             return True
         except Exception as e:
+            metrics.record_error('renew_session')
             logger.error(f"Errore nel rinnovo della sessione: {e}")
             return False
     
+    @metrics.timed('get_power_status')
     def get_power_status(self):
         """
         Ottiene lo stato di potenza attuale dall'impianto
@@ -152,48 +202,102 @@ class FusionSolarInterface:
             return None
             
         try:
-            # Verifica se la sessione è ancora valida, altrimenti rinnovala
-            if not self.is_session_valid():
+            if not self.ensure_session():
+                return None
+            
+            # Ottieni lo stato di potenza: la lettura stessa verifica la sessione,
+            # se non riesce si rifà il login e si ripete una volta
+            try:
+                metrics.inc('api_calls')
+                stats = network.call('get_power_status', self.client.get_power_status)
+            except Exception as e:
+                logger.warning(f"Sessione scaduta o errore API: {e}")
                 if not self.renew_session():
                     logger.error("Impossibile rinnovare la sessione")
                     return None
-            
-            # Ottieni lo stato di potenza
-            stats = self.client.get_power_status()
+                metrics.inc('api_calls')
+                stats = network.call('get_power_status', self.client.get_power_status)
             current_power = stats.current_power_kw
             status = "Operativo" if current_power > 0 else "Nessuna Produzione"
             timestamp = time.strftime('%H:%M:%S')
+            energy_today, energy_total = energy_counters(stats)
             
             return PowerStatus(
                 current_power_kw=current_power,
                 status=status,
-                timestamp=timestamp
+                timestamp=timestamp,
+                energy_today_kwh=energy_today,
+                energy_total_kwh=energy_total
             )
         except Exception as e:
+            metrics.record_error('get_power_status')
             logger.error(f"Errore nell'ottenimento dello stato di potenza: {e}")
             return None
     
     def get_plant_info(self):
         """
-        Ottiene informazioni sull'impianto
+        Ottiene informazioni sull'impianto (al massimo una chiamata al giorno)
         
         Returns:
             dict: Dati dell'impianto o None in caso di errore
         """
+        plant_info = self.get_cached('plant_info')
+        if plant_info is not None:
+            return plant_info
+        
         if not self.client:
             logger.warning("Client FusionSolar non inizializzato")
             return None
             
         try:
             # Verifica se la sessione è ancora valida, altrimenti rinnovala
-            if not self.is_session_valid():
-                if not self.renew_session():
-                    logger.error("Impossibile rinnovare la sessione")
-                    return None
+            if not self.ensure_session():
+                return None
             
             # Ottieni informazioni sull'impianto
-            plant_info = self.client.get_plant_info()
+            metrics.inc('api_calls')
+            plant_info = network.call('get_plant_info', self.client.get_plant_info)
+            self.store_cached('plant_info', plant_info, PLANT_INFO_TTL)
             return plant_info
         except Exception as e:
             logger.error(f"Errore nell'ottenimento delle informazioni sull'impianto: {e}")
-            return None
\ No newline at end of file
+            return None
+    
+    def get_plants(self):
+        """
+        Elenca gli impianti dell'account
+        
+        Returns:
+            dict: {id impianto: nome} o dizionario vuoto in caso di errore
+        """
+        if not self.client:
+            logger.warning("Client FusionSolar non inizializzato")
+            return {}
+        
+        try:
+            metrics.inc('api_calls')
+            if hasattr(self.client, 'get_station_list'):
+                return {station['dn']: station.get('name', station['dn']) for station in network.call('get_station_list', self.client.get_station_list)}
+            return {plant_id: plant_id for plant_id in network.call('get_plant_ids', self.client.get_plant_ids)}
+        except Exception as e:
+            logger.error(f"Errore nell'elenco degli impianti: {e}")
+            return {}
+    
+    @metrics.timed('get_plant_power')
+    def get_plant_power(self, plant_id):
+        """
+        Ottiene la potenza attuale e i contatori di energia di un singolo impianto.
+        Può essere chiamata in parallelo per più impianti: la sessione del client è condivisa.
+        
+        Args:
+            plant_id: Identificativo dell'impianto
+            
+        Returns:
+            tuple: (kW, kWh prodotti oggi, kWh totali), None per i contatori non disponibili
+            
+        Raises:
+            Exception: In caso di errore di comunicazione o sessione scaduta
+        """
+        metrics.inc('api_calls')
+        plant_data = network.call('get_plant_power', self.client.get_current_plant_data, plant_id)
+        return plant_counters(plant_data)
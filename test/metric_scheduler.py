@@ -0,0 +1,189 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable
+
+import metrics
+import network
+
+logger = logging.getLogger(__name__)
+
+# Secondi prima di un nuovo tentativo dopo una lettura non riuscita (se minore dell'intervallo della famiglia)
+RETRY_DELAY = 60
+
+@dataclass
+class MetricFamily:
+    """Famiglia di dati FusionSolar letta con un proprio intervallo"""
+    name: str
+    interval: float
+    fetch: Callable
+    per_plant: bool = False
+    next_due: float = 0.0
+
+def plant_ids(interface):
+    """Impianti dell'account, letti al massimo una volta al giorno"""
+    plants = interface.get_cached('plants')
+    if plants is None:
+        plants = interface.get_plants()
+        if not plants:
+            # Elenco non disponibile (errore o sessione scaduta): nessuna cache, nuovo tentativo a breve
+            raise RuntimeError("Elenco degli impianti non disponibile")
+        interface.store_cached('plants', plants, 24 * 3600)
+    return list(plants)
+
+def fetch_plant_flow(interface, plant_id):
+    """Flusso di energia (produzione, rete, consumi) di un impianto"""
+    return network.call('get_plant_flow', interface.client.get_plant_flow, plant_id)
+
+def fetch_plant_stats(interface, plant_id):
+    """Statistiche dell'impianto e degli inverter della giornata"""
+    return network.call('get_plant_stats', interface.client.get_plant_stats, plant_id)
+
+def fetch_plant_info(interface):
+    """Informazioni anagrafiche degli impianti dell'account (elenco delle stazioni)"""
+    # fusion_solar_py non ha una lettura dedicata: l'elenco delle stazioni contiene nome, potenza installata e indirizzo
+    return network.call('get_plant_info', interface.client.get_station_list)
+
+# Famiglie disponibili: (nome, chiave dell'intervallo in [METRIC_INTERVALS], intervallo predefinito, lettura,
+# metodo del client, lettura per impianto)
+FAMILIES = [
+    ("plant_flow", "PLANT_FLOW", 60, fetch_plant_flow, "get_plant_flow", True),
+    ("plant_stats", "PLANT_STATS", 300, fetch_plant_stats, "get_plant_stats", True),
+    ("plant_info", "PLANT_INFO", 24 * 3600, fetch_plant_info, "get_station_list", False),
+]
+
+class MetricScheduler:
+    """
+    Lettura a frequenze diverse dei dati FusionSolar oltre alla potenza.
+
+    Ogni famiglia ha il proprio intervallo (la potenza resta letta dal ciclo principale
+    ogni TIME_INTERVAL); le famiglie in scadenza nello stesso ciclo vengono lette insieme
+    con una sola verifica della sessione: le letture di tutti gli impianti e di tutte le
+    famiglie partono contemporaneamente da un pool limitato, e la durata di un ciclo è
+    quella della lettura più lenta. I risultati restano nella cache di
+    FusionSolarInterface fino alla lettura successiva, quindi get_plant_info e le altre
+    letture non interrogano il portale più spesso del loro intervallo; l'ultimo valore
+    di ogni famiglia è esposto da latest (file di stato del collector e API /status).
+    Una lettura non riuscita viene ripetuta dopo RETRY_DELAY secondi.
+    """
+    def __init__(self, interface, families, max_workers=8):
+        """
+        Inizializza lo scheduler
+
+        Args:
+            interface: FusionSolarInterface con la sessione e la cache
+            families: Famiglie da leggere (MetricFamily)
+            max_workers: Numero massimo di letture contemporanee
+        """
+        self.interface = interface
+        self.families = list(families)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="MetricScheduler")
+        # Ultimo valore letto di ogni famiglia {nome: {"updated": epoch, "value": valore}}
+        self.latest = {}
+
+    @classmethod
+    def from_config(cls, config_manager, interface):
+        """
+        Crea lo scheduler con gli intervalli della sezione [METRIC_INTERVALS] (0 = famiglia disattivata)
+
+        Args:
+            config_manager: Gestore della configurazione
+            interface: FusionSolarInterface con la sessione e la cache
+        """
+        families = []
+        for name, key, default_interval, fetch, _, per_plant in FAMILIES:
+            interval = config_manager.getint('METRIC_INTERVALS', key, default_interval)
+            if interval > 0:
+                families.append(MetricFamily(name, interval, fetch, per_plant))
+        return cls(interface, families, config_manager.get_int_setting('PLANT_POLL_WORKERS', 8))
+
+    def due(self, now=None):
+        """Famiglie da leggere in questo ciclo"""
+        now = time.monotonic() if now is None else now
+        return [family for family in self.families if family.next_due <= now]
+
+    def run_due(self, session_ok=False):
+        """
+        Legge tutte le famiglie in scadenza con una sola verifica della sessione
+
+        Args:
+            session_ok: True se la sessione è appena stata usata con successo nello stesso ciclo
+
+        Returns:
+            dict: {nome famiglia: valore} delle famiglie lette in questo ciclo
+        """
+        now = time.monotonic()
+        due = self.due(now)
+        if not due:
+            return {}
+
+        if not session_ok and not self.interface.ensure_session():
+            # Nuovo tentativo al ciclo successivo
+            return {}
+
+        client_methods = {family[0]: family[4] for family in FAMILIES}
+        supported = []
+        for family in due:
+            family.next_due = now + family.interval
+            method = client_methods.get(family.name)
+            if method and not hasattr(self.interface.client, method):
+                # Versione di fusion_solar_py senza questa lettura
+                logger.info(f"Lettura {family.name} non supportata dal client, disattivata")
+                self.families.remove(family)
+                continue
+            supported.append(family)
+
+        plants = []
+        if any(family.per_plant for family in supported):
+            try:
+                plants = plant_ids(self.interface)
+            except Exception as e:
+                for family in supported:
+                    if family.per_plant:
+                        self._failed(family, now, e)
+                supported = [family for family in supported if not family.per_plant]
+
+        # Tutte le letture in scadenza partono insieme, raggruppate per impianto
+        futures = {family.name: [(None, self.executor.submit(self._fetch, family))]
+                   for family in supported if not family.per_plant}
+        for plant_id in plants:
+            for family in supported:
+                if family.per_plant:
+                    futures.setdefault(family.name, []).append(
+                        (plant_id, self.executor.submit(self._fetch, family, plant_id)))
+
+        results = {}
+        for family in supported:
+            try:
+                if family.per_plant:
+                    value = {plant_id: future.result() for plant_id, future in futures[family.name]}
+                else:
+                    value = futures[family.name][0][1].result()
+                self.interface.store_cached(family.name, value, family.interval)
+                self.latest[family.name] = {"updated": time.time(), "value": value}
+                results[family.name] = value
+            except Exception as e:
+                self._failed(family, now, e)
+        return results
+
+    def _fetch(self, family, *args):
+        """Esegue una lettura della famiglia (per un impianto se per_plant)"""
+        metrics.inc('api_calls')
+        with metrics.timer(f"fetch_{family.name}"):
+            return family.fetch(self.interface, *args)
+
+    def _failed(self, family, now, error):
+        """Registra una lettura non riuscita e anticipa il nuovo tentativo"""
+        metrics.record_error(f"fetch_{family.name}")
+        family.next_due = now + min(family.interval, RETRY_DELAY)
+        logger.warning(f"Errore nella lettura di {family.name}: {error}")
+
+    def next_due_in(self):
+        """Prossima lettura prevista di ogni famiglia, in secondi da adesso"""
+        now = time.monotonic()
+        return {family.name: max(0.0, family.next_due - now) for family in self.families}
+
+    def shutdown(self):
+        """Termina il pool di thread"""
+        self.executor.shutdown(wait=False)
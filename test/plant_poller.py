@@ -0,0 +1,101 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Optional
+
+from energy import sum_counters
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class MultiPlantStatus:
+    """Stato di potenza di più impianti letto in un unico ciclo"""
+    current_power_kw: float
+    status: str
+    timestamp: str
+    plants: dict = field(default_factory=dict)
+    failed: list = field(default_factory=list)
+    energy_today_kwh: Optional[float] = None
+    energy_total_kwh: Optional[float] = None
+
+class PlantPoller:
+    """
+    Lettura concorrente della potenza di tutti gli impianti di un account FusionSolar.
+
+    Le letture dei singoli impianti vengono eseguite in parallelo da un pool di thread
+    limitato e condividono la sessione del client, verificata una sola volta per ciclo:
+    la durata di un ciclo è quella dell'impianto più lento e non la somma di tutti.
+    Un impianto che non risponde non blocca gli altri e viene riportato tra i falliti.
+    """
+    def __init__(self, interface, plant_ids=None, max_workers=8):
+        """
+        Inizializza il poller
+
+        Args:
+            interface: FusionSolarInterface con la sessione condivisa
+            plant_ids: Impianti da leggere (None o lista vuota = tutti quelli dell'account)
+            max_workers: Numero massimo di letture contemporanee
+        """
+        self.interface = interface
+        self.configured_ids = [plant_id for plant_id in (plant_ids or []) if plant_id]
+        self.plants = {}
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="PlantPoller")
+
+    def refresh_plants(self):
+        """Aggiorna l'elenco degli impianti dell'account, filtrato su quelli configurati"""
+        plants = self.interface.get_plants()
+        if self.configured_ids:
+            plants = {plant_id: plants.get(plant_id, plant_id) for plant_id in self.configured_ids}
+        self.plants = plants
+        logger.info(f"Impianti monitorati: {', '.join(self.plants.values()) or 'nessuno'}")
+
+    def poll(self):
+        """
+        Legge la potenza di tutti gli impianti in parallelo.
+        I contatori di energia sono la somma di quelli degli impianti, solo se hanno risposto tutti.
+
+        Returns:
+            MultiPlantStatus: Totale e dettaglio per impianto, None se nessun impianto risponde
+        """
+        # Una sola verifica della sessione per ciclo, condivisa da tutte le letture
+        if not self.interface.ensure_session():
+            return None
+
+        if not self.plants:
+            self.refresh_plants()
+            if not self.plants:
+                return None
+
+        futures = {plant_id: self.executor.submit(self.interface.get_plant_power, plant_id) for plant_id in self.plants}
+        plants = {}
+        failed = []
+        plant_today = []
+        plant_total = []
+        for plant_id, future in futures.items():
+            try:
+                plants[plant_id], today, total = future.result()
+                plant_today.append(today)
+                plant_total.append(total)
+            except Exception as e:
+                failed.append(plant_id)
+                logger.warning(f"Lettura dell'impianto {self.plants[plant_id]} non riuscita: {e}")
+
+        if not plants:
+            return None
+
+        total_power = sum(plants.values())
+        return MultiPlantStatus(
+            current_power_kw=total_power,
+            status="Operativo" if total_power > 0 else "Nessuna Produzione",
+            timestamp=time.strftime('%H:%M:%S'),
+            plants=plants,
+            failed=failed,
+            # Con impianti mancanti la somma dei contatori sarebbe parziale
+            energy_today_kwh=None if failed else sum_counters(plant_today),
+            energy_total_kwh=None if failed else sum_counters(plant_total)
+        )
+
+    def shutdown(self):
+        """Termina il pool di thread"""
+        self.executor.shutdown(wait=False)
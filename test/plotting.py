@@ -6,6 +6,8 @@ from matplotlib.figure import Figure
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
 import mplcursors
 
+import metrics
+
 logger = logging.getLogger(__name__)
 
 # Lock per evitare aggiornamenti simultanei del grafico
@@ -67,6 +69,7 @@ class PlottingManager:
         
         return fig, ax, canvas
     
+    @metrics.timed('plot_graph')
     def update_main_plot(self, fig, ax, canvas, days=1):
         """
         Aggiorna il grafico principale con i dati recenti
@@ -175,6 +178,7 @@ class PlottingManager:
                 return True
                 
             except Exception as e:
+                metrics.record_error('plot_graph')
                 logger.error(f"Errore nell'aggiornamento del grafico: {e}")
                 
                 # Tenta di ripristinare il grafico
@@ -207,51 +211,10 @@ class PlottingManager:
             # Calcola le statistiche
             stats = self.statistics.calculate_statistics(days)
             
-            if not stats or not stats.get('daily_energy'):
+            fig, ax = self.build_statistics_figure(stats)
+            if fig is None:
                 return None, None, None
             
-            # Crea figura e assi
-            fig = Figure(figsize=(8, 4), dpi=100)
-            ax = fig.add_subplot(111)
-            
-            # Prepara i dati per il grafico
-            days = list(stats['daily_energy'].keys())[-30:]  # Ultimi 30 giorni
-            energies = [stats['daily_energy'][day] for day in days]
-            
-            # Converti le date in oggetti datetime per l'ordinamento
-            import datetime
-            days_dt = [datetime.datetime.strptime(day, '%Y-%m-%d') for day in days]
-            days_energies = sorted(zip(days_dt, energies), key=lambda x: x[0])
-            days_dt, energies = zip(*days_energies)
-            
-            # Formatta le date come stringhe
-            days_str = [dt.strftime('%d/%m') for dt in days_dt]
-            
-            # Crea un grafico a barre
-            bars = ax.bar(days_str, energies, color=self.colors['secondary'])
-            
-            # Aggiungi etichette per i valori
-            for i, bar in enumerate(bars):
-                height = bar.get_height()
-                if height > 0:  # Mostra etichette solo per valori positivi
-                    ax.text(bar.get_x() + bar.get_width()/2., height + 0.1,
-                            f'{energies[i]:.1f}',
-                            ha='center', va='bottom', rotation=0, fontsize=8)
-            
-            ax.set_title("Produzione Energetica Giornaliera", fontsize=12, color=self.colors['primary'])
-            ax.set_xlabel("Data")
-            ax.set_ylabel("Energia (kWh)")
-            ax.grid(True, linestyle='--', alpha=0.7, axis='y')
-            
-            # Migliora l'aspetto del grafico
-            ax.spines['top'].set_visible(False)
-            ax.spines['right'].set_visible(False)
-            
-            # Ruota le etichette sull'asse x per maggiore leggibilità
-            plt.setp(ax.get_xticklabels(), rotation=45, ha='right', fontsize=8)
-            
-            fig.tight_layout()
-            
             # Canvas per il grafico
             canvas = FigureCanvasTkAgg(fig, master=parent_frame)
             canvas.get_tk_widget().pack(fill="both", expand=True)
@@ -265,6 +228,62 @@ class PlottingManager:
             logger.error(f"Errore nella creazione del grafico statistiche: {e}")
             return None, None, None
     
+    def build_statistics_figure(self, stats):
+        """
+        Costruisce la figura dell'energia giornaliera, senza collegarla a tkinter
+        
+        Args:
+            stats: Statistiche calcolate da calculate_statistics
+            
+        Returns:
+            tuple: (figure, axes) o (None, None) se non ci sono dati
+        """
+        if not stats or not stats.get('daily_energy'):
+            return None, None
+        
+        # Crea figura e assi
+        fig = Figure(figsize=(8, 4), dpi=100)
+        ax = fig.add_subplot(111)
+        
+        # Prepara i dati per il grafico
+        days = list(stats['daily_energy'].keys())[-30:]  # Ultimi 30 giorni
+        energies = [stats['daily_energy'][day] for day in days]
+        
+        # Converti le date in oggetti datetime per l'ordinamento
+        import datetime
+        days_dt = [datetime.datetime.strptime(day, '%Y-%m-%d') for day in days]
+        days_energies = sorted(zip(days_dt, energies), key=lambda x: x[0])
+        days_dt, energies = zip(*days_energies)
+        
+        # Formatta le date come stringhe
+        days_str = [dt.strftime('%d/%m') for dt in days_dt]
+        
+        # Crea un grafico a barre
+        bars = ax.bar(days_str, energies, color=self.colors['secondary'])
+        
+        # Aggiungi etichette per i valori
+        for i, bar in enumerate(bars):
+            height = bar.get_height()
+            if height > 0:  # Mostra etichette solo per valori positivi
+                ax.text(bar.get_x() + bar.get_width()/2., height + 0.1,
+                        f'{energies[i]:.1f}',
+                        ha='center', va='bottom', rotation=0, fontsize=8)
+        
+        ax.set_title("Produzione Energetica Giornaliera", fontsize=12, color=self.colors['primary'])
+        ax.set_xlabel("Data")
+        ax.set_ylabel("Energia (kWh)")
+        ax.grid(True, linestyle='--', alpha=0.7, axis='y')
+        
+        # Migliora l'aspetto del grafico
+        ax.spines['top'].set_visible(False)
+        ax.spines['right'].set_visible(False)
+        
+        # Ruota le etichette sull'asse x per maggiore leggibilità
+        plt.setp(ax.get_xticklabels(), rotation=45, ha='right', fontsize=8)
+        
+        fig.tight_layout()
+        return fig, ax
+    
     def create_monthly_plot(self, parent_frame):
         """
         Crea un grafico con confronto mensile
@@ -279,44 +298,10 @@ class PlottingManager:
             # Calcola i dati mensili
             monthly_energy = self.statistics.calculate_monthly_data()
             
-            if not monthly_energy:
+            fig, ax = self.build_monthly_figure(monthly_energy)
+            if fig is None:
                 return None, None, None
             
-            # Crea figura e assi
-            fig = Figure(figsize=(8, 4), dpi=100)
-            ax = fig.add_subplot(111)
-            
-            # Prepara i dati per il grafico
-            months = sorted(monthly_energy.keys())
-            energies = [monthly_energy[month] for month in months]
-            
-            # Crea etichette più leggibili
-            import datetime
-            month_labels = [datetime.datetime.strptime(m, '%Y-%m').strftime('%b %Y') for m in months]
-            
-            # Crea un grafico a barre
-            bars = ax.bar(month_labels, energies, color=self.colors['primary'])
-            
-            # Aggiungi etichette con i valori sopra le barre
-            for i, bar in enumerate(bars):
-                height = bar.get_height()
-                ax.text(bar.get_x() + bar.get_width()/2., height + 0.1,
-                        f'{energies[i]:.1f}',
-                        ha='center', va='bottom', rotation=0)
-            
-            ax.set_title("Produzione Energetica Mensile", fontsize=12, color=self.colors['primary'])
-            ax.set_ylabel("Energia (kWh)")
-            ax.grid(True, linestyle='--', alpha=0.7, axis='y')
-            
-            # Migliora l'aspetto del grafico
-            ax.spines['top'].set_visible(False)
-            ax.spines['right'].set_visible(False)
-            
-            # Ruota le etichette sull'asse x per maggiore leggibilità
-            plt.setp(ax.get_xticklabels(), rotation=45, ha='right')
-            
-            fig.tight_layout()
-            
             # Canvas per il grafico
             canvas = FigureCanvasTkAgg(fig, master=parent_frame)
             canvas.get_tk_widget().pack(fill="both", expand=True)
@@ -328,4 +313,53 @@ class PlottingManager:
             return fig, ax, canvas
         except Exception as e:
             logger.error(f"Errore nella creazione del grafico mensile: {e}")
-            return None, None, None
\ No newline at end of file
+            return None, None, None
+    
+    def build_monthly_figure(self, monthly_energy):
+        """
+        Costruisce la figura del confronto mensile, senza collegarla a tkinter
+        
+        Args:
+            monthly_energy: Energia per mese calcolata da calculate_monthly_data
+            
+        Returns:
+            tuple: (figure, axes) o (None, None) se non ci sono dati
+        """
+        if not monthly_energy:
+            return None, None
+        
+        # Crea figura e assi
+        fig = Figure(figsize=(8, 4), dpi=100)
+        ax = fig.add_subplot(111)
+        
+        # Prepara i dati per il grafico
+        months = sorted(monthly_energy.keys())
+        energies = [monthly_energy[month] for month in months]
+        
+        # Crea etichette più leggibili
+        import datetime
+        month_labels = [datetime.datetime.strptime(m, '%Y-%m').strftime('%b %Y') for m in months]
+        
+        # Crea un grafico a barre
+        bars = ax.bar(month_labels, energies, color=self.colors['primary'])
+        
+        # Aggiungi etichette con i valori sopra le barre
+        for i, bar in enumerate(bars):
+            height = bar.get_height()
+            ax.text(bar.get_x() + bar.get_width()/2., height + 0.1,
+                    f'{energies[i]:.1f}',
+                    ha='center', va='bottom', rotation=0)
+        
+        ax.set_title("Produzione Energetica Mensile", fontsize=12, color=self.colors['primary'])
+        ax.set_ylabel("Energia (kWh)")
+        ax.grid(True, linestyle='--', alpha=0.7, axis='y')
+        
+        # Migliora l'aspetto del grafico
+        ax.spines['top'].set_visible(False)
+        ax.spines['right'].set_visible(False)
+        
+        # Ruota le etichette sull'asse x per maggiore leggibilità
+        plt.setp(ax.get_xticklabels(), rotation=45, ha='right')
+        
+        fig.tight_layout()
+        return fig, ax
\ No newline at end of file